@@ -0,0 +1,88 @@
+"""Procedurally generated PyGears designs for the gearbox benchmarks.
+
+Each design consists of a number of top-level blocks, each driven by its own
+driver. A block of depth N is a chain of "fanout" blocks of depth N-1, and the
+blocks of depth 0 are leaf gears. With probability "broadcast", the input of a
+chained block is also fed to a merge gear together with its output, which
+turns the input interface into a broadcast.
+
+The designs are fully determined by their parameters and the seed.
+"""
+
+import random
+
+from pygears import gear, reg
+from pygears.lib import shred
+from pygears.sim.modules.drv import drv
+from pygears.typing import Uint
+
+
+@gear
+async def leaf(din: Uint[8]) -> Uint[8]:
+    async with din as d:
+        yield d
+
+
+@gear
+async def merge(a: Uint[8], b: Uint[8]) -> Uint[8]:
+    async with a as da:
+        async with b as db:
+            yield da
+
+
+@gear
+def block(din, *, depth, fanout, broadcast, seed):
+    if depth == 0:
+        return leaf(din)
+
+    rnd = random.Random(seed)
+
+    x = din
+    for i in range(fanout):
+        y = block(x,
+                  depth=depth - 1,
+                  fanout=fanout,
+                  broadcast=broadcast,
+                  seed=rnd.getrandbits(32),
+                  name=f'b{i}')
+
+        if rnd.random() < broadcast:
+            y = merge(x, y, name=f'm{i}')
+
+        x = y
+
+    return x
+
+
+def build(blocks, depth, fanout, broadcast, seed=0, seq_len=16):
+    rnd = random.Random(seed)
+
+    for i in range(blocks):
+        drv(t=Uint[8], seq=list(range(seq_len))) \
+            | block(depth=depth,
+                    fanout=fanout,
+                    broadcast=broadcast,
+                    seed=rnd.getrandbits(32),
+                    name=f'top{i}') \
+            | shred
+
+
+def stats(root=None):
+    """Number of gears and interfaces in the elaborated design."""
+
+    if root is None:
+        root = reg['gear/root']
+
+    gears = 0
+    intfs = 0
+
+    def visit(g):
+        nonlocal gears, intfs
+        gears += 1
+        intfs += len(getattr(g, 'local_intfs', []))
+        for c in g.child:
+            visit(c)
+
+    visit(root)
+
+    return {'gears': gears, 'intfs': intfs}
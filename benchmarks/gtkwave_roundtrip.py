@@ -0,0 +1,135 @@
+"""GTKWave round-trip benchmark.
+
+Starts gtkwave_intf.GtkWaveWindow on the headless GTKWave stand-in
+(gearbox/gtkwave_mock.py) with a generated VCD and measures the time of the
+blocking get_values queries gearbox issues to update the pipe statuses, for
+different batch sizes and artificial latencies of the stand-in.
+
+    python benchmarks/gtkwave_roundtrip.py --signals 1000 --latency 0,0.001
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def write_vcd(fn, signals, timesteps, seed=0):
+    rnd = random.Random(seed)
+
+    with open(fn, 'w') as f:
+        f.write('$timescale 1ns $end\n$scope module top $end\n')
+        for i in range(signals):
+            f.write(f'$scope module s{i} $end\n'
+                    f'$var wire 1 v{i} valid $end\n'
+                    f'$var wire 1 r{i} ready $end\n'
+                    f'$upscope $end\n')
+
+        f.write('$upscope $end\n$enddefinitions $end\n')
+
+        for t in range(timesteps):
+            f.write(f'#{t*10}\n')
+            for i in range(signals):
+                f.write(f'{rnd.getrandbits(1)}v{i}\n{rnd.getrandbits(1)}r{i}\n')
+
+
+def measure(trace_fn, signals, timesteps, latency, batches, repeat):
+    from PySide2 import QtCore
+    from pygears.conf import reg
+
+    from gearbox import gtkwave  # noqa: F401, binds the gtkwave configuration
+    from gearbox.gtkwave_intf import GtkWaveWindow
+    from gearbox.gtkwave_mock import mock_cmd
+
+    reg['gearbox/graph'] = None
+    reg['gearbox/gtkwave/cmd'] = mock_cmd(latency=latency)
+
+    loop = QtCore.QEventLoop()
+    window = GtkWaveWindow(trace_fn)
+    window.initialized.connect(loop.quit)
+    loop.exec_()
+
+    stems = [f'top.s{i}.' for i in range(signals)]
+
+    res = {}
+    for batch in batches:
+        start = time.perf_counter()
+        queries = 0
+        for r in range(repeat):
+            ts = (r % timesteps) * 10
+            for i in range(0, signals, batch):
+                window.command(f'get_values {ts} [list {" ".join(stems[i:i+batch])}]')
+                queries += 1
+
+        total = time.perf_counter() - start
+        res[batch] = {
+            'roundtrip': total / queries,
+            'per_signal': total / (repeat * signals),
+        }
+
+    window.close()
+    return res
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.partition('\n')[0])
+    parser.add_argument('--signals', type=int, default=500, help="Number of traced interfaces")
+    parser.add_argument('--timesteps', type=int, default=100)
+    parser.add_argument(
+        '--latency',
+        default='0,0.001',
+        help="Comma separated artificial latencies of the stand-in, in seconds")
+    parser.add_argument(
+        '--batches', default='1,20,100', help="Comma separated get_values batch sizes")
+    parser.add_argument(
+        '--repeat', type=int, default=5, help="Number of times all signals are queried")
+    parser.add_argument(
+        '--history',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'gtkwave_roundtrip_history.jsonl'),
+        help="JSON lines file with the results of previous runs")
+
+    args = parser.parse_args(argv)
+
+    if not os.environ.get('DISPLAY'):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    from PySide2 import QtWidgets
+    app = QtWidgets.QApplication([])
+
+    batches = [int(b) for b in args.batches.split(',')]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        trace_fn = os.path.join(tmpdir, 'trace.vcd')
+        write_vcd(trace_fn, args.signals, args.timesteps)
+
+        for latency in map(float, args.latency.split(',')):
+            res = measure(trace_fn, args.signals, args.timesteps, latency, batches,
+                          args.repeat)
+            results[str(latency)] = res
+
+            print(f'latency {latency*1000:.1f} ms:')
+            for batch, r in res.items():
+                print(f'  batch {batch:>5}: {r["roundtrip"]*1000:8.3f} ms/query, '
+                      f'{r["per_signal"]*1e6:8.1f} us/signal')
+
+    app.processEvents()
+
+    with open(args.history, 'a') as f:
+        f.write(
+            json.dumps({
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'signals': args.signals,
+                'results': results
+            }) + '\n')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
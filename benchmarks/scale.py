@@ -0,0 +1,413 @@
+"""Gearbox scalability benchmark on synthetic PyGears designs.
+
+Designs are generated by benchmarks/designs.py from a list of size specs of
+the form BLOCKSxDEPTHxFANOUT. For each design, fresh interpreters measure:
+
+- elaborate: building the PyGears design
+- node_model: NodeModel construction for the whole hierarchy
+- layout_top: layout with all the hierarchical gears collapsed
+- layout_full: layout with the whole hierarchy expanded, cold layout cache
+- layout_full_cached: the same layout repeated with a warm layout cache
+- layout_incremental: collapsing and expanding a single innermost gear
+- vcd_map_pg: get_pg_vcd_item_signals on the signal list of a PyGears VCD
+- vcd_map_verilator: get_verilator_item_signals on a Verilator signal list
+- update_pipes: time per traced pipe in GtkWaveGraphIntf.update_pipes, with a
+  stand-in GTKWave answering the queries in-process
+- sim / sim_gearbox: simulation time without and with the Gearbox simulator
+  extension
+
+Qt runs on the offscreen platform if no display is available. Results are
+appended to a JSON lines history file, so that the scaling curve can be
+compared across changes.
+
+    python benchmarks/scale.py --sizes 2x2x2,4x3x2,8x3x3 --broadcast 0.3
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+PHASES = ('elaborate', 'node_model', 'layout_top', 'layout_full',
+          'layout_full_cached', 'layout_incremental', 'vcd_map_pg',
+          'vcd_map_verilator', 'update_pipes', 'sim', 'sim_gearbox')
+
+HANDSHAKE_STATES = ('0 0', '1 0', '0 1', '1 1')
+
+
+def parse_size(spec):
+    blocks, depth, fanout = map(int, spec.lower().split('x'))
+    return {'blocks': blocks, 'depth': depth, 'fanout': fanout}
+
+
+def timed(timings, name, func, *args, **kwds):
+    start = time.perf_counter()
+    ret = func(*args, **kwds)
+    timings[name] = time.perf_counter() - start
+    return ret
+
+
+def build_design(params):
+    import designs
+
+    designs.build(params['blocks'],
+                  params['depth'],
+                  params['fanout'],
+                  params['broadcast'],
+                  seed=params['seed'],
+                  seq_len=params['seq_len'])
+
+
+def walk_models(model):
+    for c in model.child:
+        yield c
+        yield from walk_models(c)
+
+
+def pg_vcd_signals(root):
+    signals = []
+
+    def visit(g):
+        stem = g.name[1:].replace('/', '.')
+        for p in g.in_ports + g.out_ports:
+            for s in ('valid', 'ready', 'data'):
+                signals.append(f'{stem}.{p.basename}.{s}')
+
+        for c in g.child:
+            visit(c)
+
+    for c in root.child:
+        visit(c)
+
+    return signals
+
+
+def verilator_signals(top_model):
+    from gearbox.node_model import PipeModel
+
+    signals = {}
+    for m in walk_models(top_model):
+        if not isinstance(m, PipeModel):
+            continue
+
+        path = [p for p in m.parent.name.split('/') if p]
+        for s in ('valid', 'ready', 'data'):
+            name = '.'.join(path + [f'{m.basename}_{s}'])
+            signals[name] = f'TOP.{name}'
+
+    return signals
+
+
+def gtkwave_stand_in(signals):
+    from PySide2 import QtCore
+
+    class GtkWaveStandIn(QtCore.QObject):
+        response = QtCore.Signal(str, int)
+        shmidcat = False
+
+        def __init__(self):
+            super().__init__()
+            self.commands = 0
+
+        def command(self, cmd):
+            self.commands += 1
+            if cmd == 'list_signals':
+                return '\n'.join(signals)
+
+            if cmd.startswith('get_values'):
+                names = cmd.partition('[list ')[2].rstrip(']').split()
+                return '\n'.join(self.state(i) for i in range(len(names)))
+
+            if cmd.startswith('get_bc_values'):
+                # Producer valid followed by the consumer readies
+                broadcasts = re.findall(r'\{([^{}]*)\}', cmd)
+                return '\n'.join(
+                    ' '.join(self.state(i)[0 if i == 0 else 2]
+                             for i in range(len(b.split())))
+                    for b in broadcasts)
+
+            return ''
+
+        def command_nb(self, cmd, cmd_id=0):
+            pass
+
+        def state(self, i):
+            return HANDSHAKE_STATES[(i + self.commands) % len(HANDSHAKE_STATES)]
+
+    return GtkWaveStandIn()
+
+
+def run_gui(params):
+    from PySide2 import QtWidgets
+
+    app = QtWidgets.QApplication([])
+
+    from pygears.conf import reg
+
+    import designs
+    from gearbox import perf
+    from gearbox.graph import Graph
+    from gearbox.gtkwave import (GtkWaveGraphIntf, PyGearsVCDMap,
+                                 get_pg_vcd_item_signals,
+                                 get_verilator_item_signals)
+    from gearbox.node_model import NodeModel
+
+    timings = {}
+    timed(timings, 'elaborate', build_design, params)
+    root = reg['gear/root']
+    result = designs.stats(root)
+
+    # Stand-ins for the parts of the gearbox session the models depend on
+    reg['gearbox/sim_bridge'] = types.SimpleNamespace(
+        cur_model_issue_path=None, err=None)
+    timekeep = types.SimpleNamespace(timestep=0)
+    reg['gearbox/timekeep'] = timekeep
+    reg['gearbox/layout/engine'] = params['engine']
+    if params['fold']:
+        reg['gearbox/fold/rules'] = reg['gearbox/fold/rules'] + [(params['fold'], 'edge')]
+
+    view = Graph()
+    reg['gearbox/graph'] = view
+
+    top = timed(timings, 'node_model', NodeModel, root)
+    reg['gearbox/graph_model'] = top
+    view.top = top.view
+
+    timed(timings, 'layout_top', top.view.layout)
+
+    hier = [m for m in walk_models(top) if isinstance(m, NodeModel) and m.hierarchical]
+    for m in hier:
+        m.view.collapsed = False
+        m.view.attach_children()
+        for obj in m.view.children:
+            obj.show()
+
+    perf.reset()
+    timed(timings, 'layout_full', top.view.layout)
+    dot = perf.timers().get('layout/dot')
+    result['dot_runs'] = dot.count if dot else 0
+    result['layout_nodes'] = perf.counters().get('layout/nodes', 0)
+    result['layout_spliced'] = perf.counters().get('layout/spliced', 0)
+
+    perf.reset()
+    timed(timings, 'layout_full_cached', top.view.layout)
+    result['layout_cache_hits'] = perf.counters().get('layout/cache_hit', 0)
+
+    innermost = [m for m in hier if not any(
+        isinstance(c, NodeModel) and c.hierarchical for c in m.child)]
+
+    if innermost:
+        node = innermost[len(innermost) // 2].view
+        start = time.perf_counter()
+        node.collapse()
+        node.expand()
+        timings['layout_incremental'] = (time.perf_counter() - start) / 2
+
+    pg_signals = pg_vcd_signals(root)
+    timed(timings, 'vcd_map_pg', get_pg_vcd_item_signals, top,
+          {s: s for s in pg_signals})
+
+    timed(timings, 'vcd_map_verilator', get_verilator_item_signals, top,
+          verilator_signals(top))
+    result['signals'] = len(pg_signals)
+
+    gtkwave = gtkwave_stand_in(pg_signals)
+    graph_intf = GtkWaveGraphIntf(PyGearsVCDMap(None, gtkwave), gtkwave)
+    pipes = list(graph_intf.vcd_map.vcd_pipes)
+    result['traced_pipes'] = len(pipes)
+
+    if pipes:
+        start = time.perf_counter()
+        for ts in range(params['steps']):
+            timekeep.timestep = ts
+            graph_intf.update_pipes(pipes)
+
+        timings['update_pipes'] = (time.perf_counter() - start) / (params['steps'] *
+                                                                  len(pipes))
+
+    app.processEvents()
+    result.update(timings)
+    return result
+
+
+def run_sim(params):
+    from pygears.conf import reg
+    from pygears.sim import sim
+
+    timings = {}
+    timed(timings, 'elaborate', build_design, params)
+    timed(timings, 'sim', sim, check_activity=False)
+    timings['timesteps'] = reg['sim/timestep']
+
+    return timings
+
+
+def run_sim_gearbox(params):
+    from PySide2 import QtCore, QtWidgets
+
+    app = QtWidgets.QApplication([])
+
+    from pygears.conf import reg
+
+    from gearbox.pygears_proxy import Gearbox
+
+    timings = {}
+    timed(timings, 'elaborate', build_design, params)
+
+    start = time.perf_counter()
+    gearbox = Gearbox(live=False)
+
+    # Let the simulation continue whenever it stops at before_run or
+    # after_cleanup. Polling avoids missing an event emitted before a signal
+    # connection could be made.
+    def cont():
+        if not gearbox.running:
+            gearbox.cont()
+
+    poll = QtCore.QTimer()
+    poll.timeout.connect(cont)
+    poll.start(1)
+
+    gearbox.thrd.finished.connect(app.quit)
+    app.exec_()
+    poll.stop()
+
+    timings['sim_gearbox'] = time.perf_counter() - start
+    timings['timesteps'] = reg['sim/timestep']
+
+    return timings
+
+
+WORKERS = {'gui': run_gui, 'sim': run_sim, 'sim_gearbox': run_sim_gearbox}
+
+
+def worker(mode, params):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    res = WORKERS[mode](params)
+    print('SCALE_RESULTS ' + json.dumps(res))
+
+
+def run_worker(python, env, mode, params, timeout):
+    with tempfile.TemporaryDirectory() as cwd:
+        res = subprocess.run(
+            [python, os.path.abspath(__file__), '--worker', mode,
+             json.dumps(params)],
+            cwd=cwd,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            timeout=timeout)
+
+    for line in res.stdout.splitlines():
+        if line.startswith('SCALE_RESULTS '):
+            return json.loads(line.partition(' ')[2])
+
+    raise RuntimeError(f'Benchmark "{mode}" failed for {params}:\n{res.stdout}\n{res.stderr}')
+
+
+def fmt_phase(name, val):
+    if name == 'update_pipes':
+        return f'{val*1e6:.1f} us/pipe'
+
+    return f'{val*1000:.1f} ms'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.partition('\n')[0])
+    parser.add_argument(
+        '--sizes',
+        default='2x2x2,4x3x2,8x3x3',
+        help="Comma separated design sizes as BLOCKSxDEPTHxFANOUT")
+    parser.add_argument(
+        '--broadcast',
+        type=float,
+        default=0.3,
+        help="Probability that a block input is also broadcast to a merge gear")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--seq-len', type=int, default=16, help="Number of values sent by each driver")
+    parser.add_argument(
+        '--steps', type=int, default=20, help="Number of update_pipes timesteps")
+    parser.add_argument(
+        '--engine', default='dot', help="Layout engine: 'dot' or 'native'")
+    parser.add_argument(
+        '--fold',
+        help="Glob of the gear definitions folded to edges, e.g. 'leaf' (see gearbox/fold.py)")
+    parser.add_argument('--skip-sim', action='store_true', help="Skip the simulation phases")
+    parser.add_argument(
+        '--history',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'scale_history.jsonl'),
+        help="JSON lines file with the results of previous runs")
+    parser.add_argument('--python', default=sys.executable)
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--worker', nargs=2, help=argparse.SUPPRESS)
+
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker(args.worker[0], json.loads(args.worker[1]))
+        return 0
+
+    env = dict(os.environ)
+    if not env.get('DISPLAY'):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    modes = ['gui'] if args.skip_sim else ['gui', 'sim', 'sim_gearbox']
+
+    results = []
+    for spec in args.sizes.split(','):
+        params = dict(parse_size(spec),
+                      broadcast=args.broadcast,
+                      seed=args.seed,
+                      seq_len=args.seq_len,
+                      steps=args.steps,
+                      engine=args.engine,
+                      fold=args.fold)
+
+        res = {'size': spec}
+        for mode in modes:
+            mode_res = run_worker(args.python, env, mode, params, args.timeout)
+            if mode != 'gui':
+                mode_res.pop('elaborate', None)
+
+            res.update(mode_res)
+
+        if 'sim' in res and 'sim_gearbox' in res and res['sim'] > 0:
+            res['sim_overhead'] = res['sim_gearbox'] / res['sim']
+
+        results.append(res)
+
+        print(f'{spec}: {res["gears"]} gears, {res["intfs"]} interfaces, '
+              f'{res["layout_nodes"]} layout nodes')
+        for name in PHASES:
+            if name in res:
+                print(f'  {name:>20}: {fmt_phase(name, res[name])}')
+
+        if 'sim_overhead' in res:
+            print(f'  {"sim_overhead":>20}: {res["sim_overhead"]:.2f}x')
+
+    with open(args.history, 'a') as f:
+        f.write(
+            json.dumps({
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'broadcast': args.broadcast,
+                'engine': args.engine,
+                'fold': args.fold,
+                'seed': args.seed,
+                'seq_len': args.seq_len,
+                'results': results
+            }) + '\n')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
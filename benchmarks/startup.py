@@ -0,0 +1,201 @@
+"""Gearbox startup time benchmark.
+
+Each run is done in fresh interpreters and records:
+
+- import: time to import gearbox.main
+- first_paint: time from interpreter start to the first paint of the main
+  window
+- layers_ready: time until all the layers from gearbox/layers are set up
+- slowest_imports: the modules with the largest cumulative import time, as
+  reported by "python -X importtime"
+
+Results are appended to a JSON lines history file. With --check, the run
+fails if any of the timings regressed by more than the given percentage
+compared to the median of the previous runs.
+
+    python benchmarks/startup.py --runs 5 --check 20
+"""
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+METRICS = ('import', 'first_paint', 'layers_ready')
+
+STARTUP_SCRIPT = r'''
+import json
+import sys
+import time
+
+t_start = time.perf_counter()
+
+import gearbox.main
+from PySide2 import QtCore, QtWidgets
+from pygears.conf import reg
+
+t_import = time.perf_counter()
+timings = {'import': t_import - t_start}
+
+
+class PaintWatcher(QtCore.QObject):
+    def eventFilter(self, obj, event):
+        if (event.type() == QtCore.QEvent.Paint and 'first_paint' not in timings
+                and isinstance(obj, QtWidgets.QMainWindow)):
+            timings['first_paint'] = time.perf_counter() - t_start
+
+        return False
+
+
+class Application(gearbox.main.Application):
+    def __init__(self, *args, **kwds):
+        super().__init__(*args, **kwds)
+        self.paint_watcher = PaintWatcher()
+        self.installEventFilter(self.paint_watcher)
+
+
+def layers_ready():
+    timings['layers_ready'] = time.perf_counter() - t_start
+    # Give the window a chance to get painted if it hasn't been yet
+    QtCore.QTimer.singleShot(100, QtWidgets.QApplication.instance().quit)
+
+
+gearbox.main.Application = Application
+reg['gearbox/layers'].append(layers_ready)
+
+try:
+    gearbox.main.main_loop(None, [sys.argv[0]])
+except SystemExit:
+    pass
+
+print('STARTUP_TIMINGS ' + json.dumps(timings))
+'''
+
+
+def run_startup(python, env):
+    with tempfile.TemporaryDirectory() as cwd:
+        res = subprocess.run([python, '-c', STARTUP_SCRIPT],
+                             cwd=cwd,
+                             env=env,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
+                             universal_newlines=True,
+                             timeout=120)
+
+    for line in res.stdout.splitlines():
+        if line.startswith('STARTUP_TIMINGS '):
+            return json.loads(line.partition(' ')[2])
+
+    raise RuntimeError(f'Startup run failed:\n{res.stdout}\n{res.stderr}')
+
+
+def slowest_imports(python, env, count):
+    res = subprocess.run([python, '-X', 'importtime', '-c', 'import gearbox.main'],
+                         env=env,
+                         stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE,
+                         universal_newlines=True,
+                         timeout=120)
+
+    modules = []
+    for line in res.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        try:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            modules.append((int(cumulative), name.strip()))
+        except ValueError:
+            continue
+
+    modules.sort(reverse=True)
+    return [{'module': name, 'us': us} for us, name in modules[:count]]
+
+
+def load_history(fn):
+    if not os.path.exists(fn):
+        return []
+
+    with open(fn) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check_regressions(history, result, threshold):
+    regressions = []
+    for metric in METRICS:
+        prev = [r[metric] for r in history if metric in r]
+        if not prev or metric not in result:
+            continue
+
+        baseline = statistics.median(prev)
+        if result[metric] > baseline * (1 + threshold / 100):
+            regressions.append(
+                f'{metric}: {result[metric]*1000:.1f} ms vs. median '
+                f'{baseline*1000:.1f} ms')
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.partition('\n')[0])
+    parser.add_argument('--runs', type=int, default=3, help="Number of startup runs")
+    parser.add_argument(
+        '--history',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'startup_history.jsonl'),
+        help="JSON lines file with the results of previous runs")
+    parser.add_argument(
+        '--check',
+        type=float,
+        metavar='PERCENT',
+        default=None,
+        help="Fail if a timing regressed by more than PERCENT")
+    parser.add_argument('--python', default=sys.executable)
+    parser.add_argument('--top', type=int, default=15, help="Number of slowest imports to record")
+
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    if not env.get('DISPLAY'):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    runs = [run_startup(args.python, env) for _ in range(args.runs)]
+
+    result = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'runs': args.runs,
+    }
+
+    for metric in METRICS:
+        vals = [r[metric] for r in runs if metric in r]
+        if vals:
+            result[metric] = min(vals)
+
+    result['slowest_imports'] = slowest_imports(args.python, env, args.top)
+
+    for metric in METRICS:
+        if metric in result:
+            print(f'{metric:>14}: {result[metric]*1000:8.1f} ms')
+
+    history = load_history(args.history)
+    regressions = check_regressions(history, result, args.check) if args.check is not None else []
+
+    with open(args.history, 'a') as f:
+        f.write(json.dumps(result) + '\n')
+
+    if regressions:
+        print('Startup time regressions:')
+        for r in regressions:
+            print(f'  {r}')
+
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,95 +1,153 @@
+import html
 import re
 from PySide2 import QtCore, QtWidgets
-from pygears.conf import Inject, inject
+from pygears.conf import Inject, PluginBase, inject, reg
+from . import perf
 from .layout import Buffer, show_buffer
 from .description import describe_file
 from .theme import themify
 
+re_err_file_line = re.compile(r'(\s+)File "([^"]+)", line (\d+)(, in (\S+))?(.*)')
+re_err_issue_line = re.compile(r'(\s+)(\S+): \[(\d+)\], (.*)')
+
+
+def render_line(text):
+    res = re_err_file_line.fullmatch(text)
+    if res:
+        indent = res.group(1)
+        fn = res.group(2)
+        line = int(res.group(3))
+        fn = themify(f'<a href="file:{fn}#{line}" class="err">{fn}</a>')
+        if res.group(4):
+            func_name = html.escape(res.group(5))
+            epilog = f', in <span class="nf">{func_name}</span>{html.escape(res.group(6))}'
+        else:
+            epilog = html.escape(res.group(6))
+
+        return f'<pre style="margin: 0">{indent}<span>File "{fn}", line {line}{epilog}</span></pre>'
+
+    res = re_err_issue_line.fullmatch(text)
+    if res:
+        indent = res.group(1)
+        err_name = res.group(2)
+        issue_id = int(res.group(3))
+        err_text = html.escape(res.group(4))
+        err_ref = themify(
+            f'<a href="err:{err_name}#{issue_id}" class="nl err">{err_name}: [{issue_id}]</a>'
+        )
+
+        return f'<pre style="margin: 0">{indent}<span>{err_ref}, {err_text}</span></pre>'
+
+    return f'<pre style="margin: 0">{html.escape(text)}</pre>'
+
 
 class TailProc(QtCore.QObject):
-    file_text_append = QtCore.Signal(str)
+    """Follows the compilation log from a worker thread.
+
+    The log is read in large chunks whenever the file system watcher reports a
+    change (inotify on Linux), with a slow poll as a fallback. Lines are
+    rendered to HTML in the worker thread and delivered to the GUI as a single
+    block per chunk.
+    """
+
+    html_block_append = QtCore.Signal(str)
+    quit_requested = QtCore.Signal()
 
     @inject
     def __init__(self,
                  compilation_log_fn,
+                 chunk_size=1 << 16,
+                 poll_interval=1000,
                  sim_bridge=Inject('gearbox/sim_bridge')):
         super().__init__()
 
         self.compilation_log_fn = compilation_log_fn
+        self.chunk_size = chunk_size
+        self.partial = ''
         self.thrd = QtCore.QThread()
         self.moveToThread(self.thrd)
 
+        self.watcher = QtCore.QFileSystemWatcher([self.compilation_log_fn])
+        self.watcher.moveToThread(self.thrd)
+        self.watcher.fileChanged.connect(self.read)
+
         self.timer = QtCore.QTimer()
         self.timer.moveToThread(self.thrd)
-        self.timer.setInterval(100)
+        self.timer.setInterval(poll_interval)
         self.timer.timeout.connect(self.read)
         self.timer.setSingleShot(True)
 
         self.f = open(self.compilation_log_fn)
-        self.thrd.started.connect(self.timer.start)
-        sim_bridge.script_closed.connect(self.quit)
+        self.thrd.started.connect(self.read)
+
+        # The timer and the file belong to the worker thread, so the quit is
+        # always queued to it
+        self.quit_requested.connect(self.quit, QtCore.Qt.QueuedConnection)
+        sim_bridge.script_closed.connect(self.quit_requested)
 
         self.thrd.start()
 
+    def stop(self):
+        """Quits the worker from the GUI thread and waits for it to finish"""
+
+        self.quit_requested.emit()
+        self.thrd.wait()
+
     def quit(self):
+        if self.f.closed:
+            return
+
         self.timer.stop()
+        self.watcher.fileChanged.disconnect(self.read)
+
+        # Nothing more will be written, so the last line is complete
+        self.read_chunks()
+        if self.partial:
+            self.html_block_append.emit(render_line(self.partial))
+            self.partial = ''
+
         self.f.close()
         self.thrd.quit()
 
+    @perf.timed('compilation/read')
     def read(self):
-        line = self.f.readline()
-        while line:
-            self.file_text_append.emit(line[:-1])
-            line = self.f.readline()
+        if self.f.closed:
+            return
 
+        self.read_chunks()
         self.timer.start()
 
+    def read_chunks(self):
+        data = self.f.read(self.chunk_size)
+        while data:
+            perf.count('compilation/bytes', len(data))
+            lines = (self.partial + data).split('\n')
+            self.partial = lines.pop()
+
+            if lines:
+                self.html_block_append.emit(''.join(map(render_line, lines)))
+
+            data = self.f.read(self.chunk_size)
+
 
 class Compilation(QtWidgets.QTextBrowser):
     resized = QtCore.Signal()
-    re_err_file_line = re.compile(r'(\s+)File "([^"]+)", line (\d+)(, in (\S+))?(.*)')
-    re_err_issue_line = re.compile(r'(\s+)(\S+): \[(\d+)\], (.*)')
 
-    def __init__(self, compilation_log_fn):
+    @inject
+    def __init__(self,
+                 compilation_log_fn,
+                 max_lines=Inject('gearbox/compilation/max_lines')):
         super().__init__()
         self.document().setDefaultStyleSheet(
             QtWidgets.QApplication.instance().styleSheet())
+        # Oldest lines are dropped by the document once the limit is reached
+        self.document().setMaximumBlockCount(max_lines)
         self.tail_proc = TailProc(compilation_log_fn)
-        self.tail_proc.file_text_append.connect(self.append)
+        self.tail_proc.html_block_append.connect(self.append)
         self.setLineWrapMode(QtWidgets.QTextBrowser.NoWrap)
         self.compilation_log_fn = compilation_log_fn
         self.setOpenExternalLinks(False)
 
-    def append(self, text):
-        res = self.re_err_file_line.fullmatch(text)
-        if res:
-            indent = res.group(1)
-            fn = res.group(2)
-            line = int(res.group(3))
-            fn = themify(f'<a href="file:{fn}#{line}" class="err">{fn}</a>')
-            if res.group(4):
-                func_name = res.group(5).replace('<', '&lt;').replace('>', '&gt;')
-                epilog = f', in <span class="nf">{func_name}</span>{res.group(6)}'
-            else:
-                epilog = res.group(6)
-
-            text = f'<pre style="margin: 0">{indent}<span>File "{fn}", line {line}{epilog}</span></pre>'
-        else:
-            # import pdb; pdb.set_trace()
-            res = self.re_err_issue_line.fullmatch(text)
-            if res:
-                indent = res.group(1)
-                err_name = res.group(2)
-                issue_id = int(res.group(3))
-                err_text = res.group(4)
-                err_ref = themify(
-                    f'<a href="err:{err_name}#{issue_id}" class="nl err">{err_name}: [{issue_id}]</a>'
-                )
-
-                text = f'<pre style="margin: 0">{indent}<span>{err_ref}, {err_text}</span></pre>'
-
-        super().append(text)
-
     @inject
     def setSource(self, url, sim_bridge=Inject('gearbox/sim_bridge')):
         if url.scheme() == 'file':
@@ -106,6 +164,10 @@ def compilation(sim_bridge=Inject('gearbox/sim_bridge')):
 
 
 class CompilationBuffer(Buffer):
+    def delete(self):
+        self.view.tail_proc.stop()
+        super().delete()
+
     @property
     def domain(self):
         return 'compilation'
@@ -114,8 +176,20 @@ class CompilationBuffer(Buffer):
 @inject
 def compilation_create(
         sim_bridge=Inject('gearbox/sim_bridge'),
-        compilation_log_fn=Inject('gearbox/compilation_log_fn')):
+        compilation_log_fn=Inject('gearbox/compilation_log_fn'),
+        layout=Inject('gearbox/layout')):
+
+    # The buffer of the previous run is left behind on in-process reloads
+    prev_buff = layout.get_buffer_by_name('compilation')
+    if prev_buff is not None:
+        prev_buff.delete()
 
     buff = CompilationBuffer(Compilation(compilation_log_fn), 'compilation')
     show_buffer(buff)
     return buff
+
+
+class CompilationPlugin(PluginBase):
+    @classmethod
+    def bind(cls):
+        reg.confdef('gearbox/compilation/max_lines', default=20000)
@@ -27,6 +27,11 @@ NODE_ICON_SIZE = 24
 NODE_SEL_COLOR = (255, 255, 255, 30)
 NODE_SEL_BORDER_COLOR = (254, 207, 42, 255)
 
+# LAYOUT
+LAYOUT_CACHE_SIZE = 1024
+LAYOUT_RANKSEP = 50
+LAYOUT_NODESEP = 20
+
 # DRAW STACK ORDER
 Z_VAL_PIPE = -1
 Z_VAL_NODE = 1
@@ -1,9 +1,12 @@
+import collections
+import os
+import re
 from PySide2 import QtWidgets, QtGui, QtCore
 from .layout import Buffer
-from pygears.conf import Inject, inject, reg
-import pygments
+from pygears.conf import Inject, PluginBase, inject, reg
+from pygments.lexer import ExtendedRegexLexer, RegexLexer
 from pygments.lexers import get_lexer_for_filename, PythonLexer, Python3Lexer, ClassNotFound
-from pygments.formatters import HtmlFormatter
+from pygments.token import STANDARD_TYPES, _TokenType
 
 #         self.setHtml("""
 # <div class="highlight">
@@ -62,6 +65,267 @@ class Description(QtWidgets.QTextEdit):
         self.clean()
         self.setHtml(text)
 
+
+class SourceFile:
+    """Lexed contents of a source file, shared by all viewers showing it.
+
+    Lines are tokenized on demand. For regex based lexers the lexer state at
+    the start of each line is cached, so highlighting a line only requires
+    the lines before it to have been lexed once.
+    """
+
+    def __init__(self, fn, contents, lexer):
+        self.fn = fn
+        self.contents = contents
+        self.lexer = lexer
+        self.stateful = (isinstance(lexer, RegexLexer)
+                         and not isinstance(lexer, ExtendedRegexLexer))
+
+        self.line_starts = [0]
+        for m in re.finditer('\n', contents):
+            self.line_starts.append(m.end())
+
+        # Per line: (position to resume lexing from, lexer state stack, type of
+        # the token that spans into the line from the lines above)
+        self.states = [(0, ('root', ), None)]
+        self.tokens = {}
+
+    def line_span(self, lineno):
+        start = self.line_starts[lineno]
+        if lineno + 1 < len(self.line_starts):
+            return start, self.line_starts[lineno + 1] - 1
+        else:
+            return start, len(self.contents)
+
+    def line_tokens(self, lineno):
+        """Returns the (start, length, token type) list for the line."""
+        if lineno not in self.tokens:
+            if self.lexer is None:
+                self.tokens[lineno] = []
+            elif self.stateful:
+                self._lex_to(lineno)
+                self.tokens[lineno] = self._lex_line(lineno)[0]
+            else:
+                start, end = self.line_span(lineno)
+                tokens = self.lexer.get_tokens_unprocessed(
+                    self.contents[start:end] + '\n')
+                self.tokens[lineno] = self._token_ranges(
+                    ((start + pos, ttype, value) for pos, ttype, value in tokens),
+                    lineno)
+
+        return self.tokens[lineno]
+
+    def _lex_to(self, lineno):
+        while len(self.states) <= lineno:
+            self.states.append(self._lex_line(len(self.states) - 1)[1])
+
+    def _token_ranges(self, tokens, lineno):
+        line_start, line_end = self.line_span(lineno)
+        ranges = []
+        for pos, ttype, value in tokens:
+            start = max(pos, line_start)
+            end = min(pos + len(value), line_end)
+            if start < end:
+                ranges.append((start - line_start, end - start, ttype))
+
+        return ranges
+
+    def _lex_line(self, lineno):
+        pos, stack, carry = self.states[lineno]
+        line_start, line_end = self.line_span(lineno)
+        text = self.contents
+        statestack = list(stack)
+        tokens = []
+        if carry is not None:
+            tokens.append((line_start, carry, text[line_start:pos]))
+
+        # Mirrors RegexLexer.get_tokens_unprocessed(), but stops at the end of
+        # the line and hands back the state to resume from
+        tokendefs = self.lexer._tokens
+        statetokens = tokendefs[statestack[-1]]
+        while pos <= line_end and pos < len(text):
+            for rexmatch, action, new_state in statetokens:
+                m = rexmatch(text, pos)
+                if m:
+                    if action is not None:
+                        if type(action) is _TokenType:
+                            tokens.append((pos, action, m.group()))
+                        else:
+                            tokens.extend(action(self.lexer, m))
+                    pos = m.end()
+                    if new_state is not None:
+                        if isinstance(new_state, tuple):
+                            for state in new_state:
+                                if state == '#pop':
+                                    if len(statestack) > 1:
+                                        statestack.pop()
+                                elif state == '#push':
+                                    statestack.append(statestack[-1])
+                                else:
+                                    statestack.append(state)
+                        elif isinstance(new_state, int):
+                            if abs(new_state) >= len(statestack):
+                                del statestack[1:]
+                            else:
+                                del statestack[new_state:]
+                        elif new_state == '#push':
+                            statestack.append(statestack[-1])
+
+                        statetokens = tokendefs[statestack[-1]]
+                    break
+            else:
+                if text[pos] == '\n':
+                    statestack = ['root']
+                    statetokens = tokendefs['root']
+
+                pos += 1
+
+        carry = None
+        if tokens and pos > line_end + 1:
+            carry = tokens[-1][1]
+
+        return self._token_ranges(tokens, lineno), (pos, tuple(statestack),
+                                                    carry)
+
+
+_source_cache = collections.OrderedDict()
+
+
+@inject
+def load_source(fn, cache_size=Inject('gearbox/description/source_cache_size')):
+    """Returns the SourceFile for fn, cached per (file, mtime)."""
+    key = (fn, os.path.getmtime(fn))
+    if key in _source_cache:
+        _source_cache.move_to_end(key)
+        return _source_cache[key]
+
+    with open(fn, 'r') as f:
+        contents = f.read()
+
+    try:
+        lexer = get_lexer_for_filename(fn)
+        if isinstance(lexer, PythonLexer):
+            lexer = Python3Lexer()
+    except ClassNotFound:
+        lexer = None
+
+    source = SourceFile(fn, contents, lexer)
+    _source_cache[key] = source
+    if len(_source_cache) > cache_size:
+        _source_cache.popitem(last=False)
+
+    return source
+
+
+def stylesheet_formats(stylesheet):
+    """Parses pygments class rules (".k { color: ... }") from a stylesheet."""
+    formats = {}
+    for cls, rule in re.findall(r'^\.(\w+)\s*\{([^}]*)\}', stylesheet,
+                                re.MULTILINE):
+        fmt = QtGui.QTextCharFormat()
+        for prop in rule.split(';'):
+            name, _, val = (p.strip() for p in prop.partition(':'))
+            if name == 'color':
+                fmt.setForeground(QtGui.QColor(val))
+            elif name == 'font-weight' and val == 'bold':
+                fmt.setFontWeight(QtGui.QFont.Bold)
+            elif name == 'font-style' and val == 'italic':
+                fmt.setFontItalic(True)
+
+        formats[cls] = fmt
+
+    return formats
+
+
+class SourceHighlighter(QtGui.QSyntaxHighlighter):
+    """Highlights only the lines that have been requested, i.e. shown."""
+
+    def __init__(self, document):
+        super().__init__(document)
+        self.source = None
+        self.highlighted = set()
+        self.css_formats = stylesheet_formats(
+            QtWidgets.QApplication.instance().styleSheet())
+        self.char_formats = {}
+
+    def set_source(self, source):
+        self.source = source
+        self.highlighted.clear()
+
+    def char_format(self, ttype):
+        if ttype not in self.char_formats:
+            t = ttype
+            while t not in STANDARD_TYPES or STANDARD_TYPES[t] not in self.css_formats:
+                if t.parent is None:
+                    self.char_formats[ttype] = None
+                    return None
+
+                t = t.parent
+
+            self.char_formats[ttype] = self.css_formats[STANDARD_TYPES[t]]
+
+        return self.char_formats[ttype]
+
+    def highlight_lines(self, first, last):
+        doc = self.document()
+        for lineno in range(first, last + 1):
+            if lineno in self.highlighted:
+                continue
+
+            block = doc.findBlockByNumber(lineno)
+            if not block.isValid():
+                break
+
+            self.highlighted.add(lineno)
+            self.rehighlightBlock(block)
+
+    def highlightBlock(self, text):
+        lineno = self.currentBlock().blockNumber()
+        if self.source is None or lineno not in self.highlighted:
+            return
+
+        for start, length, ttype in self.source.line_tokens(lineno):
+            fmt = self.char_format(ttype)
+            if fmt is not None:
+                self.setFormat(start, length, fmt)
+
+
+class SourceView(QtWidgets.QPlainTextEdit):
+    resized = QtCore.Signal()
+
+    def __init__(self):
+        super().__init__()
+        self.setReadOnly(True)
+        self.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        self.highlighter = SourceHighlighter(self.document())
+        self.source = None
+        self.clean()
+        palette = self.palette()
+        palette.setBrush(QtGui.QPalette.Highlight,
+                         QtGui.QColor(0xd0, 0xd0, 0xff, 40))
+
+        palette.setBrush(QtGui.QPalette.HighlightedText,
+                         QtGui.QBrush(QtCore.Qt.NoBrush))
+
+        self.setPalette(palette)
+        self.verticalScrollBar().valueChanged.connect(self.highlight_visible)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        p = QtGui.QPainter(self.viewport())
+        p.fillRect(self.cursorRect(), QtGui.QBrush(QtCore.Qt.white))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.highlight_visible()
+        self.resized.emit()
+
+    def clean(self):
+        self.fn = None
+        self.lineno = None
+        self.trace = None
+        self.trace_pos = None
+
     def display_trace(self, trace):
         self.clean()
         self.trace = trace
@@ -72,36 +336,41 @@ class Description(QtWidgets.QTextEdit):
         frame, lineno = self.trace[self.trace_pos]
         self.display_file(frame.f_code.co_filename, slice(lineno, lineno + 1))
 
+    def highlight_visible(self):
+        block = self.firstVisibleBlock()
+        if not block.isValid():
+            return
+
+        first = block.blockNumber()
+        offset = self.contentOffset()
+        height = self.viewport().height()
+        last = first
+        while (block.isValid() and self.blockBoundingGeometry(block).translated(
+                offset).top() <= height):
+            last = block.blockNumber()
+            block = block.next()
+
+        # Highlight a page of margin around the view to keep scrolling smooth
+        page = last - first + 1
+        self.highlighter.highlight_lines(max(0, first - page), last + page)
+
     def display_file(self, fn, lineno=1):
-        with open(fn, 'r') as f:
-            contents = f.read()
+        source = load_source(fn)
 
         self.fn = fn
         self.lineno = lineno
 
-        if isinstance(lineno, slice):
-            start = lineno.start
-        else:
-            start = lineno
+        if not isinstance(lineno, slice):
             lineno = slice(lineno, lineno + 1)
 
-        try:
-            lexer = get_lexer_for_filename(fn)
-            if isinstance(lexer, PythonLexer):
-                lexer = Python3Lexer()
-
-            html = pygments.highlight(contents, lexer, HtmlFormatter())
-        except ClassNotFound:
-            html = contents
+        if source is not self.source:
+            self.source = source
+            self.highlighter.set_source(None)
+            self.setPlainText(source.contents)
+            self.highlighter.set_source(source)
 
-        # print(html)
-        self.setHtml(html)
-        self.update()
-
-        # import pdb; pdb.set_trace()
-        start_text_block = self.document().findBlockByLineNumber(lineno.start -
-                                                                 1)
-        end_text_block = self.document().findBlockByLineNumber(lineno.stop - 1)
+        start_text_block = self.document().findBlockByNumber(lineno.start - 1)
+        end_text_block = self.document().findBlockByNumber(lineno.stop - 1)
 
         c = self.textCursor()
         c.setPosition(start_text_block.position())
@@ -109,13 +378,8 @@ class Description(QtWidgets.QTextEdit):
         self.moveCursor(QtGui.QTextCursor.End)
         self.setTextCursor(c)
 
-        # cursor = QtGui.QTextCursor(
-        #     self.document().findBlockByLineNumber(start - 1))
-
-        # # cursor.movePosition(QtGui.QTextCursor.Down, QtGui.QTextCursor.KeepAnchor,
-        # #                     10)
-
-        # self.setTextCursor(cursor)
+        self.highlight_visible()
+        QtCore.QTimer.singleShot(0, self.highlight_visible)
 
 
 @inject
@@ -133,7 +397,7 @@ def describe_file(fn, name=None, lineno=1, layout=Inject('gearbox/layout')):
             buff = b
             break
     else:
-        buff = DescriptionBuffer(Description(), fn)
+        buff = DescriptionBuffer(SourceView(), fn)
 
     buff.view.display_file(fn, lineno)
 
@@ -147,7 +411,13 @@ def describe_trace(trace, name, layout=Inject('gearbox/layout')):
             buff = b
             break
     else:
-        buff = DescriptionBuffer(Description(), name)
+        buff = DescriptionBuffer(SourceView(), name)
 
     buff.view.display_trace(trace)
     return buff
+
+
+class DescriptionPlugin(PluginBase):
+    @classmethod
+    def bind(cls):
+        reg.confdef('gearbox/description/source_cache_size', default=16)
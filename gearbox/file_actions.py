@@ -66,8 +66,7 @@ def reload_file(
         layout=Inject('gearbox/layout')):
 
     if script_fn:
-        reg['gearbox/main/new_model_script_fn'] = script_fn
-        close_file()
+        sim_bridge.reload_model()
 
 
 @shortcut(None, (Qt.Key_Space, Qt.Key_F, Qt.SHIFT + Qt.Key_R),
@@ -80,5 +79,4 @@ def reload_file_save_layout(
 
     if script_fn:
         save()
-        reg['gearbox/main/new_model_script_fn'] = script_fn
-        close_file()
+        sim_bridge.reload_model()
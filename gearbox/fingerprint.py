@@ -0,0 +1,159 @@
+import hashlib
+import re
+import types
+from typing import NamedTuple
+
+re_obj_addr = re.compile(r' at 0x[0-9a-fA-F]+')
+
+
+class GearFingerprint(NamedTuple):
+    # Digest of the gear itself: definition, parameters, port types and the
+    # wiring of its children
+    local: str
+    # Digest of the whole subtree rooted at the gear
+    tree: str
+
+
+def stable_repr(val):
+    """repr() that is the same in every process: the object addresses are
+    left out and the set elements sorted, since their order follows the
+    string hash seed"""
+
+    if isinstance(val, types.CodeType):
+        return f'code({_code_digest(val)})'
+
+    if isinstance(val, (set, frozenset)):
+        items = ', '.join(sorted(stable_repr(v) for v in val))
+        return f'{type(val).__name__}({{{items}}})'
+
+    if isinstance(val, dict):
+        items = sorted(f'{stable_repr(k)}: {stable_repr(v)}' for k, v in val.items())
+        return '{' + ', '.join(items) + '}'
+
+    if isinstance(val, tuple) and hasattr(val, '_fields'):
+        items = ', '.join(f'{f}={stable_repr(v)}' for f, v in zip(val._fields, val))
+        return f'{type(val).__name__}({items})'
+
+    if isinstance(val, tuple):
+        items = ', '.join(stable_repr(v) for v in val)
+        return f'({items},)' if len(val) == 1 else f'({items})'
+
+    if isinstance(val, list):
+        return '[' + ', '.join(stable_repr(v) for v in val) + ']'
+
+    if callable(val) and hasattr(val, '__qualname__'):
+        return f'{getattr(val, "__module__", "")}.{val.__qualname__}'
+
+    return re_obj_addr.sub('', repr(val))
+
+
+def _code_digest(code):
+    """Digest of the bytecode, the names and the constants of the code. The
+    nested code objects of the comprehensions, inner functions and lambdas are
+    among the constants and are hashed the same way, so that the line numbers
+    do not matter."""
+
+    h = hashlib.blake2b(code.co_code, digest_size=8)
+    h.update(' '.join(code.co_names).encode())
+    h.update(stable_repr(code.co_consts).encode())
+    return h.hexdigest()
+
+
+def _definition_digest(gear):
+    try:
+        func = gear.params['definition'].func
+    except (KeyError, AttributeError):
+        return ''
+
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return stable_repr(func)
+
+    return f'{func.__module__}.{func.__qualname__}:{_code_digest(code)}'
+
+
+def _local_digest(gear):
+    h = hashlib.blake2b(digest_size=16)
+
+    h.update(_definition_digest(gear).encode())
+
+    for name, val in sorted(gear.params.items()):
+        if name == 'definition':
+            continue
+
+        h.update(f'{name}={stable_repr(val)};'.encode())
+
+    for p in gear.in_ports:
+        h.update(f'i:{p.basename}:{p.dtype!r};'.encode())
+
+    for p in gear.out_ports:
+        h.update(f'o:{p.basename}:{p.dtype!r};'.encode())
+
+    for intf in getattr(gear, 'local_intfs', []):
+        prod = intf.producer
+        if prod is not None:
+            h.update(f'{prod.gear.basename}.{prod.index}->'.encode())
+
+        for cons in intf.consumers:
+            h.update(f'{cons.gear.basename}.{cons.index},'.encode())
+
+        h.update(b';')
+
+    return h.hexdigest()
+
+
+def hier_fingerprints(root):
+    """Returns the fingerprints of all the gears in the hierarchy, keyed by the
+    gear name."""
+
+    fingerprints = {}
+
+    def visit(gear):
+        local = _local_digest(gear)
+        h = hashlib.blake2b(local.encode(), digest_size=16)
+        for c in gear.child:
+            h.update(f'{c.basename}:{visit(c)};'.encode())
+
+        tree = h.hexdigest()
+        fingerprints[gear.name] = GearFingerprint(local, tree)
+        return tree
+
+    visit(root)
+
+    return fingerprints
+
+
+class HierDiff:
+    """Change set between two versions of a gear hierarchy.
+
+    Attributes:
+        added: names of the gears present only in the new hierarchy
+        removed: names of the gears present only in the old hierarchy
+        changed: names of the gears whose own definition, parameters, port
+          types or child wiring changed
+        unchanged: names of the gears whose whole subtree is unchanged
+    """
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+
+        self.added = set(new) - set(old)
+        self.removed = set(old) - set(new)
+        common = set(old) & set(new)
+        self.changed = {n for n in common if old[n].local != new[n].local}
+        self.unchanged = {n for n in common if old[n].tree == new[n].tree}
+
+    def is_unchanged(self, name):
+        return name in self.unchanged
+
+    @property
+    def empty(self):
+        return not (self.added or self.removed or self.changed)
+
+    def __str__(self):
+        if self.empty:
+            return 'no changes'
+
+        return (f'{len(self.changed)} changed, {len(self.added)} added, '
+                f'{len(self.removed)} removed')
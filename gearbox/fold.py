@@ -0,0 +1,139 @@
+"""Folding of the glue gears.
+
+The rules in 'gearbox/fold/rules' are (pattern, action) pairs, tried in order
+for each gear. A pattern is either a glob matched against the name of the gear
+definition (e.g. 'ccat', 'qround*'), or a predicate called with the gear, like
+Definition('pygears.lib.sieve') which matches the library gear itself and not
+the user gears of the same name. The action is one of:
+
+- 'minimize': the gear is drawn as a small dot
+- 'edge': the gear is spliced out of the layout of its parent, its input pipe
+  is laid out as a single edge together with its output pipe, and the gear is
+  placed where the two meet. Only the gears with a single input and a single
+  output can be spliced, the others are minimized instead.
+
+With 'gearbox/fold/chains' enabled, a hierarchical gear whose children all
+fold is itself minimized, so that whole chains of trivial gears show as a
+single dot.
+
+Folding only changes how the gears are shown: the models of the folded gears
+and of their children are kept, so their waves can still be traced.
+"""
+
+import fnmatch
+import importlib
+
+from pygears.conf import Inject, PluginBase, inject, reg
+
+from .node import edge_layout, edge_painter, minimized_layout, minimized_painter
+
+FOLD_MINIMIZE = 'minimize'
+FOLD_EDGE = 'edge'
+
+FOLD_VIEWS = {
+    FOLD_MINIMIZE: (minimized_layout, minimized_painter),
+    FOLD_EDGE: (edge_layout, edge_painter),
+}
+
+
+# Fold actions by the gear ID, of the model being built
+_actions = {}
+
+
+def definition(gear):
+    try:
+        return gear.params['definition'].func
+    except (KeyError, AttributeError):
+        return None
+
+
+def definition_name(gear):
+    return getattr(definition(gear), '__name__', None)
+
+
+class Definition:
+    """Rule pattern matching the instances of a gear given by its import path,
+    e.g. 'pygears.lib.sieve'"""
+
+    def __init__(self, path):
+        self.path = path
+        self._func = None
+
+    def __call__(self, gear):
+        if self._func is None:
+            module, _, name = self.path.rpartition('.')
+            self._func = getattr(importlib.import_module(module), name).func
+
+        return definition(gear) is self._func
+
+    def __repr__(self):
+        return f'Definition({self.path!r})'
+
+
+def rule_matches(pattern, gear):
+    if callable(pattern):
+        return pattern(gear)
+
+    name = definition_name(gear)
+    return name is not None and fnmatch.fnmatchcase(name, pattern)
+
+
+def spliceable(gear):
+    return len(gear.in_ports) == 1 and len(gear.out_ports) == 1
+
+
+@inject
+def match_fold_action(gear,
+                      rules=Inject('gearbox/fold/rules'),
+                      chains=Inject('gearbox/fold/chains')):
+    if gear.parent is None:
+        return None
+
+    for pattern, action in rules:
+        if rule_matches(pattern, gear):
+            if action == FOLD_EDGE and not spliceable(gear):
+                return FOLD_MINIMIZE
+
+            return action
+
+    if chains and gear.child and all(fold_action(c) for c in gear.child):
+        return FOLD_MINIMIZE
+
+    return None
+
+
+def fold_action(gear):
+    """Fold action for the gear, or None if it is shown as is"""
+
+    # The gear is kept with the action, so that its ID is not reused
+    try:
+        return _actions[id(gear)][1]
+    except KeyError:
+        action = match_fold_action(gear)
+        _actions[id(gear)] = (gear, action)
+        return action
+
+
+def fold_view(gear):
+    """Layout and painter of the folded gear, or None"""
+
+    # The models are built from the root down, so the actions of the previous
+    # model are dropped here
+    if gear.parent is None:
+        _actions.clear()
+
+    action = fold_action(gear)
+    if action is None:
+        return None
+
+    return FOLD_VIEWS[action]
+
+
+class FoldPlugin(PluginBase):
+    @classmethod
+    def bind(cls):
+        reg.confdef(
+            'gearbox/fold/rules',
+            default=[(Definition('pygears.lib.sieve'), FOLD_MINIMIZE),
+                     (Definition('pygears.lib.cast'), FOLD_MINIMIZE)])
+        reg.confdef('gearbox/fold/chains', default=False)
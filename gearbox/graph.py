@@ -1,6 +1,7 @@
 #!/usr/bin/python
 
 from PySide2 import QtCore, QtWidgets, QtGui
+import contextlib
 import warnings
 
 from .constants import (IN_PORT, OUT_PORT, PIPE_LAYOUT_CURVED,
@@ -10,11 +11,15 @@ from .node_abstract import AbstractNodeItem
 from .pipe import Pipe
 from .port import PortItem
 from .scene import NodeScene
-from .node import NodeItem
+from .node import NodeItem, set_layout_presets
+from .spatial import nodes_near
 from .node_model import NodeModel
-from .layout import Buffer, LayoutPlugin
+from .layout import Buffer
 from .html_utils import tabulate, fontify
 from .utils import single_shot_connect
+from .fingerprint import HierDiff, hier_fingerprints
+from . import perf
+from .main_window import message
 
 from pygears.conf import Inject, inject, MayInject, reg
 
@@ -51,6 +56,10 @@ def graph(
         sim_bridge=Inject('gearbox/sim_bridge'),
         root=Inject('gear/root')):
 
+    # The search is imported by its actions on the first use, but its
+    # configuration is bound together with the graph
+    from . import node_search
+
     reg['gearbox/graph_model_ctrl'] = GraphModelCtrl()
 
 
@@ -80,6 +89,26 @@ def graph(
 
 #     return buff
 
+def expanded_nodes(model):
+    for c in model.child:
+        if isinstance(c, NodeModel) and not c.view.collapsed:
+            yield c.name[1:]
+            yield from expanded_nodes(c)
+
+
+def layout_geometry(model):
+    """Layout results of the expanded nodes keyed by the node name, in the
+    form taken by set_layout_presets()"""
+
+    geometry = {}
+    for view in [model.view] + [model[n].view for n in expanded_nodes(model)]:
+        if view.layout_result is not None:
+            positions, paths = view.layout_result
+            geometry[view.model.name] = (positions, [paths[p] for p in view.pipes])
+
+    return geometry
+
+
 class GraphModelCtrl(QtCore.QObject):
     model_loaded = QtCore.Signal()
     working_model_loaded = QtCore.Signal()
@@ -88,6 +117,11 @@ class GraphModelCtrl(QtCore.QObject):
     def __init__(self, sim_bridge=Inject('gearbox/sim_bridge')):
         super().__init__()
         self.sim_bridge = sim_bridge
+        self.reloaded = False
+        self.expanded = []
+        self.geometry = {}
+        self.fingerprints = None
+        self.hier_diff = None
         self.sim_bridge.model_loaded.connect(self.graph_create)
         self.sim_bridge.before_run.connect(self.graph_create)
         self.sim_bridge.model_closed.connect(self.graph_delete)
@@ -99,8 +133,43 @@ class GraphModelCtrl(QtCore.QObject):
         reg['gearbox/graph'] = view
         top_model = NodeModel(root)
         reg['gearbox/graph_model'] = top_model
+
+        fingerprints = hier_fingerprints(root)
+        if self.reloaded and self.fingerprints is not None:
+            self.hier_diff = HierDiff(self.fingerprints, fingerprints)
+            message(f'Model reloaded: {self.hier_diff}')
+        else:
+            self.hier_diff = None
+
+        self.fingerprints = fingerprints
+
         view.top = top_model.view
         top_model.view.layout()
+
+        # The subtrees that did not change keep their layout from before the
+        # in-process reload
+        if self.hier_diff is not None:
+            set_layout_presets({
+                name: geom
+                for name, geom in self.geometry.items()
+                if self.hier_diff.is_unchanged(name)
+            })
+
+        # Restore the hierarchy expanded before the in-process reload
+        try:
+            with view.layout_transaction():
+                for name in self.expanded:
+                    try:
+                        top_model[name].view.expand()
+                    except KeyError:
+                        pass
+        finally:
+            set_layout_presets({})
+
+        self.expanded = []
+        self.geometry = {}
+        self.reloaded = False
+
         view.fit_all()
 
         self.buff = GraphBuffer(view, 'graph')
@@ -117,6 +186,11 @@ class GraphModelCtrl(QtCore.QObject):
         return self.sim_bridge.err
 
     def graph_delete(self):
+        if self.sim_bridge.reloading:
+            self.reloaded = True
+            self.expanded = list(expanded_nodes(reg['gearbox/graph_model']))
+            self.geometry = layout_geometry(reg['gearbox/graph_model'])
+
         self.buff.delete()
         del self.buff
         reg['gearbox/graph'] = None
@@ -164,6 +238,47 @@ class Graph(QtWidgets.QGraphicsView):
         self.RMB_state = False
         self.MMB_state = False
 
+        self._layout_depth = 0
+        self._layout_pending = False
+        self._layout_focus = None
+
+    @contextlib.contextmanager
+    def layout_transaction(self):
+        """Defers the relayouts requested by expand() and collapse() until the
+        outermost transaction ends, where the graph is laid out only once."""
+
+        self._layout_depth += 1
+        try:
+            yield
+        finally:
+            self._layout_depth -= 1
+            if self._layout_depth == 0 and self._layout_pending:
+                self._layout_pending = False
+                focus, self._layout_focus = self._layout_focus, None
+                self.relayout(focus)
+
+    def relayout(self, focus=None):
+        if self._layout_depth:
+            self._layout_pending = True
+            if focus is not None:
+                self._layout_focus = focus
+
+            return
+
+        self.top.layout()
+        if focus is not None:
+            self.ensureVisible(focus)
+
+    def expand_nodes(self, nodes):
+        with self.layout_transaction():
+            for node in nodes:
+                node.expand()
+
+    def collapse_nodes(self, nodes):
+        with self.layout_transaction():
+            for node in nodes:
+                node.collapse()
+
     def __str__(self):
         return '{}.{}()'.format(self.__module__, self.__class__.__name__)
 
@@ -198,6 +313,12 @@ class Graph(QtWidgets.QGraphicsView):
     def _items_near(self, pos, item_type=None, width=20, height=20):
         x, y = pos.x() - width, pos.y() - height
         rect = QtCore.QRect(x, y, width, height)
+
+        # Nodes are looked up in the layer indices built by the layout
+        if (item_type is not None and issubclass(item_type, AbstractNodeItem)
+                and getattr(self, 'top', None) is not None):
+            return list(nodes_near(self.top, rect))
+
         items = []
         for item in self.scene().items(rect):
             if not item_type or isinstance(item, item_type):
@@ -223,8 +344,8 @@ class Graph(QtWidgets.QGraphicsView):
         if alt_modifier:
             return
 
-        items = self._items_near(self.mapToScene(event.pos()), None, 20, 20)
-        nodes = [i for i in items if isinstance(i, AbstractNodeItem)]
+        pos = self.mapToScene(event.pos())
+        nodes = self._items_near(pos, AbstractNodeItem, 20, 20)
 
         # toggle extend node selection.
         if shift_modifier:
@@ -234,8 +355,9 @@ class Graph(QtWidgets.QGraphicsView):
         # update the recorded node positions.
         self._node_positions.update({n: n.pos for n in self.selected_nodes()})
 
-        # show selection selection marquee
-        if self.LMB_state and not items:
+        # show selection selection marquee, the scene is only queried for the
+        # other items when no node was hit
+        if self.LMB_state and not nodes and not self._items_near(pos, None, 20, 20):
             rect = QtCore.QRect(self._previous_pos, QtCore.QSize())
             rect = rect.normalized()
             map_rect = self.mapToScene(rect).boundingRect()
@@ -443,6 +565,10 @@ class Graph(QtWidgets.QGraphicsView):
         super().resizeEvent(event)
         self.resized.emit()
 
+    def paintEvent(self, event):
+        with perf.timer('graph/paint'):
+            super().paintEvent(event)
+
     def get_pipe_layout(self):
         return self._pipe_layout
 
@@ -493,8 +619,3 @@ class Graph(QtWidgets.QGraphicsView):
         if self.get_zoom() > 0.1:
             self.reset_zoom()
 
-
-class GraphBufferPlugin(LayoutPlugin):
-    @classmethod
-    def bind(cls):
-        reg['gearbox/plugins/graph'] = {}
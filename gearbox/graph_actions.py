@@ -1,7 +1,6 @@
 import os
 import inspect
-from .layout import show_buffer
-from .graph import GraphBufferPlugin
+from .layout import LayoutPlugin, show_buffer
 from .pipe import Pipe
 from .popup_desc import popup_desc, popup_cancel
 from functools import wraps
@@ -10,8 +9,6 @@ from pygears.conf import Inject, inject, reg
 from .main_window import register_prefix, message
 from .actions import shortcut, get_minibuffer_input, Interactive
 from .description import describe_text, describe_trace, describe_file
-from .gtkwave import ItemNotTraced
-from .node_search import node_search_completer
 from .sim_actions import time_search, step_simulator, cont_simulator
 from .timestep_modeline import TimestepModeline
 
@@ -62,13 +59,7 @@ def node_right(node, graph):
     else:
         layer_id += 1
 
-    closest = node.parent.layers[layer_id][0]
-
-    for n in node.parent.layers[layer_id][1:]:
-        if abs(node.y() - n.y()) < abs(node.y() - closest.y()):
-            closest = n
-
-    graph.select(closest)
+    graph.select(node.parent.layers.closest(layer_id, node.y()))
 
 
 @shortcut('graph', Qt.Key_H)
@@ -84,21 +75,11 @@ def node_left(node, graph):
     else:
         layer_id -= 1
 
-    closest = node.parent.layers[layer_id][0]
-
-    for n in node.parent.layers[layer_id][1:]:
-        if abs(node.y() - n.y()) < abs(node.y() - closest.y()):
-            closest = n
-
-    graph.select(closest)
+    graph.select(node.parent.layers.closest(layer_id, node.y()))
 
 
 def get_node_layer(node):
-    for i, layer in enumerate(node.parent.layers):
-        if node in layer:
-            return i, layer, layer.index(node)
-    else:
-        return None
+    return node.parent.layers.locate(node)
 
 
 register_prefix('graph', Qt.Key_Z, 'zoom')
@@ -269,6 +250,8 @@ def toggle_expand(node, graph):
 def send_to_wave(
         graph=Inject('gearbox/graph'), gtkwave=Inject('gearbox/gtkwave/inst')):
 
+    from .gtkwave import ItemNotTraced
+
     added = []
     selected_item = graph.selected_items()
     for item in selected_item:
@@ -293,6 +276,7 @@ shortcut('graph', Qt.Key_Colon)(time_search)
 def node_search(
         minibuffer=Inject('gearbox/minibuffer'),
         graph=Inject('gearbox/graph')):
+    from .node_search import node_search_completer
 
     items = graph.selected_items()
     if len(items) == 1:
@@ -310,14 +294,39 @@ def node_search(
         return
 
     node = graph.top.model
-    for basename in node_name[1:].split('/'):
-        node.view.expand()
-        print('basename')
-        node = node[basename]
+    with graph.layout_transaction():
+        for basename in node_name[1:].split('/'):
+            node.view.expand()
+            node = node[basename]
 
     graph.select(node.view)
 
 
+@shortcut('graph', Qt.Key_G)
+@inject
+def node_goto(graph=Inject('gearbox/graph')):
+    from .node_search import global_node_search_completer, node_search_index
+
+    top = graph.top.model
+    node_name = get_minibuffer_input(
+        message='goto: ', completer=global_node_search_completer(top))
+
+    if not node_name:
+        return
+
+    model = node_search_index(top)[node_name]
+
+    parents = []
+    node = model.parent
+    while node is not None and node is not top:
+        parents.append(node)
+        node = node.parent
+
+    graph.expand_nodes(node.view for node in reversed(parents))
+
+    graph.select(model.view)
+
+
 class GraphDescription:
     def __init__(self, buff):
         self.buff = buff
@@ -332,7 +341,7 @@ class GraphDescription:
         popup_cancel()
 
 
-class GtkwaveActionsPlugin(GraphBufferPlugin):
+class GtkwaveActionsPlugin(LayoutPlugin):
     @classmethod
     def bind(cls):
         reg['gearbox/plugins/graph']['TimestepModeline'] = TimestepModeline
@@ -13,6 +13,7 @@ from .gtkwave_intf import GtkWaveWindow
 from .layout import active_buffer, Buffer, LayoutPlugin
 from .utils import single_shot_connect
 from .dbg import dbg_connect
+from . import perf
 from functools import partial
 import os
 import re
@@ -43,6 +44,8 @@ class PyGearsVCDMap:
         self.item_signals, self.pipe_to_port_map = get_pg_vcd_item_signals(
             self.subgraph, self.signal_name_map)
 
+        self.broadcast_stems = {}
+
         # self.pipe_to_port_map = {}
 
     @property
@@ -82,6 +85,22 @@ class PyGearsVCDMap:
         # return self.item_basename(item)
         return self.item_basename(port)
 
+    def broadcast_stem(self, pipe):
+        """Signal stem of the producer side of the broadcast the pipe belongs
+        to, or None if it is not traced"""
+
+        try:
+            return self.broadcast_stems[pipe.rtl]
+        except KeyError:
+            pass
+
+        stem = self.item_basename(pipe.rtl.producer) + '.'
+        if f'{stem}valid' not in self.signal_name_map:
+            stem = None
+
+        self.broadcast_stems[pipe.rtl] = stem
+        return stem
+
     @property
     def vcd_pipes(self):
         for item in self.item_signals:
@@ -258,6 +277,9 @@ class VerilatorVCDMap:
         self.item_signals = get_verilator_item_signals(
             self.subgraph, self.signal_name_map)
 
+        self.signal_names = set(self.signal_name_map.values())
+        self.broadcast_stems = {}
+
         print("VCD Init done")
 
     @property
@@ -298,6 +320,22 @@ class VerilatorVCDMap:
     def item_name_stem(self, item):
         return '.'.join((self.path_prefix, self.item_basename(item)))
 
+    def broadcast_stem(self, pipe):
+        """Signal stem of the producer side of the broadcast the pipe belongs
+        to, or None if it is not traced"""
+
+        try:
+            return self.broadcast_stems[pipe.rtl]
+        except KeyError:
+            pass
+
+        stem = self.item_name_stem(pipe).rpartition('_bc_')[0] + '_'
+        if f'{stem}valid' not in self.signal_names:
+            stem = None
+
+        self.broadcast_stems[pipe.rtl] = stem
+        return stem
+
     @property
     def name(self):
         return self.sim_module.name
@@ -349,12 +387,20 @@ def gtkwave_create(sim_bridge=Inject('gearbox/sim_bridge')):
 
 
 @inject
-def gktwave_delete(timekeep=Inject('gearbox/timekeep')):
+def gktwave_delete(timekeep=Inject('gearbox/timekeep'),
+                   sim_bridge=Inject('gearbox/sim_bridge')):
     print('Gtkwave deleted')
     gtkwave = reg['gearbox/gtkwave/inst']
     timekeep.timestep_changed.disconnect(gtkwave.update)
     for b in gtkwave.buffers:
-        b.delete()
+        # Windows showing a trace file are kept for the reloaded model, while
+        # the shared memory traces get a new address on each run
+        if sim_bridge.reloading and not b.gtk_window.shmidcat:
+            b.delete(close_window=False)
+            reg['gearbox/gtkwave/pool'][b.gtk_window.proc.trace_fn] = (
+                b.gtk_window, [item.name for item in b.intf.items_on_wave])
+        else:
+            b.delete()
 
     reg['gearbox/gtkwave/inst'] = None
 
@@ -386,17 +432,29 @@ class GtkWave:
             if m.trace_fn is not None:
                 self.create_gtkwave_instance(m, VerilatorVCDMap)
 
+        pool = reg['gearbox/gtkwave/pool']
+        for window, _ in pool.values():
+            window.close()
+
+        pool.clear()
+
     def create_gtkwave_instance(self, vcd_trace_obj, vcd_map_cls):
         if hasattr(vcd_trace_obj, 'shmid'):
             trace_fn = vcd_trace_obj.shmid
         else:
             trace_fn = vcd_trace_obj.trace_fn
 
-        window = GtkWaveWindow(trace_fn)
-
-        if window.window_id is not None:
-            self.create_gtkwave_buffer()
+        pool = reg['gearbox/gtkwave/pool']
+        if trace_fn in pool:
+            window, items_on_wave = pool.pop(trace_fn)
+            window.command([
+                'gtkwave::reLoadFile', 'gtkwave::/Edit/Highlight_All',
+                'gtkwave::/Edit/Cut'
+            ])
+            self.create_gtkwave_buffer(window, vcd_trace_obj, vcd_map_cls)
+            self.restore_items(self.graph_intfs[-1], items_on_wave)
         else:
+            window = GtkWaveWindow(trace_fn)
             dbg_connect(
                 window.initialized,
                 partial(self.create_gtkwave_buffer, window, vcd_trace_obj, vcd_map_cls))
@@ -411,6 +469,20 @@ class GtkWave:
         self.instances.append(window)
         self.buffers.append(buffer)
 
+    @inject
+    def restore_items(self, intf, names, graph_model=Inject('gearbox/graph_model')):
+        items = []
+        for name in names:
+            try:
+                item = graph_model[name]
+            except KeyError:
+                continue
+
+            if intf.has_item_wave(item):
+                items.append(item)
+
+        intf.show_items(items)
+
     def item_gtkwave_intf(self, item):
         for intf in self.graph_intfs:
             if intf.has_item_wave(item):
@@ -465,9 +537,12 @@ class GtkWaveBuffer(Buffer):
     def deactivate(self):
         super().deactivate()
 
-    def delete(self):
+    def delete(self, close_window=True):
         super().delete()
-        self.gtk_window.close()
+        if close_window:
+            self.gtk_window.close()
+        else:
+            self.intf.close()
 
     @property
     def domain(self):
@@ -484,10 +559,24 @@ class NodeActivityVisitor(HierVisitorBase):
             node.set_status('empty')
 
 
+def node_visible(node):
+    """Whether the contents of the node are shown, i.e. the node and all its
+    parents are expanded"""
+
+    while node.parent is not None:
+        if node.view.collapsed:
+            return False
+
+        node = node.parent
+
+    return True
+
+
 class GtkWaveGraphIntf(QtCore.QObject):
     vcd_loaded = QtCore.Signal()
 
-    def __init__(self, vcd_map, gtkwave_intf):
+    @inject
+    def __init__(self, vcd_map, gtkwave_intf, view=MayInject('gearbox/graph')):
         super().__init__()
         self.vcd_map = vcd_map
         self.graph = vcd_map.subgraph
@@ -497,6 +586,70 @@ class GtkWaveGraphIntf(QtCore.QObject):
         self.should_update = False
         self.updating = False
         self.timestep = 0
+        self.trace_stamp = self.read_trace_stamp()
+        self.closed = False
+
+        # Traced pipes by their parent node, and the set of the traced pipes
+        # whose parents are expanded, kept up to date on the expand toggles
+        self.traced_pipes = {}
+        for p in self.vcd_map.vcd_pipes:
+            self.traced_pipes.setdefault(p.parent, []).append(p)
+
+        self.visible_pipes = set(
+            p for node, pipes in self.traced_pipes.items() if node_visible(node)
+            for p in pipes)
+
+        self.view = view
+        if view is not None:
+            dbg_connect(view.node_expand_toggled, self.node_expand_toggled)
+
+            # Pipes scrolled into the viewport are refreshed after a pause
+            self.viewport_timer = QtCore.QTimer(self)
+            self.viewport_timer.setSingleShot(True)
+            self.viewport_timer.setInterval(50)
+            dbg_connect(self.viewport_timer.timeout, self.viewport_changed)
+            for signal in (view.horizontalScrollBar().valueChanged,
+                           view.verticalScrollBar().valueChanged, view.resized):
+                signal.connect(lambda *args: self.viewport_timer.start())
+
+    def close(self):
+        self.closed = True
+
+    def read_trace_stamp(self):
+        """Size and modification time of the trace file, or None if it cannot
+        be read"""
+
+        try:
+            st = os.stat(self.vcd_map.vcd_fn)
+        except (OSError, TypeError):
+            return None
+
+        return st.st_size, st.st_mtime_ns
+
+    def expanded_traced_pipes(self, node):
+        yield from self.traced_pipes.get(node, ())
+        for child in node.child:
+            if isinstance(child, NodeModel) and not child.view.collapsed:
+                yield from self.expanded_traced_pipes(child)
+
+    def node_expand_toggled(self, expanded, node):
+        if not expanded:
+            self.visible_pipes.difference_update(self.expanded_traced_pipes(node))
+        elif node_visible(node):
+            self.visible_pipes.update(self.expanded_traced_pipes(node))
+
+    def pipes_in_view(self):
+        """Visible traced pipes that intersect the viewport"""
+
+        if self.view is None:
+            return self.visible_pipes
+
+        rect = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+        return [p for p in self.visible_pipes if p.view.sceneBoundingRect().intersects(rect)]
+
+    def viewport_changed(self):
+        if not self.closed and not self.updating:
+            self.update_pipes(self.pipes_in_view())
 
     def has_item_wave(self, item):
         return item in self.vcd_map
@@ -507,21 +660,42 @@ class GtkWaveGraphIntf(QtCore.QObject):
         elif isinstance(item, NodeModel):
             return self.show_node(item)
 
-    def show_node(self, node):
-        sigs = self.vcd_map[node]
+    def show_items(self, items):
+        """Adds the waves of multiple items with a single GTKWave command
+        round-trip"""
+
         commands = []
+        for item in items:
+            if isinstance(item, PipeModel):
+                self.show_pipe(item, commands)
+            elif isinstance(item, NodeModel):
+                self.show_node(item, commands)
+
+        if commands:
+            self.gtkwave_intf.command(commands)
+
+    def show_node(self, node, commands=None):
+        batch = commands is not None
+        if not batch:
+            commands = []
+
+        sigs = self.vcd_map[node]
         commands.append(f'gtkwave::addSignalsFromList {{{" ".join(sigs)}}}')
         commands.append(f'gtkwave::highlightSignalsFromList {{{" ".join(sigs)}}}')
 
         commands.append(f'gtkwave::/Edit/Create_Group {node.name}')
 
-        self.gtkwave_intf.command(commands)
+        if not batch:
+            self.gtkwave_intf.command(commands)
 
         self.items_on_wave[node] = node.name
 
         return node.name
 
-    def show_pipe(self, pipe):
+    def show_pipe(self, pipe, commands=None):
+        batch = commands is not None
+        if not batch:
+            commands = []
 
         struct_sigs = collections.defaultdict(dict)
         sig_names = []
@@ -532,8 +706,6 @@ class GtkWaveGraphIntf(QtCore.QObject):
         data_sig_stem = self.vcd_map.pipe_data_signal_stem(pipe)
         self.items_on_wave[pipe] = intf_name
 
-        commands = []
-
         dti_translate_path = os.path.join(os.path.dirname(__file__), "dti_translate.py")
         commands.append(f'gtkwave::addSignalsFromList {{{valid_sig} {ready_sig}}}')
         commands.append(f'gtkwave::highlightSignalsFromList {{{valid_sig} {ready_sig}}}')
@@ -590,11 +762,12 @@ class GtkWaveGraphIntf(QtCore.QObject):
 
         commands.append('select_trace_by_name {' + intf_name + '}')
         commands.append('gtkwave::/Edit/Toggle_Group_Open|Close')
-        self.gtkwave_intf.command(commands)
+        if not batch:
+            self.gtkwave_intf.command(commands)
 
         return intf_name
 
-    def update_rtl_intf(self, pipe, wave_status):
+    def update_rtl_intf(self, pipe, wave_status, timestep):
         if wave_status == '1 0':
             status = 'active'
         elif wave_status == '0 1':
@@ -604,14 +777,14 @@ class GtkWaveGraphIntf(QtCore.QObject):
         else:
             status = 'empty'
 
-        pipe.set_status(status)
+        pipe.set_status(status, timestep)
 
     @property
     def cmd_id(self):
         return id(self) & 0xffff
 
     def gtkwave_resp(self, ret, cmd_id):
-        if cmd_id != self.cmd_id:
+        if self.closed or cmd_id != self.cmd_id:
             return
 
         if self.gtkwave_intf.shmidcat:
@@ -620,19 +793,32 @@ class GtkWaveGraphIntf(QtCore.QObject):
                 ts = 0
 
             status, _, gtk_timestep = ret.rpartition('\n')
+            prev_timestep = self.timestep
             if gtk_timestep:
                 try:
                     self.timestep = (int(gtk_timestep) // 10) - 1
                 except ValueError:
                     self.timestep = 0
 
+            # New waves were streamed in
+            if self.timestep != prev_timestep:
+                self.graph.model_index.invalidate_pipes()
+
             if not gtk_timestep or ts - self.timestep > 100:
                 self.should_update = False
                 self.gtkwave_intf.command_nb(f'gtkwave::nop', self.cmd_id)
                 # print("Again")
                 return
+        else:
+            # The statuses are kept per timestep, so they only go stale if the
+            # reloaded trace file has grown
+            trace_stamp = self.read_trace_stamp()
+            if trace_stamp is None or trace_stamp != self.trace_stamp:
+                self.graph.model_index.invalidate_pipes()
 
-        self.update_pipes(p for p in self.vcd_map.vcd_pipes if p.view.isVisible())
+            self.trace_stamp = trace_stamp
+
+        self.update_pipes(self.pipes_in_view())
 
         if self.gtkwave_intf.shmidcat:
             self.gtkwave_intf.command(f'set_marker_if_needed {self.timestep*10}')
@@ -650,21 +836,39 @@ class GtkWaveGraphIntf(QtCore.QObject):
 
         # print(f'Exiting')
 
+    @perf.timed('gtkwave/update_pipes')
     def update_pipes(self, pipes):
         ts = self.vcd_map.timestep
 
-        signal_names = [
-            (pipe, self.vcd_map.pipe_data_signal_stem(pipe)[:-4]) for pipe in pipes
-            if pipe.status[0] != ts
-        ]
+        # The pipes of a broadcast share the producer valid, so they are
+        # queried together: the valid once, and the readies of the consumers
+        signal_names = []
+        broadcasts = {}
+        for pipe in pipes:
+            # Already evaluated from the current waves
+            if pipe.status_timestep == ts:
+                continue
+
+            stem = self.vcd_map.pipe_data_signal_stem(pipe)[:-4]
+            if pipe.broadcast is not None:
+                bc_stem = self.vcd_map.broadcast_stem(pipe)
+                if bc_stem is not None:
+                    broadcasts.setdefault(bc_stem, []).append((pipe, stem))
+                    continue
+
+            signal_names.append((pipe, stem))
+
+        if not signal_names and not broadcasts:
+            return
 
         for i in range(0, len(signal_names), 20):
 
             cur_slice = slice(i, min(len(signal_names), i + 20))
             cur_names = signal_names[cur_slice]
 
-            ret = self.gtkwave_intf.command(
-                f'get_values {ts*10} [list {" ".join(s[1] for s in cur_names)}]')
+            with perf.timer('gtkwave/roundtrip'):
+                ret = self.gtkwave_intf.command(
+                    f'get_values {ts*10} [list {" ".join(s[1] for s in cur_names)}]')
             rtl_status = ret.split('\n')
 
             # assert len(rtl_status) == (cur_slice.stop - cur_slice.start)
@@ -672,7 +876,29 @@ class GtkWaveGraphIntf(QtCore.QObject):
                 continue
 
             for wave_status, (pipe, _) in zip(rtl_status, cur_names):
-                self.update_rtl_intf(pipe, wave_status.strip())
+                self.update_rtl_intf(pipe, wave_status.strip(), ts)
+
+        broadcasts = list(broadcasts.items())
+        for i in range(0, len(broadcasts), 20):
+            cur_bcs = broadcasts[i:i + 20]
+            query = ' '.join(
+                '{' + ' '.join([stem] + [s[1] for s in branches]) + '}'
+                for stem, branches in cur_bcs)
+
+            with perf.timer('gtkwave/roundtrip'):
+                ret = self.gtkwave_intf.command(f'get_bc_values {ts*10} {{{query}}}')
+            rtl_status = ret.split('\n')
+
+            if len(rtl_status) != len(cur_bcs):
+                continue
+
+            for bc_status, (_, branches) in zip(rtl_status, cur_bcs):
+                valid, *readies = bc_status.split()
+                if len(readies) != len(branches):
+                    continue
+
+                for ready, (pipe, _) in zip(readies, branches):
+                    self.update_rtl_intf(pipe, f'{valid} {ready}', ts)
 
         NodeActivityVisitor().visit(reg['gearbox/graph_model'])
 
@@ -686,7 +912,7 @@ class GtkWaveGraphIntf(QtCore.QObject):
         # )
 
         if timestep < self.timestep:
-            self.update_pipes(p for p in self.vcd_map.vcd_pipes if p.view.isVisible())
+            self.update_pipes(self.pipes_in_view())
             self.gtkwave_intf.command(f'set_marker_if_needed {timestep*10}')
         elif not self.updating:
             self.should_update = False
@@ -702,7 +928,7 @@ class GtkWaveGraphIntf(QtCore.QObject):
 class GtkWaveBufferPlugin(LayoutPlugin):
     @classmethod
     def bind(cls):
-        reg['gearbox/plugins/gtkwave'] = {}
+        reg['gearbox/gtkwave/pool'] = {}
 
         @inject
         def menu_visibility(var, visible, gtkwave=MayInject('gearbox/gtkwave/inst')):
@@ -711,3 +937,7 @@ class GtkWaveBufferPlugin(LayoutPlugin):
                     inst.command('gtkwave::toggleStripGUI')
 
         reg.confdef('gearbox/gtkwave/menus', default=False, setter=menu_visibility)
+
+        # Command used to start GTKWave, gtkwave_mock.mock_cmd() gives a
+        # headless stand-in
+        reg.confdef('gearbox/gtkwave/cmd', default='gtkwave')
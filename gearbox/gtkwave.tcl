@@ -178,6 +178,24 @@ proc get_values {timestep signals} {
     }
 }
 
+# Handshake state of the broadcast interfaces. Each broadcast is a list of
+# the producer signal stem followed by the consumer signal stems. Prints the
+# producer valid followed by the consumer readies, one line per broadcast.
+proc get_bc_values {timestep broadcasts} {
+    foreach b $broadcasts {
+        set stem [lindex $b 0]
+        if { [catch {set vals [gtkwave::signalValueAt ${stem}valid $timestep]} err] } {
+            set vals 0
+        }
+        foreach s [lrange $b 1 end] {
+            if { [catch {lappend vals [gtkwave::signalValueAt ${s}ready $timestep]} err] } {
+                lappend vals 0
+            }
+        }
+        puts $vals
+    }
+}
+
 proc set_marker_if_needed {timestep} {
     if {[gtkwave::getMarker] != $timestep} {
         gtkwave::setMarker $timestep
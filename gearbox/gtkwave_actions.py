@@ -1,9 +1,7 @@
 from PySide2.QtCore import Qt
 from PySide2 import QtCore
 from .actions import shortcut
-from .layout import active_buffer
-from .gtkwave import GtkWaveBufferPlugin
-from .graph import GraphBufferPlugin
+from .layout import LayoutPlugin, active_buffer
 from pygears.conf import Inject, inject_async, inject, MayInject, reg
 from .sim_actions import time_search, step_simulator, cont_simulator
 from .timestep_modeline import TimestepModeline
@@ -89,7 +87,7 @@ shortcut('gtkwave', Qt.Key_C)(cont_simulator)
 shortcut('gtkwave', Qt.Key_Colon)(time_search)
 
 
-class GtkwaveActionsPlugin(GraphBufferPlugin, GtkWaveBufferPlugin):
+class GtkwaveActionsPlugin(LayoutPlugin):
     @classmethod
     def bind(cls):
         reg['gearbox/plugins/graph']['GraphGtkwaveSelectSync'] = GraphGtkwaveSelectSync
@@ -98,14 +98,15 @@ class GtkWaveProc(QtCore.QObject):
         local_dir = os.path.abspath(os.path.dirname(__file__))
         script_fn = os.path.join(local_dir, "gtkwave.tcl")
         gtkwaverc_fn = os.path.join(local_dir, "gtkwaverc")
+        gtkwave_cmd = reg['gearbox/gtkwave/cmd']
 
         if self.shmidcat:
             print(f'Shared mem addr: {self.trace_fn}')
-            cmd = f'gtkwave -W -I -r {gtkwaverc_fn} -T {script_fn} {self.trace_fn}'
+            cmd = f'{gtkwave_cmd} -W -I -r {gtkwaverc_fn} -T {script_fn} {self.trace_fn}'
 
         else:
             print(f'VCD file: {self.trace_fn}')
-            cmd = f'gtkwave -W -r {gtkwaverc_fn} -T {script_fn} {self.trace_fn}'
+            cmd = f'{gtkwave_cmd} -W -r {gtkwaverc_fn} -T {script_fn} {self.trace_fn}'
 
         print(cmd)
         self.p = pexpect.spawnu(cmd)
@@ -274,12 +275,19 @@ class GtkWaveWindow(QtCore.QObject):
     def window_up(self, version, pid, window_id, graph=Inject('gearbox/graph')):
         print(f'GtkWave started: {version}, {pid}, {window_id}')
         self.window_id = window_id
-        self.gtkwave_win = QtGui.QWindow.fromWinId(window_id)
-        self.widget = QtWidgets.QWidget.createWindowContainer(self.gtkwave_win)
-        # self.widget.setFocusPolicy(QtCore.Qt.NoFocus)
-        self.widget.setWindowFlag(QtCore.Qt.X11BypassWindowManagerHint)
-        self.widget.setWindowFlag(QtCore.Qt.BypassGraphicsProxyWidget)
-        self.widget.setWindowFlag(QtCore.Qt.BypassWindowManagerHint)
+
+        if window_id == 0:
+            # Headless stand-in, see gtkwave_mock.py
+            self.gtkwave_win = None
+            self.widget = QtWidgets.QLabel(f'{version} (no window)')
+            self.widget.setAlignment(QtCore.Qt.AlignCenter)
+        else:
+            self.gtkwave_win = QtGui.QWindow.fromWinId(window_id)
+            self.widget = QtWidgets.QWidget.createWindowContainer(self.gtkwave_win)
+            # self.widget.setFocusPolicy(QtCore.Qt.NoFocus)
+            self.widget.setWindowFlag(QtCore.Qt.X11BypassWindowManagerHint)
+            self.widget.setWindowFlag(QtCore.Qt.BypassGraphicsProxyWidget)
+            self.widget.setWindowFlag(QtCore.Qt.BypassWindowManagerHint)
 
         self.command(f'gtkwave::toggleStripGUI')
         if reg['gearbox/gtkwave/menus']:
@@ -0,0 +1,443 @@
+"""Stand-in for the GTKWave process driven by gearbox.
+
+Speaks the Tcl prompt protocol used by gtkwave_intf.GtkWaveProc for the
+subset of commands gearbox issues, with the waveforms read from a VCD file by
+a Python parser. It has no window, so it reports the window ID 0, and it can
+add artificial latency to the responses in order to measure gearbox
+round-trip behaviour under load.
+
+The module is standalone so that it starts quickly without importing the
+gearbox package. Select it with:
+
+    reg['gearbox/gtkwave/cmd'] = gearbox.gtkwave_mock.mock_cmd(latency=0.002)
+
+Events ("$$Name:data" lines) can be triggered with "mock::event Name data".
+They are sent after the prompt, as unsolicited output.
+"""
+
+import argparse
+import bisect
+import json
+import os
+import signal
+import sys
+import time
+
+VERSION = 'GTKWave Analyzer v3.3.98 (w)1999-2019 BSI'
+
+
+def mock_cmd(latency=0, value_latency=0, stats=None):
+    """Returns the command that starts the mock in place of gtkwave."""
+
+    cmd = [sys.executable, os.path.abspath(__file__)]
+    if latency:
+        cmd.append(f'--latency {latency}')
+
+    if value_latency:
+        cmd.append(f'--value-latency {value_latency}')
+
+    if stats:
+        cmd.append(f'--stats {stats}')
+
+    return ' '.join(cmd)
+
+
+class VcdSignal:
+    __slots__ = ('name', 'width', 'times', 'values')
+
+    def __init__(self, name, width):
+        self.name = name
+        self.width = width
+        self.times = []
+        self.values = []
+
+    def change(self, t, val):
+        if self.times and self.times[-1] == t:
+            self.values[-1] = val
+        else:
+            self.times.append(t)
+            self.values.append(val)
+
+    def value_at(self, t):
+        i = bisect.bisect_right(self.times, t)
+        if i == 0:
+            return 'x'
+
+        return self.values[i - 1]
+
+
+class Vcd:
+    """Incremental VCD parser. Each call to read() consumes the complete lines
+    appended to the file since the previous call."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.pos = 0
+        self.time = 0
+        self.signals = {}
+        self.by_id = {}
+        self.scope = []
+        self.in_header = True
+        self.pending = []
+        self.read()
+
+    @property
+    def facs(self):
+        return list(self.signals)
+
+    def read(self):
+        try:
+            with open(self.fn) as f:
+                f.seek(self.pos)
+                data = f.read()
+        except OSError:
+            return
+
+        end = data.rfind('\n') + 1
+        self.pos += len(data[:end].encode())
+
+        for line in data[:end].split('\n'):
+            tokens = line.split()
+            if not tokens:
+                continue
+
+            if self.in_header:
+                self.header(tokens)
+            else:
+                self.changes(tokens)
+
+    def header(self, tokens):
+        self.pending.extend(tokens)
+        if self.pending[-1] != '$end' and self.pending[0] != '$enddefinitions':
+            return
+
+        tokens, self.pending = self.pending, []
+        kind = tokens[0]
+
+        if kind == '$scope':
+            self.scope.append(tokens[2])
+        elif kind == '$upscope':
+            self.scope.pop()
+        elif kind == '$var':
+            width, ident, ref = int(tokens[2]), tokens[3], tokens[4]
+            if tokens[5] != '$end':
+                ref += tokens[5]
+            elif width > 1:
+                ref += f'[{width-1}:0]'
+
+            name = '.'.join(self.scope + [ref])
+            sig = VcdSignal(name, width)
+            self.signals[name] = sig
+            self.by_id.setdefault(ident, []).append(sig)
+        elif kind == '$enddefinitions':
+            self.in_header = False
+
+    def changes(self, tokens):
+        first = tokens[0]
+        c = first[0]
+
+        if c == '#':
+            self.time = int(first[1:])
+        elif c in 'bBrR':
+            for sig in self.by_id.get(tokens[1], ()):
+                sig.change(self.time, first[1:])
+        elif c in '01xXzZ':
+            for sig in self.by_id.get(first[1:], ()):
+                sig.change(self.time, c)
+
+    def value_at(self, name, t):
+        return self.signals[name].value_at(t)
+
+
+class TclError(Exception):
+    pass
+
+
+def split_words(cmd, evaluate):
+    """Splits a Tcl command into words, evaluating the [...] substitutions"""
+
+    words = []
+    i = 0
+    n = len(cmd)
+
+    def balanced(i, opening, closing):
+        depth = 0
+        for j in range(i, n):
+            if cmd[j] == opening:
+                depth += 1
+            elif cmd[j] == closing:
+                depth -= 1
+                if depth == 0:
+                    return j
+
+        raise TclError(f'missing "{closing}"')
+
+    while i < n:
+        c = cmd[i]
+        if c.isspace():
+            i += 1
+        elif c == '{':
+            j = balanced(i, '{', '}')
+            words.append(cmd[i + 1:j])
+            i = j + 1
+        elif c == '[':
+            j = balanced(i, '[', ']')
+            words.append(evaluate(cmd[i + 1:j]))
+            i = j + 1
+        elif c == '"':
+            j = cmd.index('"', i + 1)
+            words.append(cmd[i + 1:j])
+            i = j + 1
+        else:
+            j = i
+            while j < n and not cmd[j].isspace():
+                j += 1
+
+            words.append(cmd[i:j])
+            i = j
+
+    return words
+
+
+def complete(cmd):
+    return cmd.count('{') == cmd.count('}') and cmd.count('[') == cmd.count(']')
+
+
+class GtkWaveMock:
+    def __init__(self, trace_fn, interactive=False, latency=0, value_latency=0):
+        self.vcd = Vcd(trace_fn)
+        self.interactive = interactive
+        self.latency = latency
+        self.value_latency = value_latency
+        self.marker = -1
+        self.traces = []
+        self.highlighted = set()
+        self.events = []
+        self.stats = {}
+
+        self.commands = {
+            'list': lambda *args: ' '.join(args),
+            'list_signals': self.list_signals,
+            'list_traces': self.list_traces,
+            'get_values': self.get_values,
+            'get_bc_values': self.get_bc_values,
+            'set_marker_if_needed': self.set_marker_if_needed,
+            'select_trace_by_name': self.select_trace_by_name,
+            'if': self.tcl_if,
+            'puts': lambda *args: args[-1] + '\n',
+            'mock::event': self.event,
+            'gtkwave::getGtkWindowID': lambda: '0',
+            'gtkwave::getNumFacs': lambda: str(len(self.vcd.signals)),
+            'gtkwave::getFacName': lambda i: self.vcd.facs[int(i)],
+            'gtkwave::getTotalNumTraces': lambda: str(len(self.traces)),
+            'gtkwave::getMarker': lambda: str(self.marker),
+            'gtkwave::setMarker': self.set_marker,
+            'gtkwave::reLoadFile': self.reload,
+            'gtkwave::nop': self.nop,
+            'gtkwave::addSignalsFromList': self.add_signals,
+            'gtkwave::highlightSignalsFromList': self.highlight_signals,
+            'gtkwave::/Edit/Highlight_All': self.highlight_all,
+            'gtkwave::/Edit/UnHighlight_All': self.highlighted.clear,
+            'gtkwave::/Edit/Cut': self.cut,
+            'gtkwave::/Edit/Create_Group': self.add_trace,
+            'gtkwave::/Edit/Combine_Down': self.add_trace,
+        }
+
+    def evaluate(self, cmd):
+        words = split_words(cmd.strip(), self.evaluate)
+        if not words:
+            return ''
+
+        name = words[0]
+        self.stats[name] = self.stats.get(name, 0) + 1
+
+        if name in self.commands:
+            try:
+                ret = self.commands[name](*words[1:])
+            except (TypeError, ValueError, IndexError):
+                raise TclError(f'wrong arguments for "{name}"')
+
+            return '' if ret is None else ret
+
+        if name.startswith('gtkwave::'):
+            return ''
+
+        raise TclError(f'invalid command name "{name}"')
+
+    def tcl_if(self, cond, body):
+        if cond.strip() not in ('0', 'false'):
+            return self.script(body)
+
+    def script(self, body):
+        out = []
+        cmd = ''
+        for line in body.split('\n'):
+            cmd += line + '\n'
+            if complete(cmd):
+                out.append(self.evaluate(cmd))
+                cmd = ''
+
+        return ''.join(out)
+
+    def list_signals(self):
+        return ''.join(f'{s}\n' for s in self.vcd.signals)
+
+    def list_traces(self):
+        return ''.join(f'{s}\n' for s in self.traces)
+
+    def get_values(self, timestep, signals):
+        timestep = int(timestep)
+        stems = signals.split()
+        if self.value_latency:
+            time.sleep(self.value_latency * len(stems))
+
+        out = []
+        for s in stems:
+            try:
+                valid = self.vcd.value_at(f'{s}valid', timestep)
+                ready = self.vcd.value_at(f'{s}ready', timestep)
+                out.append(f'{valid} {ready}\n')
+            except KeyError:
+                out.append('0 0\n')
+
+        return ''.join(out)
+
+    def get_bc_values(self, timestep, broadcasts):
+        timestep = int(timestep)
+        broadcasts = [b.split() for b in split_words(broadcasts, self.evaluate)]
+        if self.value_latency:
+            time.sleep(self.value_latency * sum(len(b) for b in broadcasts))
+
+        out = []
+        for stem, *consumers in broadcasts:
+            try:
+                vals = [self.vcd.value_at(f'{stem}valid', timestep)]
+            except KeyError:
+                vals = ['0']
+
+            for s in consumers:
+                try:
+                    vals.append(self.vcd.value_at(f'{s}ready', timestep))
+                except KeyError:
+                    vals.append('0')
+
+            out.append(' '.join(vals) + '\n')
+
+        return ''.join(out)
+
+    def set_marker(self, timestep):
+        self.marker = int(timestep)
+
+    def set_marker_if_needed(self, timestep):
+        if self.marker != int(timestep):
+            self.set_marker(timestep)
+
+    def add_trace(self, name):
+        self.traces.append(name.strip())
+
+    def add_signals(self, signals):
+        for s in signals.split():
+            if s in self.vcd.signals:
+                self.traces.append(s)
+
+    def select_trace_by_name(self, name):
+        name = name.strip()
+        if name in self.traces:
+            self.highlighted.add(name)
+
+    def highlight_signals(self, signals):
+        self.highlighted.update(signals.split())
+
+    def highlight_all(self):
+        self.highlighted.update(self.traces)
+
+    def cut(self):
+        self.traces = [t for t in self.traces if t not in self.highlighted]
+        self.highlighted.clear()
+
+    def reload(self):
+        self.vcd.read()
+
+    def nop(self):
+        # In the interactive mode the trace keeps streaming in, and gearbox
+        # reads the current simulation time from the response
+        if self.interactive:
+            self.vcd.read()
+            return f'{self.vcd.time}\n'
+
+    def event(self, name, data=''):
+        self.events.append(f'$${name}:{data}')
+
+    def respond(self, cmd):
+        if self.latency:
+            time.sleep(self.latency)
+
+        try:
+            out = self.script(cmd)
+        except TclError as e:
+            out = f'{e}\n'
+
+        return out
+
+    def run(self, stdin, stdout):
+        stdout.write(f'\n{VERSION}\n\n% ')
+        stdout.flush()
+
+        cmd = ''
+        for line in stdin:
+            cmd += line
+            if not complete(cmd):
+                continue
+
+            out = self.respond(cmd)
+            cmd = ''
+
+            stdout.write(out + '% ')
+            for e in self.events:
+                stdout.write(f'{e}\n')
+
+            self.events.clear()
+            stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.partition('\n')[0])
+    parser.add_argument('-W', action='store_true', help="Ignored, for compatibility with gtkwave")
+    parser.add_argument('-I', action='store_true', help="Interactive (shared memory) mode")
+    parser.add_argument('-r', help="Ignored, for compatibility with gtkwave")
+    parser.add_argument('-T', help="Ignored, for compatibility with gtkwave")
+    parser.add_argument(
+        '--latency', type=float, default=0, help="Delay added to each command, in seconds")
+    parser.add_argument(
+        '--value-latency',
+        type=float,
+        default=0,
+        help="Delay added for each signal queried by get_values, in seconds")
+    parser.add_argument(
+        '--stats', help="JSON file to which the command counts are written at exit")
+    parser.add_argument('trace_fn')
+
+    args = parser.parse_args(argv)
+
+    mock = GtkWaveMock(
+        args.trace_fn,
+        interactive=args.I,
+        latency=args.latency,
+        value_latency=args.value_latency)
+
+    def finish(*_):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGHUP, finish)
+    signal.signal(signal.SIGTERM, finish)
+
+    try:
+        mock.run(sys.stdin, sys.stdout)
+    finally:
+        if args.stats:
+            with open(args.stats, 'w') as f:
+                json.dump(mock.stats, f)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import functools
 import pygments
 from pygments.formatters import HtmlFormatter
 from pygments.lexers import get_lexer_by_name
@@ -35,9 +36,28 @@ def fontify(s, bold=False, **style):
     return res
 
 
+@functools.lru_cache(maxsize=None)
+def get_lexer(language):
+    return get_lexer_by_name(language)
+
+
+@functools.lru_cache(maxsize=None)
+def get_formatter(style='default'):
+    return HtmlFormatter(style=style)
+
+
+@functools.lru_cache(maxsize=None)
+def get_style_defs(style='default'):
+    return get_formatter(style).get_style_defs('.highlight')
+
+
+@functools.lru_cache(maxsize=1024)
+def _highlight(text, language, style):
+    return pygments.highlight(text, get_lexer(language), get_formatter(style))
+
+
 def highlight(text, language, style='emacs', add_style=True):
-    lexer = get_lexer_by_name(language)
-    html = pygments.highlight(text, lexer, HtmlFormatter(style=style))
+    html = _highlight(text, language, style)
 
     if add_style:
         return highlight_style(html)
@@ -46,6 +66,6 @@ def highlight(text, language, style='emacs', add_style=True):
 
 
 def highlight_style(text):
-    return '\n'.join(("<style>", HtmlFormatter().get_style_defs('.highlight'),
+    return '\n'.join(("<style>", get_style_defs(),
                       '.highlight  { background: rgba(255, 255, 255, 0); }'
                       "</style>", text))
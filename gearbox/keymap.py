@@ -0,0 +1,127 @@
+import math
+
+from PySide2 import QtCore
+from PySide2.QtGui import QKeySequence
+
+from . import html_utils
+
+
+def domain_enabled(shortcut_domain, domain):
+    """Whether a shortcut registered for shortcut_domain is active in domain"""
+
+    return ((shortcut_domain is None and domain is not None and domain[0] != '_')
+            or (shortcut_domain == domain))
+
+
+def key_name(key):
+    if key == QtCore.Qt.Key_Plus:
+        return '+'
+
+    keys = QKeySequence(key).toString().split('+')
+
+    try:
+        shift_id = keys.index('Shift')
+        keys.pop(shift_id)
+    except ValueError:
+        shift_id = None
+
+    try:
+        ctrl_id = keys.index('Ctrl')
+        keys.pop(ctrl_id)
+    except ValueError:
+        ctrl_id = None
+
+    if shift_id is None and keys[0].isalpha():
+        keys[0] = keys[0].lower()
+
+    if ctrl_id is not None:
+        keys.insert(0, 'C')
+
+    return "-".join(keys)
+
+
+class KeymapNode:
+    __slots__ = ('prefix', 'children', 'shortcut', 'rendered')
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.children = {}
+        self.shortcut = None
+        # which_key panels rendered for this prefix, keyed by the panel width
+        self.rendered = {}
+
+
+class Keymap:
+    """Trie of the shortcuts active in a domain, keyed by their key
+    sequences."""
+
+    def __init__(self, domain, shortcuts, prefixes):
+        self.domain = domain
+        self.prefixes = prefixes
+        self.root = KeymapNode(())
+
+        for s in shortcuts:
+            node = self.root
+            for k in s.key:
+                try:
+                    node = node.children[k]
+                except KeyError:
+                    child = KeymapNode(node.prefix + (k, ))
+                    node.children[k] = child
+                    node = child
+
+            node.shortcut = s
+
+    def find(self, prefix):
+        node = self.root
+        for k in prefix:
+            node = node.children.get(k)
+            if node is None:
+                return None
+
+        return node
+
+    def is_prefix(self, prefix):
+        node = self.find(prefix)
+        return node is not None and bool(node.children)
+
+    def group_name(self, prefix):
+        return (self.prefixes.get((self.domain, prefix))
+                or self.prefixes.get((None, prefix)) or 'group')
+
+    def which_key(self, prefix, font_metrics, width):
+        """HTML table of the keys that continue the prefix"""
+
+        node = self.find(prefix)
+        if node is None or not node.children:
+            return ''
+
+        if width in node.rendered:
+            return node.rendered[width]
+
+        entries = {}
+        for k, child in node.children.items():
+            name = key_name(k)
+            if child.children:
+                group_name = self.group_name(child.prefix)
+                entries[name] = (group_name,
+                                 html_utils.fontify(group_name, color='#749dff'))
+            else:
+                entries[name] = (child.shortcut.name, child.shortcut.name)
+
+        max_width = max(
+            font_metrics.horizontalAdvance(f'{name} -> {s}')
+            for name, (s, _) in entries.items())
+
+        row_size = max(width // max_width, 1)
+        row_num = math.ceil(len(entries) / row_size)
+
+        table = [[] for _ in range(row_num)]
+        for i, name in enumerate(sorted(entries)):
+            shortcut_string = (html_utils.fontify(name, color='darkorchid') +
+                               f' &#8594; {entries[name][1]}')
+
+            table[i % row_num].append((f'width={max_width}', shortcut_string))
+
+        node.rendered[width] = html_utils.tabulate(table)
+        return node.rendered[width]
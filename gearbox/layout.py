@@ -615,6 +615,8 @@ class LayoutPlugin(PluginBase):
     @classmethod
     def bind(cls):
         reg['gearbox/plugins'] = {}
+        reg['gearbox/plugins/graph'] = {}
+        reg['gearbox/plugins/gtkwave'] = {}
 
         @inject
         def tab_bar_visibility(var,
@@ -1,29 +1,24 @@
 #!/usr/bin/python
 import argparse
+import importlib
 import os
 import sys
 import runpy
 
-from PySide2 import QtGui, QtWidgets
+from PySide2 import QtCore, QtGui, QtWidgets
 
-from gearbox.graph import graph
-from gearbox.gtkwave import gtkwave
 from gearbox.main_window import MainWindow
-from gearbox.sniper import sniper
-from gearbox.which_key import which_key
-from pygears.conf import Inject, MayInject, inject, reg
+from pygears.conf import Inject, MayInject, PluginBase, inject, reg
 from pygears.conf.custom_settings import load_rc
-from pygears.sim.extens.vcd import SimVCDPlugin
 
 from . import (
-    actions, buffer_actions, description_actions, file_actions, graph_actions,
-    gtkwave_actions, toggle_actions, window_actions)
-from .compilation import compilation
+    actions, buffer_actions, compilation, description_actions, file_actions,
+    graph_actions, gtkwave_actions, perf_actions, toggle_actions,
+    window_actions)
 from .pygears_proxy import sim_bridge
 # import gearbox.graph
 from .theme import themify
 from .saver import get_save_file_path, load
-from .timekeep import timekeep
 
 # @inject
 # def main(layers=Inject('gearbox/layers')):
@@ -68,6 +63,20 @@ def set_main_win_title(
     main.setWindowTitle(f'Gearbox - {script_fn}')
 
 
+class LazyLayer:
+    """Layer given as "module:function", imported only when set up."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self):
+        module, _, name = self.path.partition(':')
+        return getattr(importlib.import_module(module), name)()
+
+    def __repr__(self):
+        return f'LazyLayer({self.path!r})'
+
+
 class Application(QtWidgets.QApplication):
     def quit(self):
         # import faulthandler
@@ -104,14 +113,22 @@ def main_loop(script_fn, argv, layers=Inject('gearbox/layers')):
     sim_bridge_inst.script_loading_started.connect(set_main_win_title)
     sim_bridge_inst.script_loading_started.connect(load)
 
-    for l in layers:
-        l()
+    def setup_layers():
+        for l in layers:
+            l()
 
-    if script_fn:
-        load_rc('.pygears', os.path.dirname(script_fn))
-        sim_bridge_inst.invoke_method('run_model', script_fn=script_fn)
+        # The layer modules bind their configuration only when they are
+        # imported, so the settings for them are applied once more
+        load_rc('.gearbox', os.getcwd())
+
+        if script_fn:
+            load_rc('.pygears', os.path.dirname(script_fn))
+            sim_bridge_inst.invoke_method('run_model', script_fn=script_fn)
 
+    # Layers are set up once the event loop has started, so that the main
+    # window gets painted before their modules are imported
     main_window.show()
+    QtCore.QTimer.singleShot(0, setup_layers)
     ret = app.exec_()
     script_fn = reg['gearbox/main/new_model_script_fn']
     if script_fn:
@@ -146,9 +163,23 @@ def main(argv=sys.argv, layers=Inject('gearbox/layers')):
     main_loop(args.script, argv)
 
 
-class SimPlugin(SimVCDPlugin):
+def sim_vcd():
+    # Importing the VCD extension registers its configuration
+    from pygears.sim.extens.vcd import SimVCDPlugin
+
+    reg['sim_extens/vcd/shmidcat'] = True
+    reg['sim_extens/vcd/vcd_fifo'] = True
+
+
+class SimPlugin(PluginBase):
     @classmethod
     def bind(cls):
-        reg['gearbox/layers'] = [timekeep, which_key, graph, gtkwave, sniper, compilation]
-        reg['sim_extens/vcd/shmidcat'] = True
-        reg['sim_extens/vcd/vcd_fifo'] = True
+        reg['gearbox/layers'] = [
+            sim_vcd,
+            LazyLayer('gearbox.timekeep:timekeep'),
+            LazyLayer('gearbox.which_key:which_key'),
+            LazyLayer('gearbox.graph:graph'),
+            LazyLayer('gearbox.gtkwave:gtkwave'),
+            LazyLayer('gearbox.sniper:sniper'),
+            LazyLayer('gearbox.compilation:compilation'),
+        ]
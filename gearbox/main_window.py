@@ -7,6 +7,7 @@ from functools import partial
 from .minibuffer import Minibuffer
 from .layout import BufferStack
 from .dbg import dbg_connect
+from .keymap import Keymap, domain_enabled
 
 
 class Action(QtWidgets.QAction):
@@ -38,11 +39,7 @@ class Action(QtWidgets.QAction):
         return self.isEnabled()
 
     def domain_changed(self, domain):
-        if ((self.domain is None and domain is not None and domain[0] != '_')
-                or (self.domain == domain)):
-            self.setEnabled(True)
-        else:
-            self.setEnabled(False)
+        self.setEnabled(domain_enabled(self.domain, domain))
 
 
 class Shortcut(QtCore.QObject):
@@ -81,20 +78,23 @@ class Shortcut(QtCore.QObject):
         return self._qshortcut.isEnabled()
 
     def domain_changed(self, domain):
-        if ((self.domain is None and domain is not None and domain[0] != '_')
-                or (self.domain == domain)):
-            self._qshortcut.setEnabled(True)
-        else:
-            self._qshortcut.setEnabled(False)
+        self._qshortcut.setEnabled(domain_enabled(self.domain, domain))
 
 
 @inject
-def register_prefix(domain, prefix, name, prefixes=Inject('gearbox/prefixes')):
+def register_prefix(domain,
+                    prefix,
+                    name,
+                    prefixes=Inject('gearbox/prefixes'),
+                    main=MayInject('gearbox/main/inst')):
     if not isinstance(prefix, tuple):
         prefix = (prefix, )
 
     prefixes[(domain, prefix)] = name
 
+    if main is not None:
+        main.keymaps.clear()
+
 
 @inject
 def message(message, minibuffer=Inject('gearbox/minibuffer')):
@@ -121,6 +121,8 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self._undo_stack = QtWidgets.QUndoStack(self)
         self.shortcuts = []
+        # Keymap tries of the shortcuts active in each domain, built on demand
+        self.keymaps = {}
 
         self.vbox = QtWidgets.QVBoxLayout()
         self.vbox.setSpacing(0)
@@ -246,8 +248,26 @@ class MainWindow(QtWidgets.QMainWindow):
     #     print(f"Press event: {event.key()} + {event.modifiers()} => {event.text()}")
     #     return super().keyPressEvent(event)
 
+    @property
+    @inject
+    def keymap(self, prefixes=Inject('gearbox/prefixes')):
+        domain = reg['gearbox/domain']
+        try:
+            return self.keymaps[domain]
+        except KeyError:
+            pass
+
+        keymap = Keymap(
+            domain,
+            [s for s in self.shortcuts if domain_enabled(s.domain, domain)],
+            prefixes)
+
+        self.keymaps[domain] = keymap
+        return keymap
+
     def add_shortcut(self, shortcut):
         self.shortcuts.append(shortcut)
+        self.keymaps.clear()
         shortcut.activated.connect(partial(self.shortcut_trigger, shortcut))
 
     def shortcut_trigger(self, shortcut):
@@ -188,6 +188,12 @@ class Minibuffer(QtCore.QObject):
         self._completer.setCurrentRow(cur_row)
 
     def tab_key_event(self):
+        if hasattr(self._completer, 'tab_completion'):
+            self.input_box.setText(
+                self._completer.tab_completion(self.input_box.text()))
+            self._completer.complete()
+            return
+
         prefix = os.path.commonprefix(list(self.completions()))
         self.input_box.setText(prefix)
 
@@ -1,15 +1,20 @@
+import collections
+from typing import NamedTuple
+
 import pygraphviz as pgv
 from PySide2 import QtCore, QtGui, QtWidgets
 
-from pygears.conf import Inject, inject
+from pygears.conf import Inject, PluginBase, inject, reg
 from pygears.core.port import InPort
 
-from . import gv_utils
-from .constants import NODE_SEL_BORDER_COLOR, NODE_SEL_COLOR, Z_VAL_NODE
+from . import gv_utils, perf, sugiyama
+from .constants import (LAYOUT_CACHE_SIZE, LAYOUT_NODESEP, LAYOUT_RANKSEP,
+                        NODE_SEL_BORDER_COLOR, NODE_SEL_COLOR, Z_VAL_NODE)
 from .node_abstract import AbstractNodeItem
 from .pipe import Pipe
+from .spatial import LayerIndex
 from .port import PortItem
-from .theme import themify
+from .theme import theme_color
 
 NODE_SIM_STATUS_COLOR = {
     'empty_hier': '#303a45',
@@ -21,6 +26,49 @@ NODE_SIM_STATUS_COLOR = {
 }
 
 
+_layout_cache = collections.OrderedDict()
+
+
+def dot_layout(graph):
+    """Runs dot on the graph, reusing the result of a previous layout of the
+    graph with the same structure.
+
+    Layout nodes and edges have stable names derived from the order in which
+    they were added, so the unchanged parts of a reloaded model hit the cache.
+    """
+
+    nodes = graph.nodes()
+    edge_ids = graph.edges(keys=True)
+    edges = [graph.get_edge(*e) for e in edge_ids]
+
+    key = (tuple((str(n), n.attr.get('label')) for n in nodes),
+           tuple((str(u), str(v), k, e.attr.get('tailport'),
+                  e.attr.get('headport'))
+                 for (u, v, k), e in zip(edge_ids, edges)))
+
+    if key in _layout_cache:
+        perf.count('layout/cache_hit')
+        _layout_cache.move_to_end(key)
+        node_pos, edge_pos = _layout_cache[key]
+
+        for n, pos in zip(nodes, node_pos):
+            n.attr['pos'] = pos
+
+        for e, pos in zip(edges, edge_pos):
+            e.attr['pos'] = pos
+
+        return
+
+    with perf.timer('layout/dot'):
+        graph.layout(prog='dot')
+
+    _layout_cache[key] = ([n.attr['pos'] for n in nodes],
+                          [e.attr['pos'] for e in edges])
+
+    while len(_layout_cache) > LAYOUT_CACHE_SIZE:
+        _layout_cache.popitem(last=False)
+
+
 def node_layout(self):
     self._width, self._height = calc_node_size(self)
     self.post_init()
@@ -59,16 +107,213 @@ def minimized_layout(self):
         text.hide()
 
 
-def hier_layout(self):
-    if self.collapsed:
-        node_layout(self)
+def edge_painter(self, painter, option, widget):
+    if not (self.selected and NODE_SEL_BORDER_COLOR):
         return
 
-    for node in self._nodes:
-        if hasattr(node, 'layout'):
-            node.layout()
+    painter.save()
+    painter.setBrush(QtGui.QColor(*NODE_SEL_BORDER_COLOR))
+    painter.setPen(QtCore.Qt.NoPen)
+    painter.drawEllipse(self.boundingRect())
+    painter.restore()
+
+
+def edge_layout(self):
+    """Folded node drawn only as the junction of its pipes"""
+
+    minimized_layout(self)
+    self._width, self._height = 4, 4
+
+    for port in list(self._input_items) + list(self._output_items):
+        port.setPos(self._width / 2, self._height / 2)
+
+
+def is_minimized(node):
+    return node._layout in (minimized_layout, edge_layout)
+
+
+class LayoutChains(NamedTuple):
+    # Pipes running through the spliced nodes, keyed by the first pipe
+    chains: dict
+    # Spliced nodes, left out of the layout graph
+    spliced: set
+    # Pipes of the chains other than the first
+    inner: set
+
+
+def layout_chains(self):
+    """Chains of pipes through the child nodes folded to edges (see fold.py).
+
+    A folded node with a single pipe in and a single pipe out is spliced out of
+    the layout graph: the pipes from the producer through the chain of such
+    nodes to the consumer are laid out as a single edge."""
+
+    if self._layout_chains is not None:
+        return self._layout_chains
+
+    pipes_in = {}
+    pipes_out = {}
+    for pipe in self.pipes:
+        pipes_in.setdefault(pipe.input_port.node, []).append(pipe)
+        pipes_out.setdefault(pipe.output_port.node, []).append(pipe)
+
+    spliced = {
+        node
+        for node in self._nodes if node._layout is edge_layout
+        and len(pipes_in.get(node, ())) == 1 and len(pipes_out.get(node, ())) == 1
+    }
+
+    chains = {}
+    inner = set()
+    for pipe in self.pipes:
+        if pipe.output_port.node in spliced:
+            continue
+
+        chain = [pipe]
+        while chain[-1].input_port.node in spliced:
+            chain.append(pipes_out[chain[-1].input_port.node][0])
+
+        if len(chain) > 1:
+            chains[pipe] = chain
+            inner.update(chain[1:])
+
+    self._layout_chains = LayoutChains(chains, spliced, inner)
+    return self._layout_chains
+
+
+def layout_pipe_ends(self, pipe):
+    """Layout edge ends of the pipe, running to the end of the chain the pipe
+    starts, if any"""
+
+    tail, tailport, head, headport = layout_edge_ends(self, pipe)
+    chain = layout_chains(self).chains.get(pipe)
+    if chain is not None:
+        _, _, head, headport = layout_edge_ends(self, chain[-1])
+
+    return tail, tailport, head, headport
+
+
+def _mid(a, b):
+    return ((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+
+
+def _split_bezier(seg):
+    p0, p1, p2, p3 = seg
+    p01, p12, p23 = _mid(p0, p1), _mid(p1, p2), _mid(p2, p3)
+    p012, p123 = _mid(p01, p12), _mid(p12, p23)
+    mid = _mid(p012, p123)
+    return [(p0, p01, p012, mid), (mid, p123, p23, p3)]
+
+
+def split_path(path, parts):
+    """Splits a path in the dot edge position format into consecutive parts in
+    the same format, each ending where the next one starts"""
+
+    points = [tuple(p) for p in path[1:]]
+    segments = [tuple(points[i:i + 4]) for i in range(0, len(points) - 3, 3)]
+    if not segments:
+        segments = [(points[0], points[0], points[-1], points[-1])]
+
+    while len(segments) < parts:
+        longest = max(
+            range(len(segments)),
+            key=lambda i: abs(segments[i][3][0] - segments[i][0][0]) + abs(
+                segments[i][3][1] - segments[i][0][1]))
+        segments[longest:longest + 1] = _split_bezier(segments[longest])
+
+    split = []
+    size, extra = divmod(len(segments), parts)
+    start = 0
+    for i in range(parts):
+        end = start + size + (i < extra)
+        part = [segments[start][0]] + [p for seg in segments[start:end] for p in seg[1:]]
+        split.append([part[-1]] + part)
+        start = end
+
+    return split
+
+
+def splice_paths(self, positions, paths):
+    """Splits the paths of the chains between their pipes, and places the
+    spliced nodes where the pipes meet"""
+
+    chains = layout_chains(self).chains
+    if not chains:
+        return paths
+
+    paths = dict(paths)
+    for pipe, chain in chains.items():
+        parts = split_path(paths[pipe], len(chain))
+        for p, part in zip(chain, parts):
+            paths[p] = part
+
+        for p, part in zip(chain, parts[:-1]):
+            positions[self.layout_node_map[p.input_port.node]] = part[0]
+
+    return paths
+
+
+def sync_layout_graph(self):
+    """Updates the graphviz graph with the edges of the pipes connecting the
+    nodes folded to edges, which are added only once all the pipes are known,
+    see layout_chains()"""
+
+    chains = layout_chains(self)
+
+    nodes = {
+        self.layout_node_map[n]
+        for n in self._nodes if n._layout is edge_layout and n not in chains.spliced
+    }
+
+    edges = {}
+    for pipe in self.pipes:
+        if pipe in chains.inner:
+            continue
+
+        if not (pipe.input_port.node._layout is edge_layout
+                or pipe.output_port.node._layout is edge_layout):
+            continue
+
+        tail, tailport, head, headport = layout_pipe_ends(self, pipe)
+        edges[self.layout_pipe_map[pipe]] = (
+            tail, head, '' if tailport is None else f'o{tailport}',
+            '' if headport is None else f'i{headport}')
+
+    graph = self.layout_graph
+    for key, edge in list(self.layout_deferred_edges.items()):
+        if edges.get(key) != edge:
+            graph.delete_edge(edge[0], edge[1], key)
+            del self.layout_deferred_edges[key]
+
+    for name in self.layout_deferred_nodes - nodes:
+        graph.delete_node(name)
+
+    for name in nodes - self.layout_deferred_nodes:
+        graph.add_node(name, shape='none', margin=0)
+
+    self.layout_deferred_nodes = nodes
+
+    for key, edge in edges.items():
+        if key not in self.layout_deferred_edges:
+            tail, head, tailport, headport = edge
+            graph.add_edge(tail, head, tailport=tailport, headport=headport, key=key)
+            self.layout_deferred_edges[key] = edge
+
+
+def gv_point_load(point):
+    return tuple(float(num) for num in point.split(',')[-2:])
+
+
+def graphviz_layout(self):
+    sync_layout_graph(self)
+    spliced = layout_chains(self).spliced
+    perf.count('layout/nodes', len(self._nodes) - len(spliced))
+    perf.count('layout/spliced', len(spliced))
 
     for node in self._nodes:
+        if node in spliced:
+            continue
+
         gvn = self.get_layout_node(node)
         try:
             del gvn.attr['width']
@@ -76,7 +321,7 @@ def hier_layout(self):
         except KeyError:
             pass
 
-        if node._layout != minimized_layout:
+        if not is_minimized(node):
             # gvn.attr['label'] = gv_utils.get_node_record(node).replace(
             #     '\n', '')
             node_layout_rec = gv_utils.get_node_record(node)
@@ -113,7 +358,7 @@ def hier_layout(self):
     # for pipe in self.pipes:
     #     gve = self.get_layout_edge(pipe)
 
-    self.layout_graph.layout(prog='dot')
+    dot_layout(self.layout_graph)
 
     # if self.model.name == '/riscv':
     #     # if self.model.name == '':
@@ -123,20 +368,238 @@ def hier_layout(self):
     # self.layout_graph.draw(f'{self.model.name.replace("/", "_")}.png')
     # self.layout_graph.draw(f'{self.model.name.replace("/", "_")}.dot')
 
-    def gv_point_load(point):
-        return tuple(float(num) for num in point.split(',')[-2:])
+    positions = {
+        str(n): gv_point_load(n.attr['pos'])
+        for n in self.layout_graph.nodes()
+    }
+
+    inner = layout_chains(self).inner
+    paths = {}
+    for pipe in self.pipes:
+        if pipe in inner:
+            continue
+
+        gve = self.get_layout_edge(pipe)
+        paths[pipe] = [gv_point_load(point) for point in gve.attr['pos'].split()]
+
+    for junction, pipe in self.layout_trunks.items():
+        gve = self.layout_graph.get_edge(
+            layout_edge_tail(self, pipe)[0], junction, junction)
+        paths[junction] = [gv_point_load(point) for point in gve.attr['pos'].split()]
+
+    return positions, join_broadcast_paths(self, splice_paths(self, positions, paths))
+
+
+def layout_edge_tail(self, pipe):
+    node1 = pipe.output_port.node
+    if node1 is self:
+        return f'i{pipe.output_port.model.index}', None
+
+    return self.layout_node_map[node1], (None if is_minimized(node1)
+                                         else pipe.output_port.model.index)
+
 
-    # if self.name:
-    #     import pdb; pdb.set_trace()
+def layout_junction(self, pipe):
+    """Junction node the broadcast pipe branches from, or None"""
+
+    if pipe.model.broadcast is None:
+        return None
+
+    return self.layout_junction_map[pipe.model.rtl]
+
+
+def layout_edge_ends(self, pipe):
+    node2 = pipe.input_port.node
+
+    junction = layout_junction(self, pipe)
+    if junction is None:
+        tail, tailport = layout_edge_tail(self, pipe)
+    else:
+        tail, tailport = junction, None
 
+    if node2 is self:
+        head, headport = f'o{pipe.input_port.model.index}', None
+    else:
+        head = self.layout_node_map[node2]
+        headport = (None if is_minimized(node2) else
+                    pipe.input_port.model.index)
+
+    return tail, tailport, head, headport
+
+
+def join_broadcast_paths(self, paths):
+    """Prepends the path of the broadcast trunk to the paths of its branches.
+    Paths include the trunks by the junction node ID, in the dot edge
+    position format: the end point followed by the Bezier points."""
+
+    if not self.layout_trunks:
+        return paths
+
+    joined = {}
+    for pipe in self.pipes:
+        path = paths[pipe]
+        junction = layout_junction(self, pipe)
+        if junction is not None:
+            trunk = paths[junction]
+            # Straight segment bridges the trunk end and the branch start
+            path = ([path[0]] + trunk[1:] + [trunk[-1], path[1], path[1]] +
+                    path[2:])
+
+        joined[pipe] = path
+
+    return joined
+
+
+def native_layout_graph(self):
+    """Snapshot of the subgraph for the native layouter, see sugiyama.py"""
+
+    def port_offsets(ports):
+        return tuple(p.y() + p._height / 2 for p in ports)
+
+    sources = [f'i{i}' for i in range(len(self.inputs))]
+    sinks = [f'o{i}' for i in range(len(self.outputs))]
+
+    chains = layout_chains(self)
+    perf.count('layout/nodes', len(self._nodes) - len(chains.spliced))
+    perf.count('layout/spliced', len(chains.spliced))
+
+    nodes = {v: sugiyama.LayoutNode(1, 1) for v in sources}
+    for node in self._nodes:
+        if node in chains.spliced:
+            continue
+
+        if is_minimized(node):
+            nodes[self.layout_node_map[node]] = sugiyama.LayoutNode(
+                node.width, node.height)
+        else:
+            nodes[self.layout_node_map[node]] = sugiyama.LayoutNode(
+                node.width, node.height, port_offsets(node.inputs),
+                port_offsets(node.outputs))
+
+    for v in sinks:
+        nodes[v] = sugiyama.LayoutNode(1, 1)
+
+    for junction in self.layout_trunks:
+        nodes[junction] = sugiyama.LayoutNode(1, 1)
+
+    edges = [
+        sugiyama.LayoutEdge(junction, *layout_edge_tail(self, pipe), junction, None)
+        for junction, pipe in self.layout_trunks.items()
+    ]
+    edges.extend(
+        sugiyama.LayoutEdge(pipe, *layout_pipe_ends(self, pipe))
+        for pipe in self.pipes if pipe not in chains.inner)
+
+    return nodes, edges, sources, sinks
+
+
+@inject
+def native_layout(graph,
+                  routing=Inject('gearbox/layout/routing'),
+                  ranksep=Inject('gearbox/layout/ranksep'),
+                  nodesep=Inject('gearbox/layout/nodesep')):
+    nodes, edges, sources, sinks = graph
+    with perf.timer('layout/native'):
+        positions, paths = sugiyama.layout(
+            nodes,
+            edges,
+            sources,
+            sinks,
+            routing=routing,
+            ranksep=ranksep,
+            nodesep=nodesep)
+
+    # Prepend the end point like in the dot edge positions
+    return positions, {pipe: [p[-1]] + p for pipe, p in paths.items()}
+
+
+# Layouts restored from a session snapshot, keyed by the node name, see
+# session.py. Each is used once, in place of running the layout engine.
+_layout_presets = {}
+
+
+def set_layout_presets(presets):
+    _layout_presets.clear()
+    _layout_presets.update(presets)
+
+
+def preset_layout(self):
+    preset = _layout_presets.pop(self.model.name, None)
+    if preset is None:
+        return None
+
+    positions, paths = preset
+    if (len(paths) != len(self.pipes) or any(
+            self.layout_node_map[n] not in positions for n in self._nodes)):
+        return None
+
+    return positions, dict(zip(self.pipes, paths))
+
+
+def native_hier_layout(top):
+    """Lays out the expanded hierarchy under top level by level, starting
+    from the innermost gears."""
+
+    levels = []
+
+    def collect(node, depth):
+        if len(levels) <= depth:
+            levels.append([])
+
+        for n in node._nodes:
+            if n._layout is hier_layout and not n.collapsed:
+                collect(n, depth + 1)
+            elif hasattr(n, 'layout'):
+                n.layout()
+
+        levels[depth].append(node)
+
+    collect(top, 0)
+
+    for level in reversed(levels):
+        for node in level:
+            preset = preset_layout(node)
+            if preset is None:
+                positions, paths = native_layout(native_layout_graph(node))
+                paths = splice_paths(node, positions, paths)
+                preset = positions, join_broadcast_paths(node, paths)
+
+            place_layout(node, *preset)
+
+
+@perf.timed('layout/hier')
+@inject
+def hier_layout(self, engine=Inject('gearbox/layout/engine')):
+    if self.collapsed:
+        node_layout(self)
+        return
+
+    if engine == 'native':
+        native_hier_layout(self)
+        return
+
+    for node in self._nodes:
+        if hasattr(node, 'layout'):
+            node.layout()
+
+    layout = preset_layout(self)
+    if layout is None:
+        layout = graphviz_layout(self)
+
+    place_layout(self, *layout)
+
+
+def place_layout(self, positions, paths):
     padding_y = 40
     padding_x = -5
 
+    # Kept for the session snapshots
+    self.layout_result = (positions, paths)
+
     bounding_box = None
     # print(f"Layout for: {node.name}")
     for node in self._nodes:
-        gvn = self.get_layout_node(node)
-        pos = gv_point_load(gvn.attr['pos'])
+        pos = positions[self.layout_node_map[node]]
         node_bounding_box = QtCore.QRectF(pos[0] - node.width / 2,
                                           pos[1] - node.height / 2, node.width,
                                           node.height)
@@ -153,8 +616,7 @@ def hier_layout(self):
         port_height = self.inputs[0].boundingRect().height()
 
         for i, p in enumerate(self.inputs):
-            gvn = self.layout_graph.get_node(f'i{i}')
-            pos = gv_point_load(gvn.attr['pos'])
+            pos = positions[f'i{i}']
             node_bounding_box = QtCore.QRectF(pos[0] - port_height / 2,
                                               pos[1] - port_height / 2 + 0.5,
                                               port_height, port_height)
@@ -168,8 +630,7 @@ def hier_layout(self):
         port_height = self.outputs[0].boundingRect().height()
 
         for i, p in enumerate(self.outputs):
-            gvn = self.layout_graph.get_node(f'o{i}')
-            pos = gv_point_load(gvn.attr['pos'])
+            pos = positions[f'o{i}']
             node_bounding_box = QtCore.QRectF(pos[0] - port_height / 2,
                                               pos[1] - port_height / 2 + 0.5,
                                               port_height, port_height)
@@ -179,52 +640,6 @@ def hier_layout(self):
             p.setPos(node_bounding_box.x(), node_bounding_box.y())
             bounding_box = bounding_box.united(node_bounding_box)
 
-    for pipe in self.pipes:
-        gve = self.get_layout_edge(pipe)
-        path = [gv_point_load(point) for point in gve.attr['pos'].split()]
-        pipe.layout_path = [QtCore.QPointF(p[0], p[1]) for p in path]
-
-        # max_y = max(max_y, *(p.y() for p in pipe.layout_path))
-
-    self.layers = []
-
-    class Layer(list):
-        def __init__(self, node):
-            super().__init__([node])
-            self.rect = node.boundingRect()
-            self.rect.translate(node.pos())
-
-        def __str__(self):
-            return str(self.rect)
-
-        def __repr__(self):
-            return repr(self.rect)
-
-        def add(self, node):
-            rect = node.boundingRect()
-            rect.translate(node.pos())
-
-            if ((self.rect.left() < rect.right())
-                    and (self.rect.right() > rect.left())):
-                self.append(node)
-                self.sort(key=lambda n: n.y())
-                return True
-            else:
-                return False
-
-    def find_layer(node):
-        for layer in self.layers:
-            if layer.add(node):
-                return
-        else:
-            self.layers.append(Layer(node))
-
-    # print(f"  Bounding box: {bounding_box}")
-
-    self.layers = sorted(self.layers, key=lambda l: l.rect.left())
-    for node in self._nodes:
-        find_layer(node)
-
     for item in (self._nodes + self.inputs + self.outputs):
         # node.setY(max_y - node.y() + padding)
         item.setPos(
@@ -233,6 +648,8 @@ def hier_layout(self):
             (item.y() - bounding_box.y() + item._height) + padding_y)
         # print(f'  {item.name}: {item.pos()}')
 
+    self.layers = LayerIndex(self._nodes)
+
     for p in self.inputs:
         p.setX(padding_x)
 
@@ -240,10 +657,10 @@ def hier_layout(self):
         p.setX(bounding_box.width() + padding_x)
 
     for pipe in self.pipes:
-        for p in pipe.layout_path:
-            p.setX(p.x() - bounding_box.x() + padding_x)
-            p.setY(bounding_box.height() - (p.y() - bounding_box.y()) +
-                   padding_y)
+        pipe.layout_path = tuple(
+            (x - bounding_box.x() + padding_x,
+             bounding_box.height() - (y - bounding_box.y()) + padding_y)
+            for x, y in paths[pipe])
 
     if self.parent is not None:
         self.size_expander(self)
@@ -322,7 +739,7 @@ def hier_painter(self, painter, option, widget):
 
     top_rect = QtCore.QRectF(0.0, 0.0, rect.width(), 20.0)
     if self.collapsed:
-        painter.setBrush(QtGui.QColor(themify(self.status_color)))
+        painter.setBrush(theme_color(self.status_color))
     else:
         painter.setBrush(QtGui.QColor(*self.border_color))
 
@@ -377,7 +794,7 @@ def node_painter(self, painter, option, widget):
     path = QtGui.QPainterPath()
     path.addRoundedRect(label_rect, radius_x / 1.5, radius_y / 1.5)
     # painter.setBrush(QtGui.QColor(0, 0, 0, 50))
-    painter.setBrush(QtGui.QColor(themify(self.status_color)))
+    painter.setBrush(theme_color(self.status_color))
     painter.fillPath(path, painter.brush())
 
     border_width = 0.8
@@ -415,7 +832,17 @@ class NodeItem(AbstractNodeItem):
         self.layout_graph = pgv.AGraph(
             directed=True, rankdir='LR', splines='true', strict=False)
 
+        self.layout_node_map = {}
         self.layout_pipe_map = {}
+        # Broadcast trunks: junction node ID by the interface, and the first
+        # pipe of the broadcast by the junction node ID
+        self.layout_junction_map = {}
+        self.layout_trunks = {}
+        # Layout graph items of the nodes folded to edges, see
+        # sync_layout_graph()
+        self._layout_chains = None
+        self.layout_deferred_nodes = set()
+        self.layout_deferred_edges = {}
 
         self._text_item = QtWidgets.QGraphicsTextItem(self.name, self)
         self._input_items = {}
@@ -432,6 +859,7 @@ class NodeItem(AbstractNodeItem):
 
         self.collapsed = False if parent is None else True
         self.layers = []
+        self.layout_result = None
 
     def setup_done(self):
         self._hide_single_port_labels()
@@ -458,7 +886,8 @@ class NodeItem(AbstractNodeItem):
 
     @property
     def hierarchical(self):
-        return bool(self._nodes)
+        # Folded hierarchical gears (see fold.py) are never expanded
+        return bool(self._nodes) and self._layout is hier_layout
 
     def auto_resize(self, nodes=None):
         if self.collapsed:
@@ -496,26 +925,46 @@ class NodeItem(AbstractNodeItem):
         for obj in self.children:
             obj.hide()
 
+        self.detach_children()
         self.collapsed = True
         self.size_expander(self)
-        self.graph.top.layout()
-        self.graph.ensureVisible(self)
+        self.graph.relayout(focus=self)
         self.graph.node_expand_toggled.emit(False, self.model)
 
     def expand(self):
         if not self.collapsed or not self.hierarchical:
             return None
 
+        self.attach_children()
         for obj in self.children:
             obj.show()
 
         self.collapsed = False
         self.show()
-        self.graph.top.layout()
-        self.graph.ensureVisible(self)
+        self.graph.relayout(focus=self)
         self.selected = True
         self.graph.node_expand_toggled.emit(True, self.model)
 
+    def detach_children(self):
+        # Collapsed subtrees are kept out of the scene, so that the scene index,
+        # item queries and selection handling only deal with what can be
+        # shown. The items stay referenced in _nodes and pipes and keep their
+        # positions relative to this node.
+        for obj in self.children:
+            scene = obj.scene()
+            if scene is not None:
+                scene.removeItem(obj)
+            else:
+                obj.setParentItem(None)
+
+    def attach_children(self):
+        for obj in self.children:
+            if self.parent is not None:
+                if obj.parentItem() is not self:
+                    obj.setParentItem(self)
+            elif obj.scene() is None:
+                self.graph.scene().addItem(obj)
+
     def get_visible_objs(self, objtype):
         for n in self._nodes:
             if (objtype is None) or (objtype is NodeItem):
@@ -811,8 +1260,13 @@ class NodeItem(AbstractNodeItem):
 
         node.update()
 
-        self.layout_graph.add_node(id(node), shape='none', margin=0)
+        self.layout_node_map[node] = f'n{len(self._nodes)}'
+        if node._layout is not edge_layout:
+            self.layout_graph.add_node(
+                self.layout_node_map[node], shape='none', margin=0)
+
         self._nodes.append(node)
+        self._layout_chains = None
 
     def add_pipe(self, pipe):
         if self.parent is not None:
@@ -820,39 +1274,52 @@ class NodeItem(AbstractNodeItem):
         else:
             self.graph.scene().addItem(pipe)
 
+        self.layout_pipe_map[pipe] = f'p{len(self.pipes)}'
         self.pipes.append(pipe)
+        self._layout_chains = None
 
         node1 = pipe.output_port.parentItem()
         node2 = pipe.input_port.parentItem()
 
-        tailport = ''
-        if node1._layout != minimized_layout:
-            tailport = f'o{pipe.output_port.model.index}'
-
-        headport = ''
-        if node2._layout != minimized_layout:
-            headport = f'i{pipe.input_port.model.index}'
-
-        if (node2 is not self) and (node1 is not self):
-            self.layout_graph.add_edge(
-                id(node1),
-                id(node2),
-                tailport=tailport,
-                headport=headport,
-                key=id(pipe))
-
-        elif (node2 is self):
-            self.layout_graph.add_edge(
-                id(node1),
-                f'o{pipe.input_port.model.index}',
-                tailport=tailport,
-                key=id(pipe))
+        if node1 is self:
+            tail, tailport = f'i{pipe.output_port.model.index}', ''
+        else:
+            tail = self.layout_node_map[node1]
+            tailport = ('' if is_minimized(node1) else
+                        f'o{pipe.output_port.model.index}')
+
+        if node2 is self:
+            head, headport = f'o{pipe.input_port.model.index}', ''
         else:
-            self.layout_graph.add_edge(
-                f'i{pipe.output_port.model.index}',
-                id(node2),
-                headport=headport,
-                key=id(pipe))
+            head = self.layout_node_map[node2]
+            headport = ('' if is_minimized(node2) else
+                        f'i{pipe.input_port.model.index}')
+
+        # The pipes of a broadcast interface share a trunk edge from the
+        # producer to a junction point, and branch from there to the consumers
+        if pipe.model.broadcast is not None:
+            junction = self.layout_junction_map.get(pipe.model.rtl)
+            if junction is None:
+                junction = f'b{len(self.layout_trunks)}'
+                self.layout_junction_map[pipe.model.rtl] = junction
+                self.layout_trunks[junction] = pipe
+                self.layout_graph.add_node(
+                    junction, shape='point', width=0.05, height=0.05, label='')
+                self.layout_graph.add_edge(
+                    tail, junction, tailport=tailport, key=junction)
+
+            tail, tailport = junction, ''
+
+        # Added once all the pipes are known, see sync_layout_graph()
+        if node1._layout is edge_layout or node2._layout is edge_layout:
+            return
+
+        self.layout_graph.add_edge(
+            tail,
+            head,
+            tailport=tailport,
+            headport=headport,
+            key=self.layout_pipe_map[pipe])
 
     @property
     def node_bounding_rect(self):
@@ -876,23 +1343,22 @@ class NodeItem(AbstractNodeItem):
         return bound
 
     def get_layout_edge(self, pipe):
-        node1 = pipe.output_port.node
-        node2 = pipe.input_port.node
-
-        if node1 is self:
-            node1_id = f'i{pipe.output_port.model.index}'
-        else:
-            node1_id = id(node1)
-
-        if node2 is self:
-            node2_id = f'o{pipe.input_port.model.index}'
-        else:
-            node2_id = id(node2)
-
-        return self.layout_graph.get_edge(node1_id, node2_id, id(pipe))
+        tail, _, head, _ = layout_pipe_ends(self, pipe)
+        return self.layout_graph.get_edge(tail, head, self.layout_pipe_map[pipe])
 
     def get_layout_node(self, node):
-        return self.layout_graph.get_node(str(id(node)))
+        return self.layout_graph.get_node(self.layout_node_map[node])
 
     def layout(self):
         self._layout(self)
+
+
+class NodeLayoutPlugin(PluginBase):
+    @classmethod
+    def bind(cls):
+        # 'dot' or 'native' (see sugiyama.py)
+        reg.confdef('gearbox/layout/engine', default='dot')
+        # Pipe routing of the native engine: 'spline' or 'orthogonal'
+        reg.confdef('gearbox/layout/routing', default='spline')
+        reg.confdef('gearbox/layout/ranksep', default=LAYOUT_RANKSEP)
+        reg.confdef('gearbox/layout/nodesep', default=LAYOUT_NODESEP)
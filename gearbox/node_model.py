@@ -1,20 +1,19 @@
 import inspect
 import os
-import functools
+from array import array
 from pygears.sim.modules import SimVerilated, SimSocket
 from pygears.core.hier_node import HierVisitorBase
 from pygears.core.hier_node import NamedHierNode
 from pygears.conf import inject, Inject, reg
 from .node import NodeItem, hier_expand, hier_painter, node_painter, minimized_painter
 from .node import node_layout, hier_layout, minimized_layout
-from pygears.sim.modules.cosim_base import CosimBase
 from .pipe import Pipe
+from .fold import fold_view
 from .html_utils import highlight, tabulate, highlight_style
 from pygears.core.partial import Partial
 from pygears.core.port import InPort, HDLProducer, HDLConsumer
 from pygears.typing.pprint import pprint
 from pygears.typing import is_type
-from pygears.lib import sieve, cast
 
 from .constants import Z_VAL_PIPE
 
@@ -99,10 +98,78 @@ class DummyOutNode(AbstractNodeItem):
         self._layout(self)
 
 
+class ModelIndex:
+    """Per-design registry of the models. Nodes and pipes are numbered by
+    consecutive integer ids, and their statuses are kept in arrays indexed by
+    these ids. For the nodes, the timestep at which the status was last set is
+    kept alongside. For the pipes, it is the timestep of the waves the status
+    was evaluated from, or -1 if the status is dirty and has to be evaluated
+    again."""
+
+    __slots__ = ('nodes', 'pipes', 'node_status', 'node_timestep',
+                 'pipe_status', 'pipe_timestep')
+
+    statuses = ['empty']
+    status_codes = {'empty': 0}
+
+    def __init__(self):
+        self.nodes = []
+        self.pipes = []
+        self.node_status = array('B')
+        self.node_timestep = array('q')
+        self.pipe_status = array('B')
+        self.pipe_timestep = array('q')
+
+    @classmethod
+    def status_code(cls, status):
+        try:
+            return cls.status_codes[status]
+        except KeyError:
+            cls.status_codes[status] = len(cls.statuses)
+            cls.statuses.append(status)
+            return cls.status_codes[status]
+
+    def add_node(self, node):
+        self.nodes.append(node)
+        self.node_status.append(0)
+        self.node_timestep.append(-1)
+        return len(self.nodes) - 1
+
+    def add_pipe(self, pipe):
+        self.pipes.append(pipe)
+        self.pipe_status.append(0)
+        self.pipe_timestep.append(-1)
+        return len(self.pipes) - 1
+
+    def invalidate_pipes(self):
+        """Marks all the pipe statuses dirty, e.g. when the waves change"""
+
+        self.pipe_timestep = array('q', [-1]) * len(self.pipes)
+
+
+def timekeep_timestep(timekeep):
+    timestep = getattr(timekeep, 'timestep', None)
+    return -1 if timestep is None else timestep
+
+
 class PipeModel(NamedHierNode):
-    def __init__(self, intf, consumer_id, parent=None):
+    __slots__ = ('svintf', 'rtl', 'consumer_id', 'consumer', 'broadcast', 'view',
+                 'model_index', 'id', '_name', '_basename')
+
+    def __init__(self, intf, consumer_id, parent=None, broadcast=None):
         super().__init__(parent=parent)
 
+        self.model_index = parent.model_index
+        self.id = self.model_index.add_pipe(self)
+        self._name = None
+        self._basename = None
+
+        # Pipes of a broadcast interface share the list of all its pipes, one
+        # per consumer
+        self.broadcast = broadcast
+        if broadcast is not None:
+            broadcast.append(self)
+
         self.svintf = reg['hdlgen/map'].get(intf, None)
 
         self.rtl = intf
@@ -162,12 +229,22 @@ class PipeModel(NamedHierNode):
         else:
             self.set_status('empty')
 
-    @inject
-    def set_status(self, status, timestep=Inject('gearbox/timekeep')):
-        self.status = (timestep, status)
-        self.status = status
+    def set_status(self, status, timestep=-1):
+        """Sets the status evaluated from the waves at the timestep. The
+        statuses not read from the waves leave the pipe dirty."""
+
+        self.model_index.pipe_status[self.id] = ModelIndex.status_code(status)
+        self.model_index.pipe_timestep[self.id] = timestep
         self.view.set_status(status)
 
+    @property
+    def status(self):
+        return ModelIndex.statuses[self.model_index.pipe_status[self.id]]
+
+    @property
+    def status_timestep(self):
+        return self.model_index.pipe_timestep[self.id]
+
     @property
     def description(self):
         tooltip = '<b>{}</b><br/>'.format(self.name)
@@ -178,29 +255,33 @@ class PipeModel(NamedHierNode):
         return tooltip
 
     @property
-    @functools.lru_cache(maxsize=None)
     def name(self):
-        name = self.rtl.name
-        if self.svintf is not None:
-            name = name.split('.')[0] + '.' + self.svintf.basename
+        if self._name is None:
+            name = self.rtl.name
+            if self.svintf is not None:
+                name = name.split('.')[0] + '.' + self.svintf.basename
 
-        if len(self.rtl.consumers) > 1:
-            return f'{name}_bc_{self.consumer_id}'
-        else:
-            return name
+            if len(self.rtl.consumers) > 1:
+                name = f'{name}_bc_{self.consumer_id}'
+
+            self._name = name
+
+        return self._name
 
     @property
-    @functools.lru_cache(maxsize=None)
     def basename(self):
-        if self.svintf is not None:
-            basename = self.svintf.basename
-        else:
-            basename = self.rtl.basename
+        if self._basename is None:
+            if self.svintf is not None:
+                basename = self.svintf.basename
+            else:
+                basename = self.rtl.basename
 
-        if len(self.rtl.consumers) > 1:
-            return f'{basename}_bc_{self.consumer_id}'
-        else:
-            return basename
+            if len(self.rtl.consumers) > 1:
+                basename = f'{basename}_bc_{self.consumer_id}'
+
+            self._basename = basename
+
+        return self._basename
 
     @property
     def hierarchical(self):
@@ -208,10 +289,15 @@ class PipeModel(NamedHierNode):
 
 
 class NodeModel(NamedHierNode):
+    __slots__ = ('rtl', 'view', 'model_index', 'id', 'rtl_map', 'input_ext_pipes',
+                 'output_ext_pipes', 'input_int_pipes', 'output_int_pipes')
+
     def __init__(self, gear, parent=None):
         super().__init__(parent=parent)
 
         self.rtl = gear
+        self.model_index = ModelIndex() if parent is None else parent.model_index
+        self.id = self.model_index.add_node(self)
 
         # self.input_ext_pipes = [None] * len(self.rtl.in_ports)
         # self.output_ext_pipes = [None] * len(self.rtl.out_ports)
@@ -226,18 +312,12 @@ class NodeModel(NamedHierNode):
 
         layout = hier_layout if self.hierarchical else node_layout
         painter = None
-        try:
-            # print(self.definition.__name__)
-            # if self.definition.__name__ == 'sieve':
-            #     import pdb; pdb.set_trace()
-
-            if self.definition in (sieve.func, cast.func):
-                # import pdb
-                # pdb.set_trace()
-                layout = minimized_layout
-                painter = minimized_painter
-        except TypeError:
-            pass
+        size_expander = None
+
+        folded = fold_view(gear)
+        if folded is not None:
+            layout, painter = folded
+            size_expander = lambda x: None
 
         self.view = NodeItem(
             gear.basename,
@@ -256,9 +336,10 @@ class NodeModel(NamedHierNode):
             if parent is not None:
                 self.rtl_map[child].view.hide()
 
-        self.setup_view(painter=painter)
+        self.setup_view(painter=painter, size_expander=size_expander)
 
         for child in self.rtl.local_intfs:
+            broadcast = [] if len(child.consumers) > 1 else None
             for i in range(len(child.consumers)):
                 if isinstance(child.producer, HDLProducer):
                     continue
@@ -271,12 +352,13 @@ class NodeModel(NamedHierNode):
                     continue
 
                 self.rtl_map[child] = PipeModel(
-                    child, consumer_id=i, parent=self)
+                    child, consumer_id=i, parent=self, broadcast=broadcast)
 
                 if parent is not None:
                     self.rtl_map[child].view.hide()
 
-
+        if parent is not None:
+            self.view.detach_children()
         # import pdb; pdb.set_trace()
         if self.on_error_path:
             self.set_status('error')
@@ -309,9 +391,14 @@ class NodeModel(NamedHierNode):
 
     @inject
     def set_status(self, status, timestep=Inject('gearbox/timekeep')):
-        self.status = (timestep, status)
+        self.model_index.node_status[self.id] = ModelIndex.status_code(status)
+        self.model_index.node_timestep[self.id] = timekeep_timestep(timestep)
         self.view.set_status(status)
 
+    @property
+    def status(self):
+        return ModelIndex.statuses[self.model_index.node_status[self.id]]
+
     @property
     @inject
     def rtl_source(self, svgen_map=Inject('hdlgen/map')):
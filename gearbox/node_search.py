@@ -1,33 +1,53 @@
+import heapq
+import re
 from PySide2 import QtCore, QtWidgets, QtGui
-from pygears.conf import Inject, inject
-from .html_utils import fontify
-from .node_model import NodeModel
-from .minibuffer import CompleterItemDelegate
+from pygears.conf import Inject, PluginBase, inject, reg
+from .node_model import NodeModel, PipeModel
 
 
-class TaskDelegate(CompleterItemDelegate):
+def model_color(model):
+    if isinstance(model, NodeModel):
+        if model.hierarchical:
+            return 'darkorchid'
+        else:
+            return 'lightblue'
+    elif isinstance(model, PipeModel):
+        return 'gold'
+    else:
+        return 'rgba(255, 255, 255, 150)'
+
+
+class NodeItemDelegate(QtWidgets.QStyledItemDelegate):
+    """Colors completion rows by the kind of the model they name, without
+    creating any widgets while painting."""
+
+    def __init__(self):
+        super().__init__()
+        self.colors = {}
+
+    def get_model(self, text):
+        return None
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+
+        color = model_color(self.get_model(option.text))
+        if color not in self.colors:
+            self.colors[color] = QtGui.QColor(color)
+
+        option.palette.setColor(QtGui.QPalette.Text, self.colors[color])
+
+
+class TaskDelegate(NodeItemDelegate):
     def __init__(self, node):
         super().__init__()
         self.node = node
 
-    def setup_label(self, label):
-        text = label.text()
+    def get_model(self, text):
         try:
-            child = self.node[text]
-
-            if isinstance(child, NodeModel):
-                if child.hierarchical:
-                    label.setStyleSheet(
-                        "color: darkorchid; background-color: transparent;")
-                else:
-                    label.setStyleSheet(
-                        "color: lightblue; background-color: transparent;")
-            else:
-                label.setStyleSheet(
-                    "color: gold; background-color: transparent;")
-
+            return self.node[text]
         except KeyError:
-            label.setStyleSheet("color: rgba(255, 255, 255, 150)")
+            return None
 
 
 class NodeSearchCompleter(QtWidgets.QCompleter):
@@ -55,7 +75,6 @@ class NodeSearchCompleter(QtWidgets.QCompleter):
 
     def complete(self):
         self.delegate = TaskDelegate(self.node)
-        self.delegate.target_width = self.popup().width()
         self.popup().setItemDelegate(self.delegate)
         super().complete()
 
@@ -91,3 +110,210 @@ class NodeSearchCompleter(QtWidgets.QCompleter):
 
 def node_search_completer(top):
     return NodeSearchCompleter(top)
+
+
+class NodeSearchIndex:
+    """Fuzzy search over the names of all gears and interfaces in the design.
+
+    A query matches a name if its characters appear in the name in order.
+    Candidates are prefiltered by character posting sets, and queries that
+    extend the previous one only search among the previous matches.
+    """
+
+    def __init__(self, top):
+        self.top = top
+        self.names = []
+        self.lower_names = []
+        self.basename_pos = []
+        self.models = {}
+        self.char_index = {}
+
+        for model in self._walk(top):
+            if isinstance(model, PipeModel):
+                name = f'{model.parent.name}/{model.basename}'
+            else:
+                name = model.name
+
+            if name in self.models:
+                continue
+
+            self.add(name, model)
+
+        self.last_query = None
+        self.last_matches = None
+
+    def _walk(self, node):
+        for c in node.child:
+            yield c
+            if isinstance(c, NodeModel):
+                yield from self._walk(c)
+
+    def add(self, name, model):
+        i = len(self.names)
+        lower = name.lower()
+        self.names.append(name)
+        self.lower_names.append(lower)
+        self.basename_pos.append(lower.rfind('/') + 1)
+        self.models[name] = model
+
+        for c in set(lower):
+            self.char_index.setdefault(c, []).append(i)
+
+    def __getitem__(self, name):
+        return self.models[name]
+
+    def __contains__(self, name):
+        return name in self.models
+
+    def _candidates(self, query):
+        if (self.last_query is not None and query.startswith(self.last_query)):
+            return self.last_matches
+
+        postings = []
+        for c in set(query):
+            if c not in self.char_index:
+                return []
+
+            postings.append(self.char_index[c])
+
+        postings.sort(key=len)
+        candidates = postings[0]
+        for p in postings[1:]:
+            p = set(p)
+            candidates = [i for i in candidates if i in p]
+
+        return candidates
+
+    def _score(self, query, i, subseq):
+        name = self.lower_names[i]
+        base_pos = self.basename_pos[i]
+
+        pos = name.find(query, base_pos)
+        if pos >= 0:
+            if pos == base_pos:
+                score = 4000 if len(name) - base_pos == len(query) else 3000
+            else:
+                score = 2000
+        else:
+            pos = name.find(query)
+            if pos >= 0:
+                score = 1500
+            else:
+                match = subseq(name)
+                if match is None:
+                    return None
+
+                # Prefer tight matches ending in the basename
+                score = 1000 - (match.end() - match.start() - len(query))
+                if match.end() > base_pos:
+                    score += 100
+
+        return score - len(name) / 1000
+
+    def search(self, query, limit=None):
+        query = query.lower()
+
+        if not query:
+            self.last_query = None
+            self.last_matches = None
+            return self.names[:limit]
+
+        subseq = re.compile('.*?'.join(map(re.escape, query))).search
+
+        scored = []
+        matches = []
+        for i in self._candidates(query):
+            score = self._score(query, i, subseq)
+            if score is not None:
+                matches.append(i)
+                scored.append((score, i))
+
+        self.last_query = query
+        self.last_matches = matches
+
+        if limit is None:
+            ranked = sorted(scored, reverse=True)
+        else:
+            ranked = heapq.nlargest(limit, scored)
+
+        return [self.names[i] for _, i in ranked]
+
+
+_index = None
+
+
+def node_search_index(top):
+    global _index
+    if _index is None or _index.top is not top:
+        _index = NodeSearchIndex(top)
+
+    return _index
+
+
+class GlobalNodeDelegate(NodeItemDelegate):
+    def __init__(self, index):
+        super().__init__()
+        self.index = index
+
+    def get_model(self, text):
+        return self.index.models.get(text, None)
+
+
+class GlobalNodeSearchCompleter(QtWidgets.QCompleter):
+    @inject
+    def __init__(self,
+                 top,
+                 max_results=Inject('gearbox/node_search/max_results')):
+        super().__init__()
+        self.index = node_search_index(top)
+        self.max_results = max_results
+
+        # Filtering and ranking is done by the index
+        self.setCompletionMode(self.UnfilteredPopupCompletion)
+        self.setCaseSensitivity(QtCore.Qt.CaseInsensitive)
+
+        self.string_model = QtCore.QStringListModel()
+        self.setModel(self.string_model)
+        self.setCompletionColumn(0)
+        self.prefix = None
+        self.setCompletionPrefix('')
+
+    def complete(self):
+        self.delegate = GlobalNodeDelegate(self.index)
+        self.popup().setItemDelegate(self.delegate)
+        super().complete()
+
+    def setCompletionPrefix(self, prefix):
+        if prefix != self.prefix:
+            self.prefix = prefix
+            self.string_model.setStringList(
+                self.index.search(prefix, self.max_results))
+            self.setCurrentRow(0)
+
+        super().setCompletionPrefix(prefix)
+
+    def tab_completion(self, text):
+        if text and self.completionCount() == 1:
+            return self.currentCompletion()
+
+        return text
+
+    def get_result(self, text):
+        if text in self.index:
+            return text
+
+        res = self.index.search(text, 1)
+        if res:
+            return res[0]
+
+        return None
+
+
+def global_node_search_completer(top):
+    return GlobalNodeSearchCompleter(top)
+
+
+class NodeSearchPlugin(PluginBase):
+    @classmethod
+    def bind(cls):
+        reg.confdef('gearbox/node_search/max_results', default=200)
@@ -0,0 +1,295 @@
+import collections
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+from PySide2 import QtCore, QtWidgets
+from pygears.conf import Inject, PluginBase, inject, reg
+
+from .html_utils import fontify, tabulate
+from .layout import Buffer, show_buffer
+
+_lock = threading.Lock()
+_timers = {}
+_counters = {}
+_enabled = True
+_events = collections.deque(maxlen=100000)
+
+SPARK_CHARS = ' ▁▂▃▄▅▆▇█'
+
+
+class TimerMetric:
+    """Duration statistics with a log2 histogram of nanosecond durations."""
+
+    __slots__ = ('name', 'count', 'total', 'max', 'buckets')
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * 64
+
+    def record(self, start, dur):
+        with _lock:
+            self.count += 1
+            self.total += dur
+            if dur > self.max:
+                self.max = dur
+
+            self.buckets[min(dur.bit_length(), 63)] += 1
+
+            if _events is not None:
+                _events.append((self.name, start, dur, threading.get_ident()))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, q):
+        """Upper bound of the histogram bucket holding the q-th percentile."""
+        target = q * self.count
+        acc = 0
+        for i, n in enumerate(self.buckets):
+            acc += n
+            if acc >= target and n:
+                return min(1 << i, self.max)
+
+        return self.max
+
+
+class _Timer:
+    __slots__ = ('metric', 'start')
+
+    def __init__(self, metric):
+        self.metric = metric
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.metric.record(self.start, time.perf_counter_ns() - self.start)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+def get_timer(name):
+    try:
+        return _timers[name]
+    except KeyError:
+        return _timers.setdefault(name, TimerMetric(name))
+
+
+def timer(name):
+    """Context manager measuring the time spent in its body."""
+    if not _enabled:
+        return _null_timer
+
+    return _Timer(get_timer(name))
+
+
+def timed(name):
+    def wrapper(func):
+        @wraps(func)
+        def wrap(*args, **kwds):
+            with timer(name):
+                return func(*args, **kwds)
+
+        return wrap
+
+    return wrapper
+
+
+def count(name, val=1):
+    if _enabled:
+        _counters[name] = _counters.get(name, 0) + val
+
+
+def counters():
+    return dict(_counters)
+
+
+def timers():
+    return dict(_timers)
+
+
+def reset():
+    with _lock:
+        for t in _timers.values():
+            t.reset()
+
+        _counters.clear()
+        if _events is not None:
+            _events.clear()
+
+
+def dump_trace(fn):
+    """Writes the recorded timer events in the Chrome trace event format,
+    loadable by chrome://tracing or Perfetto."""
+
+    pid = os.getpid()
+    with _lock:
+        events = list(_events) if _events is not None else []
+        counter_vals = dict(_counters)
+
+    trace = [{
+        'name': name,
+        'cat': name.partition('/')[0],
+        'ph': 'X',
+        'ts': start / 1000,
+        'dur': dur / 1000,
+        'pid': pid,
+        'tid': tid
+    } for name, start, dur, tid in events]
+
+    if events:
+        ts = max(start + dur for _, start, dur, _ in events) / 1000
+        for name, val in counter_vals.items():
+            trace.append({
+                'name': name,
+                'ph': 'C',
+                'ts': ts,
+                'pid': pid,
+                'args': {
+                    'value': val
+                }
+            })
+
+    with open(fn, 'w') as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+    return len(trace)
+
+
+def _fmt_ns(ns):
+    if ns < 1000:
+        return f'{ns:.0f} ns'
+    elif ns < 1000000:
+        return f'{ns/1000:.1f} us'
+    else:
+        return f'{ns/1000000:.2f} ms'
+
+
+def sparkline(buckets):
+    used = [i for i, n in enumerate(buckets) if n]
+    if not used:
+        return ''
+
+    vals = buckets[used[0]:used[-1] + 1]
+    top = max(vals)
+    return ''.join(SPARK_CHARS[(n * (len(SPARK_CHARS) - 1) + top - 1) // top]
+                   for n in vals)
+
+
+class PerfView(QtWidgets.QTextBrowser):
+    @inject
+    def __init__(self, refresh_interval=Inject('gearbox/perf/refresh_interval')):
+        super().__init__()
+        self.document().setDefaultStyleSheet(
+            QtWidgets.QApplication.instance().styleSheet())
+        self.setLineWrapMode(QtWidgets.QTextBrowser.NoWrap)
+        self.prev_counters = {}
+        self.prev_time = time.monotonic()
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(refresh_interval)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+
+        now = time.monotonic()
+        cur_counters = counters()
+        dt = now - self.prev_time
+
+        header_style = 'style="font-weight:bold" nowrap'
+        cell_style = 'align="right" nowrap'
+
+        table = [[(header_style, h) for h in
+                  ('timer', 'count', 'mean', 'p50', 'p90', 'p99', 'max', 'histogram')]]
+
+        for name, t in sorted(timers().items()):
+            if not t.count:
+                continue
+
+            table.append([('nowrap', fontify(name, color='@text-color-keyword')),
+                          (cell_style, str(t.count)),
+                          (cell_style, _fmt_ns(t.mean)),
+                          (cell_style, _fmt_ns(t.percentile(0.5))),
+                          (cell_style, _fmt_ns(t.percentile(0.9))),
+                          (cell_style, _fmt_ns(t.percentile(0.99))),
+                          (cell_style, _fmt_ns(t.max)),
+                          ('nowrap', sparkline(t.buckets))])
+
+        counter_table = [[(header_style, h) for h in ('counter', 'value', 'rate')]]
+        for name, val in sorted(cur_counters.items()):
+            rate = (val - self.prev_counters.get(name, 0)) / dt if dt > 0 else 0
+            counter_table.append([('nowrap', fontify(name, color='@text-color-keyword')),
+                                  (cell_style, str(val)),
+                                  (cell_style, f'{rate:.1f}/s')])
+
+        self.prev_counters = cur_counters
+        self.prev_time = now
+
+        scroll = self.verticalScrollBar().value()
+        self.setHtml(
+            tabulate(table, 'style="padding-right: 10px;"') + '<br/>' +
+            tabulate(counter_table, 'style="padding-right: 10px;"'))
+        self.verticalScrollBar().setValue(scroll)
+
+
+class PerfBuffer(Buffer):
+    def delete(self):
+        self.view.timer.stop()
+        super().delete()
+
+    @property
+    def domain(self):
+        return 'perf'
+
+
+@inject
+def perf_buffer_show(layout=Inject('gearbox/layout')):
+    buff = layout.get_buffer_by_name('perf')
+    if buff is None:
+        buff = PerfBuffer(PerfView(), 'perf')
+
+    show_buffer(buff)
+    buff.view.refresh()
+    return buff
+
+
+class PerfPlugin(PluginBase):
+    @classmethod
+    def bind(cls):
+        def set_enabled(var, val):
+            global _enabled
+            var._val = val
+            _enabled = val
+
+        def set_trace_events(var, val):
+            global _events
+            var._val = val
+            with _lock:
+                _events = collections.deque(maxlen=val) if val else None
+
+        reg.confdef('gearbox/perf/enabled', default=True, setter=set_enabled)
+        reg.confdef(
+            'gearbox/perf/trace_events', default=100000, setter=set_trace_events)
+        reg.confdef('gearbox/perf/refresh_interval', default=1000)
@@ -0,0 +1,30 @@
+import os
+from PySide2.QtCore import Qt
+from pygears.conf import MayInject, inject
+from .main_window import register_prefix, message
+from .actions import shortcut
+from . import perf
+
+register_prefix(None, (Qt.Key_Space, Qt.Key_P), 'perf')
+
+
+@shortcut(None, (Qt.Key_Space, Qt.Key_P, Qt.Key_P), 'profiler')
+def perf_show():
+    perf.perf_buffer_show()
+
+
+@shortcut(None, (Qt.Key_Space, Qt.Key_P, Qt.Key_D), 'dump trace')
+@inject
+def perf_dump_trace(outdir=MayInject('results-dir')):
+    if outdir is None:
+        outdir = os.getcwd()
+
+    fn = os.path.join(outdir, 'gearbox_trace.json')
+    num = perf.dump_trace(fn)
+    message(f'Dumped {num} trace events to {fn}')
+
+
+@shortcut(None, (Qt.Key_Space, Qt.Key_P, Qt.Key_R), 'reset')
+def perf_reset():
+    perf.reset()
+    message('Performance counters reset')
@@ -8,6 +8,7 @@ from .constants import (
     PIPE_STYLE_DASHED, PIPE_STYLE_DEFAULT, PIPE_STYLE_DOTTED, PIPE_WIDTH,
     IN_PORT, OUT_PORT, Z_VAL_PIPE, PIPE_WAITED_COLOR, PIPE_HANDSHAKED_COLOR)
 from .theme import themify
+from . import perf
 
 PIPE_STYLES = {
     PIPE_STYLE_DEFAULT: QtCore.Qt.PenStyle.SolidLine,
@@ -44,7 +45,10 @@ class Pipe(QtWidgets.QGraphicsPathItem):
         self._input_port = input_port
         self._output_port = output_port
         self.model = model
-        self.layout_path = []
+        # Routed path in the parent coordinates as (x, y) tuples: the start
+        # point, followed by the cubic segments
+        self.layout_path = ()
+        self._path_key = None
         self.set_status("empty")
         # self.set_tooltip()
 
@@ -123,14 +127,26 @@ class Pipe(QtWidgets.QGraphicsPathItem):
         return ctr_point1, ctr_point2
 
     def draw_path(self):
-        path = QtGui.QPainterPath()
-
         qp_start = self.input_port.plug_pos(self.parentItem(), IN_PORT)
         qp_end = self.output_port.plug_pos(self.parentItem(), OUT_PORT)
 
+        # Rebuilding the path makes the scene reindex the item, so it is
+        # skipped unless the route or the ports it connects moved
+        key = (qp_start.x(), qp_start.y(), qp_end.x(), qp_end.y(),
+               self.layout_path)
+        if key == self._path_key:
+            perf.count('pipe/path_cache_hit')
+            return
+
+        self._path_key = key
+        perf.count('pipe/reroute')
+
+        path = QtGui.QPainterPath()
         path.moveTo(qp_end)
-        for i in range(2, len(self.layout_path), 3):
-            path.cubicTo(*self.layout_path[i:i + 3])
+        layout_path = self.layout_path
+        for i in range(2, len(layout_path) - 2, 3):
+            path.cubicTo(*layout_path[i], *layout_path[i + 1],
+                         *layout_path[i + 2])
 
         path.lineTo(qp_start)
 
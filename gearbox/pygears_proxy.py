@@ -7,14 +7,14 @@ import sys
 
 from PySide2 import QtCore, QtWidgets
 
-from pygears import MultiAlternativeError
+from pygears import MultiAlternativeError, clear
 from pygears.conf import Inject, PluginBase, inject, reg
+from pygears.conf.custom_settings import load_rc
 from pygears.conf.trace import pygears_excepthook, log_exception
 from pygears.sim import SimFinish, sim
 from pygears.sim.extens.sim_extend import SimExtend
-from pygears.sim.modules import SimVerilated
 
-from .node_model import find_cosim_modules
+from . import perf
 
 # from jinja2.debug import fake_exc_info
 
@@ -85,18 +85,24 @@ class Gearbox(QtCore.QObject, SimExtend):
         if (name in ['after_cleanup', 'before_run']
                 or (name == 'after_timestep' and self._should_break())):
 
-            self.running = False
-            self.sim_event.emit(name)
+            with perf.timer('sim/handle_event'):
+                self.running = False
+                self.sim_event.emit(name)
 
-            QtCore.QThread.currentThread().eventDispatcher().processEvents(
-                QtCore.QEventLoop.AllEvents)
+                QtCore.QThread.currentThread().eventDispatcher().processEvents(
+                    QtCore.QEventLoop.AllEvents)
+
+            # The time the simulation waits for the GUI to continue it is
+            # recorded on its own
+            with perf.timer('sim/paused'):
+                self.loop.exec_()
 
-            self.loop.exec_()
             self.running = True
         else:
             # print("Here?")
-            QtCore.QThread.yieldCurrentThread()
-            QtCore.QThread.currentThread().usleep(10)
+            with perf.timer('sim/handle_event'):
+                QtCore.QThread.yieldCurrentThread()
+                QtCore.QThread.currentThread().usleep(10)
             # QtCore.QThread.currentThreadId().msleep(10)
             # Let GUI thread do some work
             # time.sleep(0.0001)
@@ -114,6 +120,7 @@ class Gearbox(QtCore.QObject, SimExtend):
     #     self.handle_event('at_exit')
 
     def after_timestep(self, sim, timestep):
+        perf.count('sim/timesteps')
         self.handle_event('after_timestep')
         return True
 
@@ -121,6 +128,9 @@ class Gearbox(QtCore.QObject, SimExtend):
         self.handle_event('after_cleanup')
 
     def before_setup(self, sim):
+        from pygears.sim.modules import SimVerilated
+        from .node_model import find_cosim_modules
+
         if self.live:
             for m in find_cosim_modules():
                 if isinstance(m, SimVerilated):
@@ -252,6 +262,7 @@ class PyGearsClient(QtCore.QObject):
         self.err = None
         self.cur_model_issue_id = None
         self.pygears_proc = None
+        self.reloading = False
 
         QtWidgets.QApplication.instance().aboutToQuit.connect(self.quit)
         self.script_closed.connect(QtWidgets.QApplication.instance().quit)
@@ -363,6 +374,63 @@ class PyGearsClient(QtCore.QObject):
             # self.queue = None
             # self.loop.quit()
 
+    @inject
+    def stop_sim(self, timeout=Inject('gearbox/sim_stop_timeout')):
+        """Stops the simulation thread, waiting at most timeout milliseconds
+        for it to finish. Returns whether it has finished."""
+
+        if self.pygears_proc:
+            self.pygears_proc.done = True
+            self.pygears_proc.cont()
+            if not self.pygears_proc.thrd.wait(timeout):
+                return False
+
+            self.pygears_proc = None
+
+        self.simulating = False
+        return True
+
+    def reload_model(self):
+        """Reruns the model script within this process.
+
+        Needs to be called from the GUI thread, so that the old model views
+        are torn down before the PyGears registry is cleared.
+        """
+
+        script_fn = reg['gearbox/model_script_name']
+        if not script_fn:
+            return
+
+        if not self.stop_sim():
+            from .main_window import message
+            message('ERROR: Simulation did not stop, model not reloaded')
+            return
+
+        self.reloading = True
+        self.model_closed.emit()
+        self.reloading = False
+
+        gearbox_reg = reg['gearbox']
+        results_dir = reg['results-dir']
+
+        clear()
+
+        load_rc('.gearbox', os.getcwd())
+        reg['gearbox'] = gearbox_reg
+        reg['results-dir'] = results_dir
+        load_rc('.pygears', os.path.dirname(script_fn))
+
+        # Make sure that the user modules imported by the script get
+        # reexecuted as well
+        script_dir = os.path.abspath(os.path.dirname(script_fn))
+        for name, module in list(sys.modules.items()):
+            fn = getattr(module, '__file__', None)
+            if (fn and os.path.abspath(fn).startswith(script_dir + os.sep)
+                    and name.partition('.')[0] not in ('gearbox', 'pygears')):
+                del sys.modules[name]
+
+        self.invoke_method('run_model', script_fn=script_fn)
+
     @property
     @inject
     def cur_model_issue(self, issues=Inject('trace/issues')):
@@ -408,7 +476,9 @@ class PyGearsClient(QtCore.QObject):
             print(f"Artifacts dir: {artifacts_dir}")
 
         os.makedirs(artifacts_dir, exist_ok=True)
-        sys.path.append(os.path.dirname(script_fn))
+        if os.path.dirname(script_fn) not in sys.path:
+            sys.path.append(os.path.dirname(script_fn))
+
         reg['trace/ignore'].append(os.path.dirname(__file__))
         reg['trace/ignore'].append(runpy.__file__)
         compilation_log_fn = os.path.join(artifacts_dir, 'compilation.log')
@@ -568,3 +638,4 @@ class MainWindowPlugin(PluginBase):
     def bind(cls):
         reg['gearbox/model_script_name'] = None
         reg['gearbox/compilation_log_fn'] = None
+        reg.confdef('gearbox/sim_stop_timeout', default=5000)
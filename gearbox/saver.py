@@ -1,9 +1,6 @@
 import runpy
 import os
 from pygears.conf import Inject, inject, MayInject, reg
-from .graph import GraphVisitor
-from jinja2 import Environment, BaseLoader
-from pygears.core.hier_node import HierYielderBase
 from .layout import Window
 
 save_file_prolog = """
@@ -11,51 +8,12 @@ from pygears.conf import Inject, reg, inject_async, inject
 from gearbox.utils import single_shot_connect
 from gearbox.layout import Window, WindowLayout
 from gearbox.description import describe_file
+from gearbox.session import restore_graph as expand
+from gearbox.session import restore_gtkwave as gtkwave_load
 from PySide2 import QtWidgets
 from functools import partial
 """
 
-expand_func_template = """
-
-@inject
-def expand(buff, graph_model=Inject('gearbox/graph_model')):
-  {% if expanded %}
-    {% for name in expanded %}
-    graph_model['{{name}}'].view.expand()
-    {% endfor %}
-  {% endif %}
-
-  {% if selected %}
-    buff.view.select(graph_model['{{selected.model.name}}'].view)
-  {% endif %}
-
-  {% if (not selected) and (not expanded) %}
-    pass
-  {% endif %}
-
-"""
-
-gtkwave_load_func_template = """
-
-@inject
-def load_after_vcd_loaded(
-        buff,
-        graph_model=Inject('gearbox/graph_model'),
-        gtkwave=Inject('gearbox/gtkwave/inst')):
-
-{% for buff in buffers %}
-    if buff.name == "{{buff.name}}":
-    {% for item in buff.intf.items_on_wave %}
-        gtkwave.show_item(graph_model["{{item.name}}"])
-    {% endfor %}
-{% endfor %}
-
-
-def gtkwave_load(buff):
-    load_after_vcd_loaded(buff)
-
-"""
-
 layout_load_func_template = """
 
 @inject
@@ -112,49 +70,23 @@ def layout_unload_connect(sim_bridge=Inject('gearbox/sim_bridge')):
 
 
 def load_str_template(template):
+    from jinja2 import Environment, BaseLoader
+
     return Environment(loader=BaseLoader(),
                        trim_blocks=True,
                        lstrip_blocks=True).from_string(template)
 
 
-class GraphStatusSaver(HierYielderBase):
-    def NodeModel(self, node):
-        if not node.view.collapsed and bool(node.name):
-            yield node.name[1:]
-
-
-@inject
-def save_expanded(buffer_init_commands,
-                  root=Inject('gearbox/graph_model'),
-                  graph=Inject('gearbox/graph')):
-    expanded = list(GraphStatusSaver().visit(root))
-
-    selected = graph.selected_items()
-    if selected:
-        selected = selected[0]
-
+def save_expanded(buffer_init_commands):
+    # The graph state is restored from the session snapshot
     buffer_init_commands['graph'].append('expand')
 
-    return load_str_template(expand_func_template).render({
-        'expanded': expanded,
-        'selected': selected
-    })
-
 
 @inject
 def save_gtkwave(buffer_init_commands, layout=Inject('gearbox/layout')):
-    buffers = [
-        buff for buff in layout.buffers
-        if buff.domain == "gtkwave" and buff.intf.items_on_wave
-    ]
-    for b in buffers:
-        buffer_init_commands[b.name].append('gtkwave_load')
-
-    if buffers:
-        return load_str_template(gtkwave_load_func_template).render(
-            {'buffers': buffers})
-
-    return ''
+    for b in layout.buffers:
+        if b.domain == "gtkwave" and b.intf.items_on_wave:
+            buffer_init_commands[b.name].append('gtkwave_load')
 
 
 description_load_template = """
@@ -254,6 +186,10 @@ def load():
 
 @inject
 def save(layout=Inject('gearbox/layout')):
+    from .session import get_snapshot_path, save_snapshot
+
+    save_snapshot(get_snapshot_path(get_save_file_path()))
+
     with open(get_save_file_path(), 'w') as f:
         buffer_init_commands = {b.name: [] for b in layout.buffers}
 
@@ -261,9 +197,9 @@ def save(layout=Inject('gearbox/layout')):
 
         f.write(save_configuration())
 
-        f.write(save_expanded(buffer_init_commands))
+        save_expanded(buffer_init_commands)
 
-        f.write(save_gtkwave(buffer_init_commands))
+        save_gtkwave(buffer_init_commands)
 
         f.write(save_description(buffer_init_commands))
 
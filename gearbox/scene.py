@@ -1,75 +1,90 @@
+import math
+
 from PySide2 import QtCore, QtGui, QtWidgets
 
-from pygears.conf import Inject, inject, reg
+from pygears.conf import reg
+
+from . import perf, theme
+from .theme import ThemePlugin, set_theme_var, theme_color
 
-from .theme import ThemePlugin
+GRID_SIZE = 20
+# Number of minor grid cells in a major one
+GRID_MAJOR = 8
+# Zoom levels per doubling of the scale that share a grid tile
+GRID_BUCKETS_PER_OCTAVE = 4
 
 
 class NodeScene(QtWidgets.QGraphicsScene):
-    @inject
-    def __init__(self,
-                 parent=None,
-                 background_color=Inject('gearbox/theme/background-color'),
-                 grid_color=Inject('gearbox/theme/graph-grid-color')):
+    def __init__(self, parent=None):
         super(NodeScene, self).__init__(parent)
-        self.background_color = QtGui.QColor(background_color)
-        self.grid_color = grid_color
         self.grid = True
+        self._grid_brushes = {}
 
     def __repr__(self):
         return '{}.{}(\'{}\')'.format(self.__module__, self.__class__.__name__,
                                       self.viewer())
 
-    def _draw_grid(self, painter, rect, pen, grid_size):
-        lines = []
-        left = int(rect.left()) - (int(rect.left()) % grid_size)
-        top = int(rect.top()) - (int(rect.top()) % grid_size)
-        x = left
-        while x < rect.right():
-            x += grid_size
-            lines.append(QtCore.QLineF(x, rect.top(), x, rect.bottom()))
-        y = top
-        while y < rect.bottom():
-            y += grid_size
-            lines.append(QtCore.QLineF(rect.left(), y, rect.right(), y))
-        painter.setPen(pen)
-        painter.drawLines(lines)
+    def _grid_brush(self, bucket):
+        """Brush textured with one major grid cell, rendered at the zoom of the
+        bucket. Cached until the theme or the zoom bucket changes."""
 
-    def drawBackground(self, painter, rect):
-        painter.save()
+        key = (theme.generation, bucket)
+        if key in self._grid_brushes:
+            return self._grid_brushes[key]
 
-        # bg_color = QtGui.QColor(*self._bg_color)
-        bg_color = self.background_color
-        painter.setRenderHint(QtGui.QPainter.Antialiasing, False)
-        painter.setBrush(bg_color)
-        painter.drawRect(rect)
+        self._grid_brushes.clear()
 
-        if not self.grid:
-            return
+        scale = 2**(bucket / GRID_BUCKETS_PER_OCTAVE)
+        zoom = scale - 1.0
+        size = GRID_SIZE * GRID_MAJOR
+        px = max(1, round(size * scale))
+
+        bg_color = theme_color('@background-color')
+        pixmap = QtGui.QPixmap(px, px)
+        pixmap.fill(bg_color)
 
-        zoom = self.viewer().get_zoom()
-        grid_size = 20
+        painter = QtGui.QPainter(pixmap)
+        painter.scale(px / size, px / size)
 
+        # Lines on the tile edges are drawn on both sides, so that the halves
+        # join into a full line when the tiles are put together
         if zoom > -0.5:
-            pen = QtGui.QPen(QtGui.QColor(self.grid_color), 0.65)
-            self._draw_grid(painter, rect, pen, grid_size)
+            painter.setPen(QtGui.QPen(theme_color('@graph-grid-color'), 0.65))
+            lines = []
+            for pos in range(0, size + 1, GRID_SIZE):
+                lines.append(QtCore.QLineF(pos, 0, pos, size))
+                lines.append(QtCore.QLineF(0, pos, size, pos))
+
+            painter.drawLines(lines)
 
         color = bg_color.darker(300)
         if zoom < -0.0:
             color = color.darker(100 - int(zoom * 110))
-        pen = QtGui.QPen(color, 0.65)
-        self._draw_grid(painter, rect, pen, grid_size * 8)
 
-        # fix border issue on the scene edge.
-        pen = QtGui.QPen(bg_color, 1)
-        pen.setCosmetic(True)
-        path = QtGui.QPainterPath()
-        path.addRect(rect)
-        painter.setBrush(QtCore.Qt.NoBrush)
-        painter.setPen(pen)
-        painter.drawPath(path)
+        painter.setPen(QtGui.QPen(color, 0.65))
+        painter.drawLines([
+            QtCore.QLineF(0, 0, size, 0),
+            QtCore.QLineF(0, size, size, size),
+            QtCore.QLineF(0, 0, 0, size),
+            QtCore.QLineF(size, 0, size, size)
+        ])
+        painter.end()
+
+        brush = QtGui.QBrush(pixmap)
+        brush.setTransform(QtGui.QTransform.fromScale(size / px, size / px))
+        self._grid_brushes[key] = brush
+        return brush
+
+    def drawBackground(self, painter, rect):
+        if not self.grid:
+            painter.fillRect(rect, theme_color('@background-color'))
+            return
+
+        scale = self.viewer().transform().m11()
+        bucket = round(math.log2(scale) * GRID_BUCKETS_PER_OCTAVE)
 
-        painter.restore()
+        with perf.timer('graph/background'):
+            painter.fillRect(rect, self._grid_brush(bucket))
 
     def viewer(self):
         return self.views()[0] if self.views() else None
@@ -78,4 +93,5 @@ class NodeScene(QtWidgets.QGraphicsScene):
 class ScenePlugin(ThemePlugin):
     @classmethod
     def bind(cls):
-        reg.confdef('gearbox/theme/graph-grid-color', default='#404040')
+        reg.confdef(
+            'gearbox/theme/graph-grid-color', default='#404040', setter=set_theme_var)
@@ -0,0 +1,198 @@
+"""Session snapshots.
+
+A snapshot is a JSON file stored next to the save script (see saver.py). It
+holds the expanded hierarchy, the selected item, the zoom and the center of
+the graph view, the waves shown in each GTKWave buffer, and a geometry blob
+with the layout results of the expanded nodes: the node positions and pipe
+paths as returned by the layout engine.
+
+The geometry is only valid for the hierarchy and the layout configuration it
+was computed for, so the snapshot records the hierarchy fingerprint (see
+fingerprint.py), the layout engine and the fold configuration. If any of them
+does not match, the geometry and the view are ignored and only the items that
+still exist are expanded and traced, with a regular relayout.
+"""
+
+import base64
+import json
+import os
+import zlib
+
+from PySide2 import QtGui
+from pygears.conf import Inject, MayInject, inject
+
+from .fingerprint import hier_fingerprints, stable_repr
+from .graph import expanded_nodes
+from .node import set_layout_presets
+
+SNAPSHOT_VERSION = 1
+
+
+def get_snapshot_path(save_path=None):
+    from .saver import get_save_file_path
+
+    if save_path is None:
+        save_path = get_save_file_path()
+
+    return os.path.splitext(save_path)[0] + '.json'
+
+
+@inject
+def design_fingerprint(root=Inject('gear/root'),
+                       graph_model_ctrl=MayInject('gearbox/graph_model_ctrl')):
+    fingerprints = getattr(graph_model_ctrl, 'fingerprints', None)
+    if fingerprints is None:
+        fingerprints = hier_fingerprints(root)
+
+    return fingerprints[root.name].tree
+
+
+@inject
+def layout_config(engine=Inject('gearbox/layout/engine'),
+                  fold_rules=Inject('gearbox/fold/rules'),
+                  fold_chains=Inject('gearbox/fold/chains')):
+    return {
+        'engine': engine,
+        'fold_rules': [[stable_repr(pattern), action] for pattern, action in fold_rules],
+        'fold_chains': fold_chains
+    }
+
+
+def encode_geometry(geometry):
+    data = json.dumps(geometry, separators=(',', ':')).encode()
+    return base64.b64encode(zlib.compress(data)).decode()
+
+
+def decode_geometry(blob):
+    return json.loads(zlib.decompress(base64.b64decode(blob)))
+
+
+def node_geometry(node):
+    positions, paths = node.layout_result
+    return {
+        'positions': {k: list(v) for k, v in positions.items()},
+        'paths': [[list(p) for p in paths[pipe]] for pipe in node.pipes]
+    }
+
+
+@inject
+def snapshot(graph_model=Inject('gearbox/graph_model'),
+             graph=Inject('gearbox/graph'),
+             layout=Inject('gearbox/layout')):
+    expanded = list(expanded_nodes(graph_model))
+
+    geometry = {}
+    for view in [graph_model.view] + [graph_model[n].view for n in expanded]:
+        if view.layout_result is not None:
+            geometry[view.model.name] = node_geometry(view)
+
+    selected = graph.selected_items()
+    center = graph.mapToScene(graph.viewport().rect().center())
+
+    return {
+        'version': SNAPSHOT_VERSION,
+        'fingerprint': design_fingerprint(),
+        'layout_config': layout_config(),
+        'expanded': expanded,
+        'selected': selected[0].model.name if selected else None,
+        'scale': graph.transform().m11(),
+        'center': [center.x(), center.y()],
+        'gtkwave': {
+            b.name: [item.name for item in b.intf.items_on_wave]
+            for b in layout.buffers if b.domain == 'gtkwave'
+        },
+        'geometry': encode_geometry(geometry)
+    }
+
+
+def save_snapshot(fn=None):
+    if fn is None:
+        fn = get_snapshot_path()
+
+    with open(fn, 'w') as f:
+        json.dump(snapshot(), f)
+
+
+def load_snapshot(fn=None):
+    if fn is None:
+        fn = get_snapshot_path()
+
+    try:
+        with open(fn) as f:
+            snap = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if snap.get('version') != SNAPSHOT_VERSION:
+        return None
+
+    return snap
+
+
+def snapshot_valid(snap):
+    try:
+        return (snap['fingerprint'] == design_fingerprint()
+                and snap['layout_config'] == layout_config())
+    except KeyError:
+        return False
+
+
+@inject
+def restore_graph(buff, graph_model=Inject('gearbox/graph_model')):
+    snap = load_snapshot()
+    if snap is None:
+        return
+
+    graph = buff.view
+    valid = snapshot_valid(snap)
+
+    if valid:
+        set_layout_presets({
+            name: (geom['positions'], geom['paths'])
+            for name, geom in decode_geometry(snap['geometry']).items()
+        })
+
+    nodes = []
+    for name in snap['expanded']:
+        try:
+            nodes.append(graph_model[name].view)
+        except KeyError:
+            pass
+
+    try:
+        with graph.layout_transaction():
+            graph.expand_nodes(nodes)
+            if valid:
+                graph.relayout()
+    finally:
+        set_layout_presets({})
+
+    if snap['selected'] is not None:
+        try:
+            graph.select(graph_model[snap['selected']].view)
+        except KeyError:
+            pass
+
+    if valid:
+        graph.setTransform(QtGui.QTransform.fromScale(snap['scale'], snap['scale']))
+        graph.centerOn(*snap['center'])
+
+
+@inject
+def restore_gtkwave(buff, graph_model=Inject('gearbox/graph_model')):
+    snap = load_snapshot()
+    if snap is None:
+        return
+
+    items = []
+    for name in snap['gtkwave'].get(buff.name, []):
+        try:
+            item = graph_model[name]
+        except KeyError:
+            continue
+
+        if buff.intf.has_item_wave(item):
+            items.append(item)
+
+    buff.intf.show_items(items)
+
@@ -3,38 +3,86 @@ from pygears.conf import Inject, inject
 from .node import NodeItem
 from .pipe import Pipe
 from .main_window import Shortcut
-from functools import partial
 
-snipe_shortcuts = []
+SNIPE_KEYS = [QtCore.Qt.Key_A + i for i in range(26)]
 
 
 def sniper():
     Sniper()
 
 
-class SnipeCodeItem(QtWidgets.QGraphicsTextItem):
-    def __init__(self, text, parent=None):
-        super().__init__(text, parent=parent)
-        f = self.font()
-        f.setPointSize(12)
-        f.setBold(True)
-        self.setFont(f)
+def snipe_labels(num):
+    """Labels of equal length, so that no label is a prefix of another"""
 
-        # self.font().setPointSize(16)
-        # self.font().setBold(True)
-        # # self.setFont(self.font())
-        # self.setFont(QtGui.QFont("Source Code Pro", 16))
+    length = 1
+    while len(SNIPE_KEYS)**length < num:
+        length += 1
+
+    for i in range(num):
+        label = []
+        for _ in range(length):
+            i, k = divmod(i, len(SNIPE_KEYS))
+            label.append(SNIPE_KEYS[k])
+
+        yield tuple(reversed(label))
+
+
+def label_text(label):
+    return ''.join(chr(k) for k in label)
+
+
+class SnipeOverlay(QtWidgets.QGraphicsItem):
+    """Single scene item drawing all the snipe labels"""
+
+    def __init__(self, labels):
+        super().__init__()
+        self.font = QtGui.QFont()
+        self.font.setPointSize(12)
+        self.font.setBold(True)
+        self.prefix = ''
+
+        metrics = QtGui.QFontMetricsF(self.font)
+        height = metrics.height()
+
+        self.labels = []
+        self.rect = QtCore.QRectF()
+        for text, pos, align in labels:
+            width = metrics.horizontalAdvance(text) + 4
+            rect = QtCore.QRectF(pos.x() - width * align[0],
+                                 pos.y() - height * align[1], width, height)
+            self.labels.append((text, rect))
+            self.rect = self.rect.united(rect)
+
+        self.setZValue(100)
+
+    def boundingRect(self):
+        return self.rect
+
+    def set_prefix(self, prefix):
+        self.prefix = prefix
+        self.update()
 
     def paint(self, painter, option, widget):
-        painter.setBrush(QtCore.Qt.white)
-        painter.drawRect(self.boundingRect())
-        super().paint(painter, option, widget)
+        painter.save()
+        painter.setFont(self.font)
+        exposed = option.exposedRect
+        for text, rect in self.labels:
+            if not text.startswith(self.prefix) or not rect.intersects(exposed):
+                continue
+
+            painter.setBrush(QtCore.Qt.white)
+            painter.setPen(QtCore.Qt.black)
+            painter.drawRect(rect)
+            painter.drawText(rect, QtCore.Qt.AlignCenter, text)
+
+        painter.restore()
 
 
-class Sniper:
+class Sniper(QtCore.QObject):
     @inject
     def __init__(self,
                  main=Inject('gearbox/main/inst')):
+        super().__init__()
 
         Shortcut('graph', QtCore.Qt.Key_F, self.snipe_select)
         Shortcut('graph', QtCore.Qt.CTRL + QtCore.Qt.Key_F,
@@ -43,35 +91,48 @@ class Sniper:
                  self.snipe_select_pipes)
 
         self.main = main
+        self.overlay = None
+        self.trie = None
+        self.trie_node = None
+        self.typed = ''
 
     @inject
     def snipe_cancel(self, graph=Inject('gearbox/graph')):
         self.main.key_cancel.disconnect(self.snipe_cancel)
-        for text, s in snipe_shortcuts:
-            s.setParent(None)
-            graph.scene().removeItem(text)
+        QtWidgets.QApplication.instance().removeEventFilter(self)
 
+        if self.overlay.scene():
+            self.overlay.scene().removeItem(self.overlay)
+
+        self.overlay = None
+        self.trie = None
+        self.trie_node = None
         self.main.change_domain('graph')
-        snipe_shortcuts.clear()
 
     @inject
-    def snipe_shot(self, pipe, graph=Inject('gearbox/graph')):
-        graph.select(pipe)
+    def snipe_shot(self, obj, graph=Inject('gearbox/graph')):
         self.snipe_cancel()
+        graph.select(obj)
 
-    @inject
-    def snipe_shot_prefix(self, prefix, graph=Inject('gearbox/graph')):
-        import pdb
-        pdb.set_trace()
-        for text, s in snipe_shortcuts:
-            if text.toPlainText().startswith(prefix):
-                continue
+    def eventFilter(self, obj, event):
+        if event.type() != QtCore.QEvent.KeyPress:
+            return super().eventFilter(obj, event)
+
+        key = event.key()
+        if key not in SNIPE_KEYS:
+            return super().eventFilter(obj, event)
 
-            s.setParent(None)
-            graph.scene().removeItem(text)
+        node = self.trie_node.get(key)
+        if node is None:
+            self.snipe_cancel()
+        elif isinstance(node, dict):
+            self.trie_node = node
+            self.typed += chr(key)
+            self.overlay.set_prefix(self.typed)
+        else:
+            self.snipe_shot(node)
 
-    def snipe_shot_prefix_test(self):
-        print("Ambiguous")
+        return True
 
     def get_visible_objs(self, node, objtype):
         if (objtype is None) or (objtype is NodeItem):
@@ -92,8 +153,6 @@ class Sniper:
 
     @inject
     def snipe_select(self, objtype=None, graph=Inject('gearbox/graph')):
-        self.main.key_cancel.connect(self.snipe_cancel)
-
         nodes = graph.selected_nodes()
 
         nodes = [
@@ -107,55 +166,43 @@ class Sniper:
             else:
                 nodes = [pipe.parent for pipe in pipes]
 
-        keys = [2]
+        # Only the objects inside the viewport get a label
+        viewport = graph.mapToScene(graph.viewport().rect()).boundingRect()
 
+        objs = []
         for n in nodes:
             if n.collapsed:
                 continue
 
-            for i, obj in enumerate(self.get_visible_objs(n, objtype=objtype)):
-                key_codes = [key + ord('A') for key in reversed(keys)]
-                snipe_text = ''.join([chr(key).upper() for key in key_codes])
-                text = SnipeCodeItem(snipe_text)
-
-                text.setZValue(100)
-                graph.scene().addItem(text)
-
-                if isinstance(obj, NodeItem):
-                    text.setPos(
-                        obj.mapToScene((obj.boundingRect().bottomLeft() + obj.
-                                        boundingRect().bottomRight()) / 2) -
-                        QtCore.QPointF(text.boundingRect().width() / 2,
-                                       text.boundingRect().height()))
-                else:
-                    text.setPos(
-                        obj.mapToScene(obj.path().pointAtPercent(0.5)) -
-                        QtCore.QPointF(text.boundingRect().width(),
-                                       text.boundingRect().height()) / 2)
-
-                self.main.change_domain('_snipe')
-                shortcut = QtWidgets.QShortcut(
-                    QtGui.QKeySequence(*key_codes), self.main)
-
-                shortcut.activated.connect(partial(self.snipe_shot, obj))
-
-                # if len(keys) > 0:
-                #     shortcut.activatedAmbiguously.connect(
-                #         self.snipe_shot_prefix_test)
-                # shortcut.activatedAmbiguously.connect(
-                #     partial(
-                #         self.snipe_shot_prefix, prefix=snipe_text[:-1]))
-
-                snipe_shortcuts.append((text, shortcut))
-
-                for pos in range(len(keys) + 1):
-                    if pos == len(keys):
-                        keys.insert(0, 0)
-                        break
-
-                    keys[pos] += 1
-
-                    if keys[pos] < 25:
-                        break
-                    else:
-                        keys[pos] = 0
+            for obj in self.get_visible_objs(n, objtype=objtype):
+                if obj.sceneBoundingRect().intersects(viewport):
+                    objs.append(obj)
+
+        if not objs:
+            return
+
+        self.trie = {}
+        labels = []
+        for obj, label in zip(objs, snipe_labels(len(objs))):
+            place = self.trie
+            for k in label[:-1]:
+                place = place.setdefault(k, {})
+
+            place[label[-1]] = obj
+
+            if isinstance(obj, NodeItem):
+                rect = obj.boundingRect()
+                pos = obj.mapToScene((rect.bottomLeft() + rect.bottomRight()) / 2)
+                labels.append((label_text(label), pos, (0.5, 1)))
+            else:
+                pos = obj.mapToScene(obj.path().pointAtPercent(0.5))
+                labels.append((label_text(label), pos, (0.5, 0.5)))
+
+        self.trie_node = self.trie
+        self.typed = ''
+        self.overlay = SnipeOverlay(labels)
+        graph.scene().addItem(self.overlay)
+
+        self.main.change_domain('_snipe')
+        self.main.key_cancel.connect(self.snipe_cancel)
+        QtWidgets.QApplication.instance().installEventFilter(self)
@@ -0,0 +1,99 @@
+import bisect
+
+from PySide2 import QtCore
+
+
+def item_rect(item):
+    rect = item.boundingRect()
+    rect.translate(item.pos())
+    return rect
+
+
+class LayerIndex(list):
+    """Spatial index of the nodes of a subgraph, built once per layout.
+
+    The nodes are grouped into layers: columns of horizontally overlapping
+    nodes. The index is a list of the layers sorted from left to right, each
+    a list of nodes sorted from top to bottom. The layers do not overlap, so
+    the queries bisect on their edges, and then on the node tops within the
+    layers.
+    """
+
+    def __init__(self, nodes):
+        super().__init__()
+
+        self.lefts = []
+        self.rights = []
+        self.tops = []
+        self.heights = []
+        self.location = {}
+
+        rects = {n: item_rect(n) for n in nodes}
+
+        layer = []
+        for n in sorted(nodes, key=lambda n: rects[n].left()):
+            rect = rects[n]
+            if layer and rect.left() < self.rights[-1]:
+                layer.append(n)
+                self.rights[-1] = max(self.rights[-1], rect.right())
+            else:
+                layer = [n]
+                self.append(layer)
+                self.lefts.append(rect.left())
+                self.rights.append(rect.right())
+
+        for i, layer in enumerate(self):
+            layer.sort(key=lambda n: n.y())
+            self.tops.append([rects[n].top() for n in layer])
+            self.heights.append(max(rects[n].height() for n in layer))
+            for j, n in enumerate(layer):
+                self.location[n] = (i, j)
+
+    def locate(self, node):
+        """Returns (layer_id, layer, node_id) of the node, or None"""
+
+        try:
+            i, j = self.location[node]
+        except KeyError:
+            return None
+
+        return i, self[i], j
+
+    def closest(self, layer_id, y):
+        """Node of the layer whose top is vertically closest to y"""
+
+        tops = self.tops[layer_id]
+        i = bisect.bisect_left(tops, y)
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(tops)]
+        j = min(candidates, key=lambda j: abs(tops[j] - y))
+
+        return self[layer_id][j]
+
+    def intersecting(self, rect):
+        """Nodes intersecting the rectangle given in the subgraph
+        coordinates"""
+
+        first = bisect.bisect_right(self.rights, rect.left())
+        last = bisect.bisect_left(self.lefts, rect.right())
+
+        for i in range(first, last):
+            j = bisect.bisect_left(self.tops[i], rect.top() - self.heights[i])
+            end = bisect.bisect_left(self.tops[i], rect.bottom())
+            for n in self[i][j:end]:
+                if item_rect(n).intersects(rect):
+                    yield n
+
+
+def nodes_near(top, rect):
+    """Visible nodes in the hierarchy under top that intersect the rectangle
+    given in the scene coordinates. Parents come before their children."""
+
+    def visit(node, rect):
+        for n in node.layers.intersecting(rect):
+            yield n
+            if (not getattr(n, 'collapsed', True)
+                    and isinstance(n.layers, LayerIndex)):
+                yield from visit(n, rect.translated(-n.pos()))
+
+    if isinstance(top.layers, LayerIndex):
+        yield from visit(top, QtCore.QRectF(rect))
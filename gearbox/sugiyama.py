@@ -0,0 +1,423 @@
+"""Layered (Sugiyama style) layout of gearbox dataflow graphs, flowing left to
+right, as an alternative to dot.
+
+The layout works on plain data and touches no Qt or graphviz objects. It is
+written in pure Python, without NumPy: the graphs of single hierarchical gears
+are small and the per-node work is dominated by the Python bookkeeping, not by
+arithmetic that vectorizes. The subgraphs are laid out one by one on the GUI
+thread, since under the GIL threads would not run them in parallel.
+Results are returned in the graphviz coordinate frame (y grows upwards, nodes
+are positioned by their centers), so that they can be consumed in place of
+the dot output.
+"""
+
+import bisect
+import statistics
+from typing import NamedTuple, Optional, Tuple
+
+
+class LayoutNode(NamedTuple):
+    width: float
+    height: float
+    # Offsets of the port anchors from the top of the node, by port index
+    in_ports: Tuple[float, ...] = ()
+    out_ports: Tuple[float, ...] = ()
+
+
+class LayoutEdge(NamedTuple):
+    key: object
+    tail: str
+    tailport: Optional[int]
+    head: str
+    headport: Optional[int]
+
+
+def _port_offset(node, offsets, port):
+    if port is None or port >= len(offsets):
+        return node.height / 2
+
+    return offsets[port]
+
+
+def _break_cycles(order, succ):
+    """Returns the indices of the edges to reverse to make the graph acyclic"""
+
+    state = {}
+    back_edges = set()
+
+    for root in order:
+        if root in state:
+            continue
+
+        state[root] = 1
+        stack = [(root, iter(succ[root]))]
+        while stack:
+            v, it = stack[-1]
+            for ei, w in it:
+                s = state.get(w)
+                if s == 1:
+                    back_edges.add(ei)
+                elif s is None:
+                    state[w] = 1
+                    stack.append((w, iter(succ[w])))
+                    break
+            else:
+                state[v] = 2
+                stack.pop()
+
+    return back_edges
+
+
+def _topological(order, succ, npred):
+    npred = dict(npred)
+    ready = [v for v in reversed(order) if npred[v] == 0]
+    topo = []
+    while ready:
+        v = ready.pop()
+        topo.append(v)
+        for w in succ[v]:
+            npred[w] -= 1
+            if npred[w] == 0:
+                ready.append(w)
+
+    return topo
+
+
+def _rank(order, dag_edges, sources, sinks):
+    succ = {v: [] for v in order}
+    pred = {v: [] for v in order}
+    for a, b in dag_edges:
+        succ[a].append(b)
+        pred[b].append(a)
+
+    topo = _topological(order, succ, {v: len(pred[v]) for v in order})
+
+    min_rank = 1 if sources else 0
+    rank = {}
+    for v in topo:
+        if v in sources:
+            rank[v] = 0
+        else:
+            rank[v] = max([rank[u] + 1 for u in pred[v]] + [min_rank])
+
+    # Pull the nodes without predecessors, like the drivers, next to their
+    # consumers
+    for v in reversed(topo):
+        if not pred[v] and succ[v] and v not in sources:
+            rank[v] = max(min(rank[w] for w in succ[v]) - 1, min_rank)
+
+    if sinks:
+        last = max([rank[v] for v in order if v not in sinks] + [min_rank - 1]) + 1
+        for v in sinks:
+            rank[v] = last
+
+    return rank
+
+
+def _count_crossings(segments, pos):
+    """Number of crossings between the segments of two adjacent layers"""
+
+    ends = sorted((pos[a] + fa, pos[b] + fb) for a, fa, b, fb in segments)
+    seen = []
+    crossings = 0
+    for _, b in ends:
+        crossings += len(seen) - bisect.bisect_right(seen, b)
+        bisect.insort(seen, b)
+
+    return crossings
+
+
+def _pack(desired, sizes, weights, sep):
+    """Places the nodes of a layer, keeping their order and separation, as
+    close as possible to their desired positions in the least squares sense
+    (pool adjacent violators on the shifted coordinates)."""
+
+    offsets = []
+    acc = 0
+    for s in sizes:
+        offsets.append(acc)
+        acc += s + sep
+
+    blocks = []
+    for d, o, w in zip(desired, offsets, weights):
+        blocks.append([d - o, w, 1])
+        while len(blocks) > 1 and blocks[-2][0] > blocks[-1][0]:
+            v2, w2, c2 = blocks.pop()
+            v1, w1, c1 = blocks[-1]
+            blocks[-1] = [(v1 * w1 + v2 * w2) / (w1 + w2), w1 + w2, c1 + c2]
+
+    res = []
+    for v, _, c in blocks:
+        res.extend([v] * c)
+
+    return [v + o for v, o in zip(res, offsets)]
+
+
+def layout(nodes,
+           edges,
+           sources=(),
+           sinks=(),
+           routing='spline',
+           ranksep=50,
+           nodesep=20,
+           iterations=4):
+    """Lays out the graph from left to right.
+
+    Args:
+        nodes: dict of LayoutNode by node ID, in the preferred top to bottom
+          order
+        edges: list of LayoutEdge
+        sources: IDs of the nodes placed in the first rank, in order
+        sinks: IDs of the nodes placed in the last rank, in order
+        routing: 'spline' or 'orthogonal'
+
+    Returns:
+        A tuple of node center positions by node ID and edge paths by edge
+        key. A path is a list of points: the start point followed by the
+        control, control, end point triples of the cubic Bezier segments.
+    """
+
+    sources = [v for v in sources if v in nodes]
+    sinks = [v for v in sinks if v in nodes]
+    source_set, sink_set = set(sources), set(sinks)
+    order = sources + [v for v in nodes if v not in source_set and v not in sink_set] + sinks
+
+    succ = {v: [] for v in order}
+    for ei, e in enumerate(edges):
+        if e.tail != e.head:
+            succ[e.tail].append((ei, e.head))
+
+    back_edges = _break_cycles(order, succ)
+
+    dag_edges = []
+    for ei, e in enumerate(edges):
+        if e.tail == e.head:
+            continue
+
+        if ei in back_edges:
+            dag_edges.append((e.head, e.tail))
+        else:
+            dag_edges.append((e.tail, e.head))
+
+    rank = _rank(order, dag_edges, source_set, sink_set)
+    num_ranks = max(rank.values(), default=-1) + 1
+
+    # Each edge is a chain of (node ID, anchor offset) in the rank order,
+    # with dummy nodes in the ranks it spans
+    sizes = {v: n.height for v, n in nodes.items()}
+    layers = [[] for _ in range(num_ranks)]
+    for v in order:
+        layers[rank[v]].append(v)
+
+    chains = {}
+    for ei, e in enumerate(edges):
+        if e.tail == e.head:
+            continue
+
+        tail = (e.tail, _port_offset(nodes[e.tail], nodes[e.tail].out_ports, e.tailport))
+        head = (e.head, _port_offset(nodes[e.head], nodes[e.head].in_ports, e.headport))
+        if ei in back_edges:
+            tail, head = head, tail
+
+        chain = [tail]
+        for r in range(rank[tail[0]] + 1, rank[head[0]]):
+            dummy = ('dummy', ei, r)
+            rank[dummy] = r
+            sizes[dummy] = 0
+            layers[r].append(dummy)
+            chain.append((dummy, 0))
+
+        chain.append(head)
+        chains[ei] = chain
+
+    # Segments between adjacent ranks, with the anchor offsets as fractions
+    # of the node heights used to refine the ordering by port positions
+    def frac(v, off):
+        return 0.5 * off / sizes[v] if sizes[v] else 0
+
+    segments = [[] for _ in range(num_ranks)]
+    for chain in chains.values():
+        for (a, oa), (b, ob) in zip(chain, chain[1:]):
+            segments[rank[a]].append((a, frac(a, oa), b, frac(b, ob)))
+
+    # Crossing minimization by barycenter sweeps, keeping the best ordering
+    def positions():
+        return {v: i for layer in layers for i, v in enumerate(layer)}
+
+    def total_crossings(pos):
+        return sum(_count_crossings(s, pos) for s in segments)
+
+    fixed = set()
+    if sources:
+        fixed.add(0)
+
+    if sinks:
+        fixed.add(num_ranks - 1)
+
+    def sweep(r, neighbours, pos):
+        if r in fixed:
+            return
+
+        bary = {}
+        for a, fa, b, fb in neighbours:
+            bary.setdefault(b, []).append(pos[a] + fa)
+
+        layer = layers[r]
+        keys = {v: (sum(bary[v]) / len(bary[v]) if v in bary else pos[v]) for v in layer}
+        layer.sort(key=lambda v: keys[v])
+        for i, v in enumerate(layer):
+            pos[v] = i
+
+    pos = positions()
+    best = total_crossings(pos)
+    best_layers = [list(layer) for layer in layers]
+
+    for _ in range(iterations):
+        if best == 0:
+            break
+
+        for r in range(1, num_ranks):
+            sweep(r, segments[r - 1], pos)
+
+        for r in range(num_ranks - 2, -1, -1):
+            sweep(r, [(b, fb, a, fa) for a, fa, b, fb in segments[r]], pos)
+
+        crossings = total_crossings(pos)
+        if crossings < best:
+            best = crossings
+            best_layers = [list(layer) for layer in layers]
+
+    layers = best_layers
+
+    # Vertical coordinates: stack the layers and then align the connected
+    # anchors with a few passes in both directions
+    top = {}
+    for layer in layers:
+        y = 0
+        for v in layer:
+            top[v] = y
+            y += sizes[v] + nodesep
+
+    links_prev = {}
+    links_next = {}
+    for chain in chains.values():
+        for (a, oa), (b, ob) in zip(chain, chain[1:]):
+            links_prev.setdefault(b, []).append((a, oa, ob))
+            links_next.setdefault(a, []).append((b, ob, oa))
+
+    def align(layer, links):
+        desired = []
+        weights = []
+        for v in layer:
+            targets = [top[u] + ou - ov for u, ou, ov in links.get(v, ())]
+            if targets:
+                desired.append(statistics.median(targets))
+                weights.append(len(targets))
+            else:
+                desired.append(top[v])
+                weights.append(0.1)
+
+        for v, y in zip(layer, _pack(desired, [sizes[v] for v in layer], weights, nodesep)):
+            top[v] = y
+
+    for _ in range(iterations):
+        for layer in layers[1:]:
+            align(layer, links_prev)
+
+        for layer in reversed(layers[:-1]):
+            align(layer, links_next)
+
+    # Horizontal coordinates: nodes of a rank share their centers
+    widths = [0] * num_ranks
+    for v, n in nodes.items():
+        widths[rank[v]] = max(widths[rank[v]], n.width)
+
+    left = []
+    x = 0
+    for w in widths:
+        left.append(x)
+        x += w + ranksep
+
+    node_pos = {}
+    for v, n in nodes.items():
+        r = rank[v]
+        node_pos[v] = (left[r] + widths[r] / 2, -(top[v] + n.height / 2))
+
+    # Routing
+    def anchor(v, off, side):
+        n = nodes[v]
+        x, _ = node_pos[v]
+        return (x + side * n.width / 2, top[v] + off)
+
+    routes = {}
+    for ei, e in enumerate(edges):
+        tail_node, head_node = nodes[e.tail], nodes[e.head]
+        start = anchor(e.tail, _port_offset(tail_node, tail_node.out_ports, e.tailport), 1)
+        end = anchor(e.head, _port_offset(head_node, head_node.in_ports, e.headport), -1)
+
+        # Waypoints with the flag telling whether the segment leading to
+        # them is a straight line
+        if e.tail == e.head:
+            below = top[e.tail] + tail_node.height + nodesep / 2
+            stub = ranksep / 2
+            waypoints = [(start, True), ((start[0] + stub, start[1]), True),
+                         ((start[0] + stub, below), True),
+                         ((end[0] - stub, below), True),
+                         ((end[0] - stub, end[1]), True), (end, True)]
+        elif ei in back_edges:
+            stub = ranksep / 2
+            waypoints = [(start, True), ((start[0] + stub, start[1]), True)]
+            for v, _ in reversed(chains[ei][1:-1]):
+                r = rank[v]
+                waypoints.append(((left[r] + widths[r], top[v]), False))
+                waypoints.append(((left[r], top[v]), True))
+
+            waypoints.append(((end[0] - stub, end[1]), False))
+            waypoints.append((end, True))
+        else:
+            waypoints = [(start, True)]
+            for v, _ in chains[ei][1:-1]:
+                r = rank[v]
+                waypoints.append(((left[r], top[v]), False))
+                waypoints.append(((left[r] + widths[r], top[v]), True))
+
+            waypoints.append((end, False))
+
+        routes[e.key] = waypoints
+
+    # Orthogonal routing spreads the vertical segments sharing the space
+    # between two ranks
+    channels = {}
+    if routing == 'orthogonal':
+        for key, waypoints in routes.items():
+            for (p, _), (q, straight) in zip(waypoints, waypoints[1:]):
+                if not straight:
+                    channels.setdefault((round(p[0]), round(q[0])), []).append((p[1], key, p))
+
+        for group in channels.values():
+            group.sort(key=lambda c: c[0])
+
+    channel_x = {}
+    for (px, qx), group in channels.items():
+        for i, (_, key, p) in enumerate(group):
+            channel_x[(key, p)] = px + (qx - px) * (i + 1) / (len(group) + 1)
+
+    edge_pos = {}
+    for key, waypoints in routes.items():
+        (p, _) = waypoints[0]
+        path = [p]
+        for (p, _), (q, straight) in zip(waypoints, waypoints[1:]):
+            if straight:
+                path.extend([p, q, q])
+            elif routing == 'orthogonal':
+                mx = channel_x[(key, p)]
+                path.extend([p, (mx, p[1]), (mx, p[1])])
+                path.extend([(mx, p[1]), (mx, q[1]), (mx, q[1])])
+                path.extend([(mx, q[1]), q, q])
+            else:
+                dx = max(abs(q[0] - p[0]) / 2, ranksep / 2)
+                path.extend([(p[0] + dx, p[1]), (q[0] - dx, q[1]), q])
+
+        edge_pos[key] = [(x, -y) for x, y in path]
+
+    return node_pos, edge_pos
@@ -1,28 +1,93 @@
-import os
+import functools
+import re
 
-from pygears.conf import Inject, PluginBase, reg, inject
+from PySide2 import QtGui
+from pygears.conf import PluginBase, reg
+
+re_theme_var = re.compile(r'@([\w-]+)')
+
+_values = {}
+_colors = {}
+generation = 0
+
+
+def invalidate():
+    """Drops all resolved theme values, called whenever a theme variable
+    changes."""
+
+    global generation
+
+    _values.clear()
+    _colors.clear()
+    _render.cache_clear()
+    generation += 1
+
+
+def set_theme_var(var, val):
+    # A setter replaces the default store of the registry variable
+    var._val = val
+    invalidate()
+
+
+def theme_value(name):
+    try:
+        return _values[name]
+    except KeyError:
+        val = _values[name] = reg['gearbox/theme'][name]
+        return val
+
+
+def theme_color(color):
+    """Returns a QColor for either a color literal or a @theme-variable."""
+
+    try:
+        return _colors[color]
+    except KeyError:
+        if isinstance(color, tuple):
+            qcolor = QtGui.QColor(*color)
+        else:
+            qcolor = QtGui.QColor(themify(color))
+
+        _colors[color] = qcolor
+        return qcolor
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(style):
+    # Literal text at even and variable names at odd positions
+    return tuple(re_theme_var.split(style))
+
+
+@functools.lru_cache(maxsize=1024)
+def _render(style):
+    parts = list(_compile(style))
+    parts[1::2] = [theme_value(name) for name in parts[1::2]]
+    return ''.join(parts)
 
 
 def themify(style):
-    @inject
-    def stylerepl(match, theme=Inject('gearbox/theme')):
-        return theme[match.group(1)]
+    if '@' not in style:
+        return style
+
+    return _render(style)
+
 
-    import re
-    return re.sub(r'@([\w-]+)', stylerepl, style)
+THEME_DEFAULTS = {
+    'text-color': '#b0b0b0',
+    'text-color-comment': '#2a937c',
+    'text-color-keyword': '#4d97d5',
+    'text-color-constant': '#d060ff',
+    'text-color-object-name': '#ba6ec3',
+    'text-color-class-name': '#ba6ec3',
+    'text-color-string': '#2d8b6e',
+    'text-color-error': '#e02020',
+    'background-color': '#292b2e',
+    'border-color': '#a0a0a0',
+}
 
 
 class ThemePlugin(PluginBase):
     @classmethod
     def bind(cls):
-        reg.confdef('gearbox/theme/text-color', default='#b0b0b0')
-        reg.confdef('gearbox/theme/text-color-comment', default='#2a937c')
-        reg.confdef('gearbox/theme/text-color-keyword', default='#4d97d5')
-        reg.confdef('gearbox/theme/text-color-constant', default='#d060ff')
-        reg.confdef(
-            'gearbox/theme/text-color-object-name', default='#ba6ec3')
-        reg.confdef('gearbox/theme/text-color-class-name', default='#ba6ec3')
-        reg.confdef('gearbox/theme/text-color-string', default='#2d8b6e')
-        reg.confdef('gearbox/theme/text-color-error', default='#e02020')
-        reg.confdef('gearbox/theme/background-color', default='#292b2e')
-        reg.confdef('gearbox/theme/border-color', default='#a0a0a0')
+        for name, default in THEME_DEFAULTS.items():
+            reg.confdef(f'gearbox/theme/{name}', default=default, setter=set_theme_var)
@@ -1,9 +1,5 @@
-import math
-from . import html_utils
-
 from PySide2.QtWidgets import QLabel
 from pygears.conf import Inject, reg, inject
-from PySide2.QtGui import QKeySequence
 from PySide2 import QtCore
 
 
@@ -35,16 +31,7 @@ class WhichKey(QLabel):
 
     @inject
     def is_prefix(self, key, main=Inject('gearbox/main/inst')):
-        prefix = self.current_prefix + [key]
-        for s in main.shortcuts:
-            if not s.enabled:
-                continue
-
-            if len(prefix) >= len(s.key):
-                continue
-
-            if all(k1 == k2 for k1, k2 in zip(prefix, s.key)):
-                return True
+        return main.keymap.is_prefix(tuple(self.current_prefix) + (key, ))
 
     def eventFilter(self, obj, event):
         # if event.type() == QtCore.QEvent.ShortcutOverride:
@@ -75,89 +62,15 @@ class WhichKey(QLabel):
     #                 self.prefixes[s.key[0]] = s
 
     @inject
-    def show(self,
-             main=Inject('gearbox/main/inst'),
-             domain=Inject('gearbox/domain'),
-             prefixes=Inject('gearbox/prefixes')):
-
-        which_key_string = {}
-        for s in main.shortcuts:
-            if not s.enabled:
-                continue
-
-            key = s.key
-
-            if self.current_prefix:
-                if any(k != p for k, p in zip(s.key, self.current_prefix)):
-                    continue
-                else:
-                    key = key[len(self.current_prefix):]
-
-            key_group = False
-            if len(key) > 1:
-                key_group = True
-                key = key[0:1]
-                # continue
-
-            if key[0] == QtCore.Qt.Key_Plus:
-                keys = ['+']
-            else:
-                keys = QKeySequence(*key).toString().split('+')
-
-            try:
-                shift_id = keys.index('Shift')
-                keys.pop(shift_id)
-            except ValueError:
-                shift_id = None
-
-            try:
-                ctrl_id = keys.index('Ctrl')
-                keys.pop(ctrl_id)
-            except ValueError:
-                ctrl_id = None
-
-            if shift_id is None and keys[0].isalpha():
-                keys[0] = keys[0].lower()
-
-            if ctrl_id is not None:
-                keys.insert(0, 'C')
-
-            key_name = "-".join(keys)
-
-            if not key_group:
-                which_key_string[key_name] = (s.name, s.name)
-            else:
-                group_name = prefixes.get((domain,
-                                           tuple(self.current_prefix) + key))
-                if not group_name:
-                    group_name = prefixes.get(
-                        (None, tuple(self.current_prefix) + key))
-
-                if not group_name:
-                    group_name = 'group'
-
-                which_key_string[key_name] = (group_name,
-                                              html_utils.fontify(
-                                                  group_name,
-                                                  color='#749dff'))
-
-        max_width = max(
-            self.fontMetrics().horizontalAdvance(f'{key_name} -> {s}')
-            for key_name, (s, _) in which_key_string.items())
-
-        row_size = self.parentWidget().width() // max_width
-        row_num = math.ceil(len(which_key_string) / row_size)
-
-        table = [[] for _ in range(row_num)]
-        for i, key_name in enumerate(sorted(which_key_string)):
-
-            shortcut_string = (
-                html_utils.fontify(key_name, color='darkorchid') +
-                f' &#8594; {which_key_string[key_name][1]}')
+    def show(self, main=Inject('gearbox/main/inst')):
+        text = main.keymap.which_key(
+            tuple(self.current_prefix), self.fontMetrics(),
+            self.parentWidget().width())
 
-            table[i % row_num].append((f'width={max_width}', shortcut_string))
+        if not text:
+            return
 
-        self.setText(html_utils.tabulate(table))
+        self.setText(text)
         super().show()
 
     def cancel(self):
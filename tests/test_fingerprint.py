@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import types
+
+from gearbox.fingerprint import hier_fingerprints
+
+FINGERPRINT_SCRIPT = '''
+from pygears import Intf, gear, reg
+from pygears.typing import Uint
+
+from gearbox.fingerprint import hier_fingerprints
+
+
+@gear
+def mode_sel(din, *, mode='alpha'):
+    return din if mode in {'alpha', 'beta', 'gamma', 'delta'} else din
+
+
+mode_sel(Intf(Uint[8]))
+
+root = reg['gear/root']
+print(hier_fingerprints(root)[root.name].tree)
+'''
+
+
+def fingerprint(hash_seed):
+    env = dict(os.environ, PYTHONHASHSEED=str(hash_seed))
+    return subprocess.run([sys.executable, '-c', FINGERPRINT_SCRIPT],
+                          env=env,
+                          check=True,
+                          stdout=subprocess.PIPE,
+                          universal_newlines=True).stdout.strip()
+
+
+def test_fingerprint_hash_seed():
+    assert fingerprint(1) == fingerprint(2)
+
+
+def definition_fingerprint(src):
+    namespace = {}
+    exec(compile(src, 'gears.py', 'exec'), namespace)
+    gear = types.SimpleNamespace(
+        name='/f',
+        params={'definition': types.SimpleNamespace(func=namespace['f'])},
+        in_ports=[],
+        out_ports=[],
+        child=[])
+
+    return hier_fingerprints(gear)['/f'].local
+
+
+def test_fingerprint_nested_code():
+    src = 'def f(din):\n    return [x * 2 for x in din]\n'
+
+    # Moving the gear around does not change it
+    assert definition_fingerprint(src) == definition_fingerprint('\n\n' + src)
+
+    # Changing the body of the comprehension does
+    assert definition_fingerprint(src) != definition_fingerprint(src.replace('* 2', '+ 7'))
@@ -0,0 +1,45 @@
+import types
+
+from pygears.conf import reg
+
+from gearbox import fold
+
+
+def make_gear(func, parent=None, in_ports=1, out_ports=1):
+    return types.SimpleNamespace(
+        parent=parent,
+        child=[],
+        params={'definition': types.SimpleNamespace(func=func)},
+        in_ports=[None] * in_ports,
+        out_ports=[None] * out_ports)
+
+
+def test_fold_default_rules_identity():
+    from pygears.lib import sieve
+
+    root = make_gear(None)
+    assert fold.fold_view(root) is None
+
+    def user_sieve():
+        pass
+
+    user_sieve.__name__ = 'sieve'
+
+    assert fold.fold_action(make_gear(sieve.func, root)) == fold.FOLD_MINIMIZE
+    assert fold.fold_action(make_gear(user_sieve, root)) is None
+
+
+def test_fold_edge_spliceable():
+    def glue():
+        pass
+
+    rules = reg['gearbox/fold/rules']
+    reg['gearbox/fold/rules'] = [('glue', fold.FOLD_EDGE)]
+    try:
+        root = make_gear(None)
+        fold.fold_view(root)
+
+        assert fold.fold_action(make_gear(glue, root)) == fold.FOLD_EDGE
+        assert fold.fold_action(make_gear(glue, root, in_ports=2)) == fold.FOLD_MINIMIZE
+    finally:
+        reg['gearbox/fold/rules'] = rules
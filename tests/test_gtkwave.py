@@ -0,0 +1,114 @@
+from pygears.conf import reg
+from pygears.core.hier_node import NamedHierNode
+
+from gearbox.gtkwave import GtkWaveGraphIntf
+from gearbox.gtkwave_mock import GtkWaveMock
+from gearbox.node_model import ModelIndex, PipeModel
+
+VCD = '''$timescale 1ns $end
+$scope module top $end
+$scope module p $end
+$var wire 1 ! valid $end
+$var wire 1 " ready $end
+$upscope $end
+$upscope $end
+$enddefinitions $end
+#0
+1!
+0"
+'''
+
+
+class Signal:
+    def connect(self, f):
+        pass
+
+
+class View:
+    collapsed = False
+
+    def set_status(self, status):
+        pass
+
+
+class Graph(NamedHierNode):
+    def __init__(self):
+        super().__init__('')
+        self.model_index = ModelIndex()
+        self.view = View()
+
+
+class Pipe:
+    broadcast = None
+
+    set_status = PipeModel.set_status
+    status = PipeModel.status
+    status_timestep = PipeModel.status_timestep
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.model_index = parent.model_index
+        self.id = self.model_index.add_pipe(self)
+        self.view = View()
+
+
+class VcdMap:
+    timestep = 1
+
+    def __init__(self, vcd_fn, graph, pipe):
+        self.vcd_fn = vcd_fn
+        self.subgraph = graph
+        self.vcd_pipes = [pipe]
+
+    def pipe_data_signal_stem(self, pipe):
+        return 'top.p.data'
+
+    def broadcast_stem(self, pipe):
+        return None
+
+
+class MockIntf:
+    shmidcat = False
+
+    def __init__(self, mock):
+        self.mock = mock
+        self.response = Signal()
+
+    def command(self, cmd):
+        return self.mock.script(cmd).rstrip('\n')
+
+    def command_nb(self, cmd, cmd_id):
+        self.mock.script(cmd)
+
+
+def test_refresh_same_timestep(tmp_path):
+    vcd_fn = tmp_path / 'trace.vcd'
+    vcd_fn.write_text(VCD)
+
+    graph = Graph()
+    pipe = Pipe(graph)
+    mock = GtkWaveMock(str(vcd_fn))
+    intf = GtkWaveGraphIntf(VcdMap(str(vcd_fn), graph, pipe), MockIntf(mock), view=None)
+
+    def refresh():
+        mock.evaluate('gtkwave::reLoadFile')
+        intf.gtkwave_resp('', intf.cmd_id)
+
+    reg['gearbox/graph_model'] = graph
+    try:
+        refresh()
+        assert mock.stats['get_values'] == 1
+        assert pipe.status == 'active'
+
+        # Nothing was written to the trace, the statuses are still valid
+        refresh()
+        assert mock.stats['get_values'] == 1
+
+        with open(vcd_fn, 'a') as f:
+            f.write('#5\n1"\n')
+
+        refresh()
+        assert mock.stats['get_values'] == 2
+        assert pipe.status == 'handshaked'
+    finally:
+        reg['gearbox/graph_model'] = None
@@ -0,0 +1,18 @@
+from pygears.conf import reg
+
+from gearbox import theme
+
+
+def test_theme_var_set():
+    generation = theme.generation
+    assert theme.themify('color: @text-color;') == 'color: #b0b0b0;'
+
+    reg['gearbox/theme/text-color'] = '#ffffff'
+    try:
+        assert reg['gearbox/theme/text-color'] == '#ffffff'
+        assert theme.generation > generation
+        assert theme.themify('color: @text-color;') == 'color: #ffffff;'
+    finally:
+        reg['gearbox/theme/text-color'] = theme.THEME_DEFAULTS['text-color']
+
+    assert reg['gearbox/theme/text-color'] == '#b0b0b0'